@@ -0,0 +1,491 @@
+"""Benchmarks for the template engine in report_app.py.
+
+Generates synthetic .docx/.xlsx templates at several scales, times
+extraction, rendering and profile load/save, and writes the results as
+JSON so runs can be compared between versions:
+
+    python benchmark.py --scales small medium --out bench.json
+
+Templates are written as raw OOXML so python-docx is not needed; embedded
+"images" are random bytes and only exist to make the archive heavy.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from xml.sax.saxutils import escape
+
+import report_app
+
+
+SCALES = {
+    "small": {
+        "word": dict(paragraphs=50, tables=2, table_rows=5, nested_depth=0, placeholders=10, split_ratio=0.2, image_kb=0),
+        "excel": dict(sheets=1, rows=100, columns=5, placeholders=10, inline=False),
+        "profiles": dict(count=100, keys=10),
+        "excel_rows": dict(items=1_000),
+        "word_rows": dict(items=200),
+    },
+    "medium": {
+        "word": dict(paragraphs=2000, tables=20, table_rows=20, nested_depth=1, placeholders=100, split_ratio=0.3, image_kb=5_000),
+        "excel": dict(sheets=5, rows=10_000, columns=8, placeholders=100, inline=False),
+        "profiles": dict(count=1000, keys=50),
+        "excel_rows": dict(items=20_000),
+        "word_rows": dict(items=2_000),
+    },
+    "large": {
+        "word": dict(paragraphs=20_000, tables=100, table_rows=50, nested_depth=2, placeholders=500, split_ratio=0.3, image_kb=50_000),
+        "excel": dict(sheets=10, rows=200_000, columns=8, placeholders=500, inline=True),
+        "profiles": dict(count=5000, keys=100),
+        "excel_rows": dict(items=100_000),
+        "word_rows": dict(items=10_000),
+    },
+}
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+S_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+PKG_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+# Synthetic templates ---------------------------------------------------------
+
+def placeholder_keys(count):
+    return [f"Field{i:04d}" for i in range(count)]
+
+
+def word_runs(text, split):
+    """Return <w:r> markup for text, cutting each placeholder across two runs when split is set."""
+    if not split or "{" not in text:
+        return f'<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+    start = text.index("{")
+    cut = start + 3
+    return (
+        f'<w:r><w:t xml:space="preserve">{escape(text[:cut])}</w:t></w:r>'
+        f'<w:r><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">{escape(text[cut:])}</w:t></w:r>'
+    )
+
+
+def word_paragraph(text, split=False):
+    return f"<w:p>{word_runs(text, split)}</w:p>"
+
+
+def word_table(rows, columns, keys, rng, split_ratio, depth):
+    cells = []
+    for r in range(rows):
+        row = []
+        for c in range(columns):
+            key = rng.choice(keys)
+            body = word_paragraph(f"R{r}C{c} {{{key}}}", rng.random() < split_ratio)
+            if depth > 0 and c == 0:
+                body += word_table(2, 2, keys, rng, split_ratio, depth - 1) + "<w:p/>"
+            row.append(f'<w:tc><w:tcPr><w:tcW w:w="2000" w:type="dxa"/></w:tcPr>{body}</w:tc>')
+        cells.append(f"<w:tr>{''.join(row)}</w:tr>")
+    grid = "".join('<w:gridCol w:w="2000"/>' for _ in range(columns))
+    return f'<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>{"".join(cells)}</w:tbl>'
+
+
+def make_word_template(path, paragraphs, tables, table_rows, nested_depth, placeholders, split_ratio, image_kb, seed=1):
+    rng = random.Random(seed)
+    keys = placeholder_keys(placeholders)
+    body = []
+    placed = 0
+    for i in range(paragraphs):
+        if i % 5 == 0:
+            text = f"Paragraph {i}: value {{{rng.choice(keys)}}} and more text."
+            body.append(word_paragraph(text, rng.random() < split_ratio))
+        else:
+            body.append(word_paragraph(f"Paragraph {i} of plain filler text without placeholders."))
+        if placed < tables and i % max(1, paragraphs // tables) == 0:
+            body.append(word_table(table_rows, 4, keys, rng, split_ratio, nested_depth))
+            placed += 1
+
+    document = (
+        f'{XML_DECL}<w:document xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:body>'
+        f'{"".join(body)}<w:sectPr><w:headerReference w:type="default" r:id="rId2"/></w:sectPr></w:body></w:document>'
+    )
+    header = f'{XML_DECL}<w:hdr xmlns:w="{W_NS}">{word_paragraph("Header {" + keys[0] + "}")}</w:hdr>'
+    rels = [f'<Relationship Id="rId2" Type="{R_NS}/header" Target="header1.xml"/>']
+    if image_kb:
+        rels.append(f'<Relationship Id="rId3" Type="{R_NS}/image" Target="media/image1.png"/>')
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", (
+            f'{XML_DECL}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Default Extension="png" ContentType="image/png"/>'
+            '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '<Override PartName="/word/header1.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"/>'
+            '</Types>'
+        ))
+        z.writestr("_rels/.rels", (
+            f'{XML_DECL}<Relationships xmlns="{PKG_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{R_NS}/officeDocument" Target="word/document.xml"/></Relationships>'
+        ))
+        z.writestr("word/_rels/document.xml.rels", f'{XML_DECL}<Relationships xmlns="{PKG_RELS_NS}">{"".join(rels)}</Relationships>')
+        z.writestr("word/document.xml", document)
+        z.writestr("word/header1.xml", header)
+        if image_kb:
+            # Media is already compressed in real documents, so store it
+            size = image_kb * 1024
+            # getrandbits rather than randbytes, which needs Python 3.9
+            z.writestr("word/media/image1.png", rng.getrandbits(8 * size).to_bytes(size, "little"),
+                       compress_type=zipfile.ZIP_STORED)
+    return keys
+
+
+def make_word_rows_template(path, items, seed=1):
+    """A document with a line-item table whose marker row repeats per item; returns the items."""
+    rng = random.Random(seed)
+
+    def cell(text, split=False):
+        return f'<w:tc><w:tcPr><w:tcW w:w="2000" w:type="dxa"/></w:tcPr>{word_paragraph(text, split)}</w:tc>'
+
+    rows = (
+        f"<w:tr>{cell('Check')}{cell('Result')}{cell('Inspector')}</w:tr>"
+        f"<w:tr>{cell('{rows:lines}{Check}', True)}{cell('{Result}', True)}{cell('{Inspector} for {site}')}</w:tr>"
+    )
+    grid = '<w:gridCol w:w="2000"/>' * 3
+    document = (
+        f'{XML_DECL}<w:document xmlns:w="{W_NS}"><w:body>{word_paragraph("Inspection log for {site}")}'
+        f'<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>{rows}</w:tbl>'
+        '<w:sectPr/></w:body></w:document>'
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", (
+            f'{XML_DECL}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        z.writestr("_rels/.rels", (
+            f'{XML_DECL}<Relationships xmlns="{PKG_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{R_NS}/officeDocument" Target="word/document.xml"/></Relationships>'
+        ))
+        z.writestr("word/document.xml", document)
+    return [
+        {"Check": f"Check point {i}", "Result": rng.choice(["Pass", "Fail", "N/A"]), "Inspector": f"Inspector {i % 7}"}
+        for i in range(items)
+    ]
+
+
+def make_excel_template(path, sheets, rows, columns, placeholders, inline, seed=1):
+    rng = random.Random(seed)
+    keys = placeholder_keys(placeholders)
+    strings = [f"Header {{{key}}}" for key in keys] + [f"Label {i}" for i in range(50)]
+
+    def text_cell(ref, text):
+        if inline:
+            return f'<c r="{ref}" t="inlineStr"><is><t>{escape(text)}</t></is></c>'
+        return f'<c r="{ref}" t="s"><v>{strings.index(text)}</v></c>'
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        overrides = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for n in range(1, sheets + 1)
+        )
+        z.writestr("[Content_Types].xml", (
+            f'{XML_DECL}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+            f'{overrides}</Types>'
+        ))
+        z.writestr("_rels/.rels", (
+            f'{XML_DECL}<Relationships xmlns="{PKG_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{R_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+        ))
+        sheet_list = "".join(f'<sheet name="Sheet{n}" sheetId="{n}" r:id="rId{n}"/>' for n in range(1, sheets + 1))
+        z.writestr("xl/workbook.xml", f'{XML_DECL}<workbook xmlns="{S_NS}" xmlns:r="{R_NS}"><sheets>{sheet_list}</sheets></workbook>')
+        sheet_rels = "".join(
+            f'<Relationship Id="rId{n}" Type="{R_NS}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+            for n in range(1, sheets + 1)
+        )
+        z.writestr("xl/_rels/workbook.xml.rels", (
+            f'{XML_DECL}<Relationships xmlns="{PKG_RELS_NS}">{sheet_rels}'
+            f'<Relationship Id="rId{sheets + 1}" Type="{R_NS}/sharedStrings" Target="sharedStrings.xml"/></Relationships>'
+        ))
+        items = "".join(f"<si><t>{escape(text)}</t></si>" for text in strings)
+        z.writestr("xl/sharedStrings.xml", (
+            f'{XML_DECL}<sst xmlns="{S_NS}" count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>'
+        ))
+
+        letters = [chr(ord("A") + c) for c in range(columns)]
+        per_sheet = max(1, len(keys) // sheets)
+        for n in range(1, sheets + 1):
+            with z.open(f"xl/worksheets/sheet{n}.xml", "w") as f:
+                f.write(f'{XML_DECL}<worksheet xmlns="{S_NS}"><sheetData>'.encode())
+                sheet_keys = keys[(n - 1) * per_sheet:n * per_sheet] or keys[:1]
+                header = "".join(
+                    text_cell(f"{letters[c]}1", f"Header {{{key}}}") for c, key in enumerate(sheet_keys[:columns])
+                )
+                f.write(f'<row r="1">{header}</row>'.encode())
+                for r in range(2, rows + 2):
+                    cells = [text_cell(f"A{r}", f"Label {r % 50}")]
+                    cells += [f'<c r="{letters[c]}{r}"><v>{rng.random() * 1000:.3f}</v></c>' for c in range(1, columns)]
+                    f.write(f'<row r="{r}">{"".join(cells)}</row>'.encode())
+                f.write(b"</sheetData></worksheet>")
+    return keys
+
+
+def make_excel_rows_template(path, data_path, items, seed=1):
+    """A sheet whose marker row expands into `items` rows, plus a CSV of the items."""
+    rng = random.Random(seed)
+
+    def text_cell(ref, text):
+        return f'<c r="{ref}" t="inlineStr"><is><t>{escape(text)}</t></is></c>'
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", (
+            f'{XML_DECL}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        ))
+        z.writestr("_rels/.rels", (
+            f'{XML_DECL}<Relationships xmlns="{PKG_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{R_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+        ))
+        z.writestr("xl/workbook.xml", (
+            f'{XML_DECL}<workbook xmlns="{S_NS}" xmlns:r="{R_NS}">'
+            '<sheets><sheet name="Lines" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        z.writestr("xl/_rels/workbook.xml.rels", (
+            f'{XML_DECL}<Relationships xmlns="{PKG_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{R_NS}/worksheet" Target="worksheets/sheet1.xml"/></Relationships>'
+        ))
+        z.writestr("xl/worksheets/sheet1.xml", (
+            f'{XML_DECL}<worksheet xmlns="{S_NS}"><dimension ref="A1:D3"/><sheetData>'
+            f'<row r="1">{text_cell("A1", "Item")}{text_cell("B1", "Qty")}{text_cell("C1", "Price")}{text_cell("D1", "Total")}</row>'
+            f'<row r="2">{text_cell("A2", "{rows:items}{Item}")}{text_cell("B2", "{Qty}")}{text_cell("C2", "{Price}")}'
+            '<c r="D2"><f>B2*C2</f></c></row>'
+            f'<row r="3">{text_cell("A3", "Total for {client}")}<c r="D3"><f>SUM(D2:D2)</f></c></row>'
+            '</sheetData><mergeCells count="1"><mergeCell ref="A3:C3"/></mergeCells></worksheet>'
+        ))
+    with open(data_path, "w", newline="") as f:
+        f.write("Item,Qty,Price\n")
+        for i in range(items):
+            f.write(f"Item {i},{rng.randint(1, 50)},{rng.random() * 100:.2f}\n")
+
+
+# Timing ----------------------------------------------------------------------
+
+def reset_caches(template_path=None):
+    """Forget every in-process and on-disk cache so the next call runs cold."""
+    if template_path:
+        sha, _ = report_app.template_fingerprint(template_path)
+        index_path = os.path.join(report_app.get_cache_dir("templates"), f"{sha}.json")
+        if os.path.exists(index_path):
+            os.remove(index_path)
+    report_app._template_hashes.clear()
+    report_app._template_indexes.clear()
+    report_app._index_parts.clear()
+    report_app.template_cache.entries.clear()
+
+
+def forget_rendered():
+    """Keep templates parsed but drop the parts kept from earlier renders, so every part is rendered."""
+    for parsed in report_app.template_cache.entries.values():
+        parsed.forget_rendered()
+
+
+def edit_one_value(replacements, key):
+    """Return a render that changes one value each time it runs, as when a reviewer edits a field."""
+    edits = iter(range(1 << 30))
+    return lambda: {**replacements, key: f"edit {next(edits)}"}
+
+
+def measure(func, repeat, setup=None):
+    """Time func() `repeat` times, then once more under tracemalloc for its peak memory.
+
+    tracemalloc only sees Python allocations, so memory held inside lxml's
+    C trees is not included in peak_bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "runs": repeat,
+        "min_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+        "peak_bytes": peak,
+    }
+
+
+def bench_word(workdir, scale, params, repeat):
+    template = os.path.join(workdir, f"word_{scale}.docx")
+    keys = make_word_template(template, **params)
+    replacements = {key: f"value for {key}" for key in keys}
+    edited = edit_one_value(replacements, keys[-1])
+    output = os.path.join(workdir, "out.docx")
+    results = [
+        ("extract_placeholders_from_template (cold)",
+         measure(lambda: report_app.extract_placeholders_from_template(template), repeat, lambda: reset_caches(template))),
+        ("extract_placeholders_from_template (warm)",
+         measure(lambda: report_app.extract_placeholders_from_template(template), repeat)),
+        ("generate_word_output (cold)",
+         measure(lambda: report_app.generate_word_output(template, output, replacements), repeat, lambda: reset_caches(template))),
+        ("generate_word_output (warm)",
+         measure(lambda: report_app.generate_word_output(template, output, replacements), repeat, forget_rendered)),
+        ("generate_word_output (one value changed)",
+         measure(lambda: report_app.generate_word_output(template, output, edited()), repeat)),
+    ]
+    sizes = {"template_bytes": os.path.getsize(template), "output_bytes": os.path.getsize(output)}
+    return [dict(case="word", scale=scale, op=op, params=params, **sizes, **stats) for op, stats in results]
+
+
+def bench_excel(workdir, scale, params, repeat):
+    template = os.path.join(workdir, f"excel_{scale}.xlsx")
+    keys = make_excel_template(template, **params)
+    replacements = {key: f"value for {key}" for key in keys}
+    edited = edit_one_value(replacements, keys[-1])
+    output = os.path.join(workdir, "out.xlsx")
+    results = [
+        ("extract_placeholders_from_template (cold)",
+         measure(lambda: report_app.extract_placeholders_from_template(template), repeat, lambda: reset_caches(template))),
+        ("extract_placeholders_from_template (warm)",
+         measure(lambda: report_app.extract_placeholders_from_template(template), repeat)),
+        ("generate_excel_output (cold)",
+         measure(lambda: report_app.generate_excel_output(template, output, replacements), repeat, lambda: reset_caches(template))),
+        ("generate_excel_output (warm)",
+         measure(lambda: report_app.generate_excel_output(template, output, replacements), repeat, forget_rendered)),
+        ("generate_excel_output (one value changed)",
+         measure(lambda: report_app.generate_excel_output(template, output, edited()), repeat)),
+    ]
+    sizes = {"template_bytes": os.path.getsize(template), "output_bytes": os.path.getsize(output)}
+    return [dict(case="excel", scale=scale, op=op, params=params, **sizes, **stats) for op, stats in results]
+
+
+def bench_word_rows(workdir, scale, params, repeat):
+    template = os.path.join(workdir, f"word_rows_{scale}.docx")
+    items = make_word_rows_template(template, **params)
+    output = os.path.join(workdir, "out.docx")
+    replacements = {"rows:lines": items, "site": "Plant 7"}
+    results = [
+        ("generate_word_output rows from list",
+         measure(lambda: report_app.generate_word_output(template, output, replacements), repeat)),
+    ]
+    sizes = {"template_bytes": os.path.getsize(template), "output_bytes": os.path.getsize(output)}
+    return [dict(case="word_rows", scale=scale, op=op, params=params, **sizes, **stats) for op, stats in results]
+
+
+def bench_excel_rows(workdir, scale, params, repeat):
+    template = os.path.join(workdir, f"excel_rows_{scale}.xlsx")
+    data = os.path.join(workdir, f"excel_rows_{scale}.csv")
+    make_excel_rows_template(template, data, **params)
+    items = list(report_app.read_data_rows(data))
+    output = os.path.join(workdir, "out.xlsx")
+    results = [
+        ("generate_excel_output rows from .csv",
+         measure(lambda: report_app.generate_excel_output(template, output, {"rows:items": data, "client": "ACME"}), repeat)),
+        ("generate_excel_output rows from list",
+         measure(lambda: report_app.generate_excel_output(template, output, {"rows:items": items, "client": "ACME"}), repeat)),
+    ]
+    sizes = {"template_bytes": os.path.getsize(template), "output_bytes": os.path.getsize(output)}
+    return [dict(case="excel_rows", scale=scale, op=op, params=params, **sizes, **stats) for op, stats in results]
+
+
+def bench_profiles(workdir, scale, params, repeat):
+    profiles_dir = os.path.join(workdir, f"profiles_{scale}")
+    os.makedirs(profiles_dir, exist_ok=True)
+    data = {key: f"value {key}" for key in placeholder_keys(params["keys"])}
+    for i in range(params["count"]):
+        with open(os.path.join(profiles_dir, f"Client {i:05d}.json"), "w") as f:
+            json.dump(data, f)
+    index_path = os.path.join(workdir, f"profiles_{scale}.sqlite3")
+    probe = f"Client {params['count'] // 2:05d}"
+
+    def open_cold():
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        report_app.ProfileStore(profiles_dir, index_path).db.close()
+
+    results = [("profile index build (cold)", measure(open_cold, repeat))]
+    store = report_app.ProfileStore(profiles_dir, index_path)
+    results += [
+        ("profile load", measure(lambda: store.load(probe), repeat)),
+        ("profile save", measure(lambda: store.save("Benchmark Profile", data), repeat)),
+        ("profile search", measure(lambda: store.search("client 1"), repeat)),
+        ("profile refresh (unchanged folder)", measure(store.refresh, repeat)),
+    ]
+    store.db.close()
+    return [dict(case="profiles", scale=scale, op=op, params=params, **stats) for op, stats in results]
+
+
+def run(scales, cases, repeat):
+    results = []
+    workdir = tempfile.mkdtemp(prefix="report_app_bench_")
+    # Indexes, outputs and logs go to the scratch folder, not the app's own cache/
+    get_app_dir = report_app.get_app_dir
+    report_app.get_app_dir = lambda: workdir
+    try:
+        for scale in scales:
+            for case in cases:
+                bench = {"word": bench_word, "word_rows": bench_word_rows, "excel": bench_excel,
+                         "excel_rows": bench_excel_rows, "profiles": bench_profiles}[case]
+                for row in bench(workdir, scale, SCALES[scale][case], repeat):
+                    print(f"{row['scale']:>6} {row['case']:<8} {row['op']:<44} "
+                          f"median {row['median_s'] * 1000:9.2f} ms  peak {row['peak_bytes'] / 1e6:8.2f} MB",
+                          file=sys.stderr)
+                    results.append(row)
+    finally:
+        report_app.get_app_dir = get_app_dir
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark template extraction, rendering and profiles.")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    cases = ["word", "word_rows", "excel", "excel_rows", "profiles"]
+    parser.add_argument("--cases", nargs="+", choices=cases, default=cases)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per operation (default: 3)")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.scales, args.cases, args.repeat)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Load test for `report_app.py serve`.
+
+Fires render requests at a running service from several connections and
+reports throughput and latency percentiles. Standard library only:
+
+    python report_app.py serve templates/ &
+    python loadtest.py --template Report.docx --values Example --requests 500 --concurrency 16
+
+--values takes a profile name or a .json file of replacements. Each request
+sets one placeholder (--vary, by default the template's first) to a value of
+its own, so the service renders every request instead of answering from its
+output cache; --no-vary sends the same body every time to measure cache hits.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def request_body(values, vary=None):
+    """Return body(n) for the n-th request; with `vary`, that placeholder differs per request."""
+    if values.lower().endswith(".json") and os.path.isfile(values):
+        with open(values, "r") as f:
+            request = {"replacements": json.load(f)}
+    else:
+        request = {"profile": values}
+    if not vary:
+        body = json.dumps(request).encode("utf-8")
+        return lambda n: body
+
+    # Unique per run too, so a second run (or the warmup) is not served from the cache either
+    nonce = uuid.uuid4().hex[:8]
+
+    def body(n):
+        replacements = dict(request.get("replacements", {}), **{vary: f"loadtest-{nonce}-{n}"})
+        return json.dumps(dict(request, replacements=replacements)).encode("utf-8")
+    return body
+
+
+def first_placeholder(url, template_id, timeout=60):
+    """The first plain placeholder GET /templates lists for the template, or None."""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    try:
+        conn.request("GET", "/templates")
+        listing = json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+    for template in listing.get("templates", []):
+        if template["id"] == template_id:
+            return next((key for key in template.get("placeholders", []) if not key.startswith("rows:")), None)
+    return None
+
+
+def run(url, template_id, body, requests, concurrency, timeout=60):
+    parts = urlsplit(url)
+    path = f"/render/{quote(template_id)}"
+    local = threading.local()
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+
+    def connection():
+        if getattr(local, "conn", None) is None:
+            local.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+        return local.conn
+
+    def worker():
+        results = []
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return results
+            start = time.perf_counter()
+            try:
+                conn = connection()
+                conn.request("POST", path, body(n), {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                size = len(response.read())
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                local.conn = None
+                status, size = type(e).__name__, 0
+            results.append((status, time.perf_counter() - start, size))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [item for batch in pool.map(lambda _: worker(), range(concurrency)) for item in batch]
+    elapsed = time.perf_counter() - started
+
+    ok = sorted(seconds for status, seconds, _ in results if status == 200)
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "url": url,
+        "template": template_id,
+        "requests": len(results),
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "statuses": statuses,
+        "bytes_received": sum(size for status, _, size in results if status == 200),
+        "latency_ms": {
+            "mean": round(statistics.mean(ok) * 1000, 2) if ok else None,
+            "p50": round(percentile(ok, 0.50) * 1000, 2),
+            "p90": round(percentile(ok, 0.90) * 1000, 2),
+            "p99": round(percentile(ok, 0.99) * 1000, 2),
+            "max": round(ok[-1] * 1000, 2) if ok else None,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure throughput and latency of the local render service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="Service address (default: http://127.0.0.1:8765)")
+    parser.add_argument("--template", required=True, help="Template ID, as listed by GET /templates")
+    parser.add_argument("--values", required=True, help="Profile name, or path to a .json file of replacements")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests (default: 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel connections (default: 8)")
+    parser.add_argument("--warmup", type=int, default=5, help="Requests sent first and not measured (default: 5)")
+    parser.add_argument("--vary", help="Placeholder given a different value in every request "
+                                       "(default: the template's first placeholder)")
+    parser.add_argument("--no-vary", action="store_true",
+                        help="Send the same body every time, measuring output-cache hits")
+    parser.add_argument("--out", help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    vary = None
+    if not args.no_vary:
+        vary = args.vary or first_placeholder(args.url, args.template)
+        if vary is None:
+            print("No placeholder to vary; every request has the same values and may be served from "
+                  "the output cache (run serve with --output-cache-mb 0 to render each one)", file=sys.stderr)
+    if args.warmup:
+        run(args.url, args.template, request_body(args.values, vary), args.warmup, 1)
+    body = request_body(args.values, vary)
+    report = run(args.url, args.template, body, args.requests, args.concurrency)
+    report["varied"] = vary
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["statuses"].get("200") == report["requests"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,2746 @@
+import time
+_STARTUP_T0 = time.perf_counter()
+_STARTUP_WALL = time.time()
+
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
 import os
+import posixpath
 import json
+import platform
 import sys
 import re
-import openpyxl
+import copy
+import hashlib
+import itertools
+import bisect
+import struct
+import zlib
+import zipfile
+import csv
+import shutil
+import tempfile
+import sqlite3
+import argparse
+import queue
+import threading
+from collections import ChainMap, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
 import tkinter.font as tkFont
 from tkinter import ttk
-from docx import Document
-from openpyxl import load_workbook
-from tkinterdnd2 import DND_FILES, TkinterDnD
-from idlelib.tooltip import Hovertip
+
+# lxml, openpyxl and tkinterdnd2 are imported where they are first needed so
+# the window (and the headless commands) start without paying for them.
+
+
+PLACEHOLDER_RE = re.compile(r"\{(.*?)\}")
+
+
+class RenderCancelled(Exception):
+    """Raised from a progress callback to abandon a render or scan."""
+
+
+def report_progress(progress, stage, fraction):
+    # progress(stage, fraction) may raise RenderCancelled to stop the caller
+    if progress is not None:
+        progress(stage, fraction)
+
+
+# Render instrumentation ------------------------------------------------------
+#
+# Every render and extraction records how long each stage took and how many
+# nodes it visited, changed and wrote, as one line of cache/logs/renders.jsonl.
+# The active trace is kept per thread, so the engine functions below report
+# into it without it being passed around; with no trace active they no-op.
+
+class RenderTrace:
+    def __init__(self, op, **info):
+        self.op = op
+        self.info = info
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self):
+        with self.lock:
+            return {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "pid": os.getpid(),
+                "op": self.op,
+                **self.info,
+                "total_s": round(time.perf_counter() - self.started, 6),
+                "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+
+class JsonLinesLog:
+    """Appends JSON records to a file, rotating it to .1, .2, ... once it passes max_bytes.
+
+    Several render processes may append to the same log; each record is one
+    write() so lines do not interleave, though a rotation racing another
+    process can drop a record.
+    """
+
+    def __init__(self, name, max_bytes=5 << 20, backups=3):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.enabled = True
+        self.lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(get_cache_dir("logs"), self.name)
+
+    def write(self, record):
+        if not self.enabled:
+            return
+        line = json.dumps(record) + "\n"
+        try:
+            with self.lock:
+                path = self.path
+                if os.path.exists(path) and os.path.getsize(path) + len(line) > self.max_bytes:
+                    self.rotate(path)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError:
+            pass  # Instrumentation must never fail a render
+
+    def rotate(self, path):
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{n}"):
+                os.replace(f"{path}.{n}", f"{path}.{n + 1}")
+        if self.backups:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+
+
+render_log = JsonLinesLog("renders.jsonl")
+
+# Set by --profile: each traced operation also runs under cProfile and its
+# stats are dumped to cache/logs/profiles/
+profile_renders = False
+
+_trace_state = threading.local()
+_profile_serial = itertools.count(1)
+
+
+def current_trace():
+    return getattr(_trace_state, "trace", None)
+
+
+@contextmanager
+def activate_trace(trace):
+    """Make trace the active one for this thread, e.g. inside a worker thread."""
+    previous = current_trace()
+    _trace_state.trace = trace
+    try:
+        yield trace
+    finally:
+        _trace_state.trace = previous
+
+
+@contextmanager
+def traced(op, **info):
+    """Trace one render or extraction and log it when it ends.
+
+    Nested calls report into the trace that is already active.
+    """
+    outer = current_trace()
+    if outer is not None:
+        yield outer
+        return
+
+    trace = RenderTrace(op, **info)
+    profiler = None
+    if profile_renders:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    with activate_trace(trace):
+        try:
+            if profiler is not None:
+                profiler.enable()
+            yield trace
+            trace.info["ok"] = True
+        except BaseException as e:
+            trace.info["ok"] = False
+            trace.info["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                trace.info["profile"] = dump_profile(profiler, op, info)
+            render_log.write(trace.record())
+
+
+def dump_profile(profiler, op, info):
+    stem = os.path.splitext(os.path.basename(info.get("template", "")))[0]
+    stem = re.sub(r"[^\w.-]", "_", stem) or "template"
+    name = f"{op}-{stem}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_profile_serial)}.prof"
+    try:
+        path = os.path.join(get_cache_dir(os.path.join("logs", "profiles")), name)
+        profiler.dump_stats(path)
+        return path
+    except OSError:
+        return None
+
+
+def trace_stage(name):
+    trace = current_trace()
+    return trace.stage(name) if trace is not None else nullcontext()
+
+
+def trace_count(name, n=1):
+    trace = current_trace()
+    if trace is not None:
+        trace.count(name, n)
+
+
+# Characters XML 1.0 cannot hold, not even escaped (pasted data brings them in)
+XML_INVALID_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+def xml_safe(text):
+    """Drop the characters XML cannot hold from a value, so a stray one does not spoil the document."""
+    return XML_INVALID_RE.sub("", text)
+
+
+class Replacer:
+    """Substitutes every {key} of a replacements dict in a single regex pass.
+
+    Build one per replacements dict and call it on each text node; text
+    without a "{" is returned untouched without running the regex.
+    """
+
+    def __init__(self, replacements, markers=False):
+        # {rows:name} values are lists that the renderers expand rather than
+        # substitute; markers=True substitutes them too, to blank them out
+        self.values = {
+            f"{{{key}}}": xml_safe(str(val)) for key, val in replacements.items() if markers or not is_expansion_key(key)
+        }
+        self.pattern = self._compile(self.values)
+
+    @staticmethod
+    def _compile(tokens):
+        tokens = sorted(tokens, key=len, reverse=True)
+        return re.compile("|".join(map(re.escape, tokens))) if tokens else None
+
+    @classmethod
+    def for_keys(cls, keys):
+        """Compile a pattern over keys once, to be filled with bind() many times."""
+        replacer = cls({})
+        replacer.keys = [key for key in keys if not is_expansion_key(key)]
+        replacer.pattern = cls._compile(f"{{{key}}}" for key in replacer.keys)
+        return replacer
+
+    def bind(self, replacements):
+        """Return a Replacer sharing this one's pattern, with values for its keys from replacements.
+
+        Keys that replacements lacks are left as they are. Only the pattern's
+        own keys are looked up, so binding costs nothing per unused key.
+        """
+        replacer = Replacer.__new__(Replacer)
+        replacer.pattern = self.pattern
+        replacer.values = {
+            f"{{{key}}}": xml_safe(str(replacements[key])) for key in self.keys if key in replacements
+        }
+        return replacer
+
+    def __call__(self, text):
+        if self.pattern is None or "{" not in text:
+            return text
+        return self.pattern.sub(self._lookup, text)
+
+    def _lookup(self, match):
+        return self.values.get(match.group(0), match.group(0))
+
+    def finditer(self, text):
+        """Yield (start, end, value) for every placeholder occurrence in text."""
+        if self.pattern is None or "{" not in text:
+            return
+        for match in self.pattern.finditer(text):
+            value = self.values.get(match.group(0))
+            if value is not None:
+                yield match.start(), match.end(), value
+
+
+def replace_in_text_nodes(nodes, replace, breaks=False):
+    """Apply replace() across the <w:t> nodes of one paragraph.
+
+    A placeholder split over several runs gets its value in the run where it
+    starts (keeping that run's formatting) and the rest of the placeholder is
+    cut from the following runs. Each node is written at most once. With
+    breaks=True (Word), line breaks and tabs in the new text become <w:br/>
+    and <w:tab/> elements. Returns True when any node changed.
+    """
+    texts = [t.text or "" for t in nodes]
+    matches = list(replace.finditer("".join(texts)))
+    if not matches:
+        return False
+
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text)
+
+    # Work backwards so earlier offsets stay valid while nodes are rewritten
+    new_texts = list(texts)
+    for start, end, value in reversed(matches):
+        first = bisect.bisect_right(starts, start) - 1
+        last = bisect.bisect_right(starts, end - 1) - 1
+        if first == last:
+            text = new_texts[first]
+            new_texts[first] = text[:start - starts[first]] + value + text[end - starts[first]:]
+        else:
+            new_texts[first] = new_texts[first][:start - starts[first]] + value
+            for k in range(first + 1, last):
+                new_texts[k] = ""
+            new_texts[last] = new_texts[last][end - starts[last]:]
+
+    for node, old, new in zip(nodes, texts, new_texts):
+        if new != old:
+            node.text = new
+            if new != new.strip():
+                node.set(XML_SPACE, "preserve")
+            if breaks and WORD_BREAK_RE.search(new):
+                split_word_breaks(node)
+    return True
+
+
+def split_word_breaks(node):
+    """Split a <w:t> at line breaks and tabs into <w:t>, <w:br/> and <w:tab/> siblings.
+
+    Word shows a raw newline or tab inside <w:t> as a space; this is what
+    python-docx's run.text does with them.
+    """
+    from lxml import etree
+
+    pieces = WORD_BREAK_RE.split(node.text)
+    node.text = pieces[0]
+    run = node.getparent()
+    at = run.index(node)
+    for separator, text in zip(pieces[1::2], pieces[2::2]):
+        at += 1
+        run.insert(at, etree.Element(W_TAB if separator == "\t" else W_BR))
+        if text:
+            at += 1
+            t = etree.Element(W_T)
+            t.text = text
+            if text != text.strip():
+                t.set(XML_SPACE, "preserve")
+            run.insert(at, t)
+
+
+# OOXML zip helpers -----------------------------------------------------------
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W_P = f"{{{W_NS}}}p"
+W_T = f"{{{W_NS}}}t"
+W_TR = f"{{{W_NS}}}tr"
+W_BR = f"{{{W_NS}}}br"
+W_TAB = f"{{{W_NS}}}tab"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+WORD_BREAK_RE = re.compile(r"(\r\n|\r|\n|\t)")
+
+# Word parts that carry document text: body (including tables and text
+# boxes), headers, footers, footnotes and endnotes
+WORD_STORY_PART_RE = re.compile(r"word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml")
+
+
+def make_xml_parser():
+    from lxml import etree
+
+    # lxml parsers must not be shared between threads
+    return etree.XMLParser(resolve_entities=False, huge_tree=True)
+
+
+def paragraph_text_nodes(p):
+    """Return the <w:t> nodes of a paragraph, excluding paragraphs nested in text boxes."""
+    nodes = []
+
+    def walk(elem):
+        for child in elem:
+            if child.tag == W_T:
+                nodes.append(child)
+            elif child.tag != W_P:
+                walk(child)
+
+    walk(p)
+    return nodes
+
+
+def serialize_xml(root):
+    from lxml import etree
+
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+class ZipPassthroughWriter:
+    """Writes a zip archive whose members are either copied from another
+    archive as raw compressed bytes or deflated from new content.
+
+    Copied members are never decompressed, so media in a template costs one
+    buffered file copy no matter how large it is.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.entries = []
+
+    def copy_raw(self, src_fp, info):
+        src_fp.seek(info.header_offset)
+        header = src_fp.read(30)
+        if header[:4] != b"PK\x03\x04":
+            raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        src_fp.seek(info.header_offset + 30 + name_len + extra_len)
+
+        self._write_header(info, info.compress_type, info.CRC, info.compress_size, info.file_size)
+        remaining = info.compress_size
+        while remaining:
+            chunk = src_fp.read(min(remaining, 1 << 20))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated data for {info.filename}")
+            self.fp.write(chunk)
+            remaining -= len(chunk)
+
+    def write(self, info, data):
+        self.write_stream(info, (data,))
+
+    def write_stream(self, info, chunks):
+        """Deflate a member from an iterable of byte chunks.
+
+        The sizes and CRC are only known at the end, so the local header is
+        written with zeros first and patched afterwards.
+        """
+        offset = self.fp.tell()
+        self._write_header(info, zipfile.ZIP_DEFLATED, 0, 0, 0)
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        crc = file_size = compress_size = 0
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            packed = compressor.compress(chunk)
+            compress_size += len(packed)
+            self.fp.write(packed)
+        packed = compressor.flush()
+        compress_size += len(packed)
+        self.fp.write(packed)
+        self._patch_header(offset, crc, compress_size, file_size)
+
+    def write_deflated(self, info, part):
+        """Write a member whose content is already compressed, see DeflatedPart."""
+        offset = self.fp.tell()
+        self._write_header(info, zipfile.ZIP_DEFLATED, 0, 0, 0)
+        for chunk in part.chunks:
+            self.fp.write(chunk)
+        self._patch_header(offset, part.crc, part.compress_size, part.file_size)
+
+    def _patch_header(self, offset, crc, compress_size, file_size):
+        if max(compress_size, file_size) > 0xFFFFFFFF:
+            raise zipfile.LargeZipFile("ZIP64 archives are not supported")
+
+        end = self.fp.tell()
+        self.fp.seek(offset + 14)
+        self.fp.write(struct.pack("<3L", crc, compress_size, file_size))
+        self.fp.seek(end)
+        entry = self.entries[-1]
+        self.entries[-1] = entry[:5] + (crc, compress_size, file_size) + entry[8:]
+
+    def _write_header(self, info, method, crc, compress_size, file_size):
+        offset = self.fp.tell()
+        if max(compress_size, file_size, offset) > 0xFFFFFFFF or len(self.entries) >= 0xFFFF:
+            raise zipfile.LargeZipFile("ZIP64 archives are not supported")
+
+        name = info.filename.encode("utf-8")
+        flags = 0 if name.isascii() else 0x800
+        year, month, day, hour, minute, second = info.date_time
+        dos_time = hour << 11 | minute << 5 | second // 2
+        dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+
+        self.fp.write(struct.pack(
+            "<4s5H3L2H", b"PK\x03\x04", 20, flags, method, dos_time, dos_date,
+            crc, compress_size, file_size, len(name), 0,
+        ))
+        self.fp.write(name)
+        self.entries.append((name, flags, method, dos_time, dos_date, crc,
+                             compress_size, file_size, info.external_attr, offset))
+
+    def close(self):
+        directory_offset = self.fp.tell()
+        for name, flags, method, dos_time, dos_date, crc, compress_size, file_size, attr, offset in self.entries:
+            self.fp.write(struct.pack(
+                "<4s6H3L5H2L", b"PK\x01\x02", 20, 20, flags, method, dos_time, dos_date,
+                crc, compress_size, file_size, len(name), 0, 0, 0, 0, attr, offset,
+            ))
+            self.fp.write(name)
+        directory_size = self.fp.tell() - directory_offset
+        self.fp.write(struct.pack(
+            "<4s4H2LH", b"PK\x05\x06", 0, 0, len(self.entries), len(self.entries),
+            directory_size, directory_offset, 0,
+        ))
+
+
+# An empty final block, closing a stream of flushed segments
+DEFLATE_END = b"\x03\x00"
+
+
+class DeflatedPart:
+    """A member's new content, already compressed as raw deflate data.
+
+    Built from segments that each end on a byte boundary without closing
+    the stream, so a segment compressed for one render can be spliced into
+    the next one next to freshly compressed segments.
+    """
+
+    __slots__ = ("chunks", "crc", "file_size", "compress_size")
+
+    def __init__(self, chunks, crc, file_size):
+        self.chunks = tuple(chunks) + (DEFLATE_END,)
+        self.crc = crc
+        self.file_size = file_size
+        self.compress_size = sum(len(chunk) for chunk in self.chunks)
+
+
+def deflate_segment(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def deflate_part(segments):
+    """Compress (data, packed) segments into a DeflatedPart.
+
+    packed is data already run through deflate_segment, or None to compress
+    it here; the CRC is always taken over data.
+    """
+    chunks = []
+    crc = file_size = 0
+    for data, packed in segments:
+        crc = zlib.crc32(data, crc)
+        file_size += len(data)
+        chunks.append(deflate_segment(data) if packed is None else packed)
+    return DeflatedPart(chunks, crc, file_size)
+
+
+def render_word_part(root, paragraphs, replace, repeats=(), replacements=None):
+    """Replace placeholders in the given paragraph ordinals of one parsed Word XML part.
+
+    repeats lists (paragraph ordinal, key) for {rows:key} markers: the table
+    row around each (or the paragraph, outside a table) is repeated once per
+    item of replacements[key], see repeat_word_block.
+    """
+    elements = list(root.iter(W_P))
+    blocks = {}
+    for i, key in repeats:
+        p = elements[i]
+        block = next(p.iterancestors(W_TR), p)
+        blocks.setdefault(block, key)
+    # Paragraphs in a repeated block are filled per item instead
+    skip = {id(p) for block in blocks for p in block.iter(W_P)}
+    changed = 0
+    with trace_stage("replace"):
+        for i in paragraphs:
+            if id(elements[i]) not in skip:
+                changed += replace_in_text_nodes(paragraph_text_nodes(elements[i]), replace, breaks=True)
+        for block, key in blocks.items():
+            changed += repeat_word_block(block, key, replacements)
+    trace_count("nodes_visited", len(paragraphs))
+    trace_count("nodes_changed", changed)
+    if not changed:
+        return None
+    with trace_stage("serialize"):
+        return serialize_xml(root)
+
+
+def rerender_word_part(root, originals, indexed, replace):
+    """Redo paragraphs of a Word part rendered earlier.
+
+    originals maps paragraph ordinals to fresh copies of those template
+    paragraphs, see ParsedTemplate.original_paragraphs. Each copy is put in
+    place of its rendered paragraph, undoing the last render (breaks and
+    tabs included), and then every ordinal of `indexed` (the paragraphs the
+    index lists for this part, in order) that falls inside it is filled
+    again, so text boxes nested in it are redone too.
+    """
+    elements = list(root.iter(W_P))
+    spans = []
+    for i, original in sorted(originals.items()):
+        elements[i].getparent().replace(elements[i], original)
+        spans.append((i, i + sum(1 for _ in original.iter(W_P))))
+    elements = list(root.iter(W_P))
+    redo = []
+    for start, end in spans:
+        redo.extend(indexed[bisect.bisect_left(indexed, start):bisect.bisect_left(indexed, end)])
+
+    changed = 0
+    with trace_stage("replace"):
+        for i in redo:
+            changed += replace_in_text_nodes(paragraph_text_nodes(elements[i]), replace, breaks=True)
+    trace_count("nodes_visited", len(redo))
+    trace_count("nodes_changed", changed)
+    with trace_stage("serialize"):
+        return serialize_xml(root)
+
+
+def repeat_word_block(block, key, replacements):
+    """Replace a table row (or paragraph) holding {key} with one filled copy per item of replacements[key].
+
+    The row is stripped of its markers once, then deep-copied per item and
+    only the paragraphs that hold placeholders are filled, with the item's
+    values over the scalar ones. All copies go into the table in a single
+    slice assignment. An empty list removes the row.
+    """
+    markers = Replacer({m[1:-1]: "" for m in EXPANSION_MARKER_RE.findall("".join(block.itertext()))}, markers=True)
+    for p in block.iter(W_P):
+        replace_in_text_nodes(paragraph_text_nodes(p), markers)
+    texts = ["".join(t.text or "" for t in paragraph_text_nodes(p)) for p in block.iter(W_P)]
+    templated = [i for i, text in enumerate(texts) if "{" in text]
+    scalars = {k: v for k, v in replacements.items() if not is_expansion_key(k)}
+    # One pattern for every row: any key that can match in the row is one of
+    # its placeholders (or a scalar key with braces found in its text)
+    text = "\n".join(texts)
+    keys = dependent_keys(PLACEHOLDER_RE.findall(text))
+    keys.update(k for k in scalars if ("{" in k or "}" in k) and f"{{{k}}}" in text)
+    row = Replacer.for_keys(keys)
+
+    copies = []
+    for item in expansion_items(replacements[key]):
+        clone = copy.deepcopy(block)
+        replace = row.bind(ChainMap({k: "" if v is None else v for k, v in item.items()}, scalars))
+        paragraphs = list(clone.iter(W_P))
+        for i in templated:
+            replace_in_text_nodes(paragraph_text_nodes(paragraphs[i]), replace, breaks=True)
+        copies.append(clone)
+
+    parent = block.getparent()
+    at = parent.index(block)
+    parent[at:at + 1] = copies
+    trace_count("rows_expanded", len(copies))
+    return 1
+
+
+def temp_path_for(path):
+    """A sibling temp file name, unique per process and thread, for write-then-rename saves."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+# Returned by a render_part callback to leave a member out of the copy
+DROP_PART = object()
+
+
+def write_ooxml_copy(template_path, output_path, render_part, progress=None):
+    """Copy a template archive to output_path, re-rendering selected members.
+
+    render_part(src, info) returns an iterable of byte chunks for a member's
+    new content, a DeflatedPart to splice in as is, None to copy the member
+    across untouched, or DROP_PART to leave it out. The archive is
+    written to a temp file and renamed over output_path once complete, so a
+    crash or cancel never leaves a half-written document behind.
+    """
+    tmp_path = temp_path_for(output_path)
+    try:
+        with zipfile.ZipFile(template_path) as src, open(template_path, "rb") as src_fp, open(tmp_path, "wb") as out:
+            writer = ZipPassthroughWriter(out)
+            members = src.infolist()
+            copied = 0
+            for i, info in enumerate(members, start=1):
+                chunks = render_part(src, info)
+                if chunks is DROP_PART:
+                    continue
+                with trace_stage("write"):
+                    if chunks is None:
+                        writer.copy_raw(src_fp, info)
+                        copied += 1
+                    elif isinstance(chunks, DeflatedPart):
+                        writer.write_deflated(info, chunks)
+                    else:
+                        writer.write_stream(info, chunks)
+                report_progress(progress, "Writing", i / len(members))
+            writer.close()
+            trace_count("parts_copied", copied)
+            trace_count("parts_rewritten", len(writer.entries) - copied)
+            trace_count("bytes_written", out.tell())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def dependent_keys(keys):
+    """Return the replacement keys that can change text holding these indexed placeholders.
+
+    "{{Name}" is indexed as "{Name" but a value for "Name" changes it too.
+    """
+    found = set(keys)
+    for key in keys:
+        pos = key.find("{")
+        while pos >= 0:
+            found.add(key[pos + 1:])
+            pos = key.find("{", pos + 1)
+    return found
+
+
+class IndexedPart:
+    """The entries of one part of a compiled index, with the keys each depends on."""
+
+    __slots__ = ("entries", "keys", "expands", "paragraphs", "formula_keys")
+
+    def __init__(self):
+        self.entries = []  # (entry, frozenset of dependent keys)
+        self.keys = set()
+        self.expands = False
+        self.paragraphs = []  # Sorted paragraph ordinals, for Word parts
+        self.formula_keys = set()  # Placeholders in Excel formulas
+
+
+_index_parts = {}
+
+
+def index_parts(index):
+    """Group an index's entries by part as IndexedPart objects, once per template."""
+    parts = _index_parts.get(index["sha256"])
+    if parts is None:
+        parts = {}
+        for entry in index["entries"]:
+            part = parts.setdefault(entry["part"], IndexedPart())
+            keys = frozenset(dependent_keys(entry["keys"]))
+            part.entries.append((entry, keys))
+            part.keys.update(keys)
+            part.expands = part.expands or any(is_expansion_key(key) for key in keys)
+            if entry.get("formula"):
+                part.formula_keys.update(keys)
+            if "paragraph" in entry:
+                part.paragraphs.append(entry["paragraph"])
+        for part in parts.values():
+            part.paragraphs.sort()
+        with _template_memo_lock:
+            # Kept only as long as the index itself; see template_fingerprint
+            if index["sha256"] in _template_indexes:
+                _index_parts[index["sha256"]] = parts
+    return parts
+
+
+def placeholder_targets(index, replacements):
+    """Map each indexed part to the entries we actually have values for."""
+    targets = {}
+    for name, part in index_parts(index).items():
+        entries = [entry for entry, keys in part.entries if not replacements.keys().isdisjoint(keys)]
+        if entries:
+            targets[name] = entries
+    return targets
+
+
+def generate_word_output(template_path, output_path, replacements, progress=None):
+    with traced("render", template=os.path.abspath(template_path), output=os.path.abspath(output_path)):
+        _generate_word_output(template_path, output_path, replacements, progress)
+
+
+def _generate_word_output(template_path, output_path, replacements, progress):
+    index = compile_template(template_path, progress)
+    replace = Replacer(replacements)
+    targets = placeholder_targets(index, replacements)
+    signatures = part_signatures(index, replacements)
+    parts = index_parts(index)
+    loose = any("{" in str(key) or "}" in str(key) for key in replacements)
+
+    with template_cache.use(template_path) as parsed:
+        def render_part(src, info):
+            entries = targets.get(info.filename)
+            if not entries:
+                return None
+            part = parts[info.filename]
+            repeats = [
+                (entry["paragraph"], key) for entry in entries for key in entry["keys"]
+                if is_expansion_key(key) and replacements.get(key) not in (None, "")
+            ] if part.expands else []
+            if repeats or loose:
+                with trace_stage("parse"):
+                    root = parsed.word_part(src, info)
+                data = render_word_part(root, [entry["paragraph"] for entry in entries], replace, repeats, replacements)
+                return None if data is None else (data,)
+
+            # Start from the tree of the last render when there is one, and
+            # redo only the paragraphs holding a key whose value changed
+            values = {
+                key: cache_key_value(key, replacements[key]) if key in replacements else None for key in part.keys
+            }
+            last = parsed.take_word_render(info.filename)
+            if last is None:
+                with trace_stage("parse"):
+                    root = parsed.word_part(src, info)
+                data = render_word_part(root, [entry["paragraph"] for entry in entries], replace)
+            else:
+                last_values, root = last
+                changed = {key for key, val in values.items() if last_values.get(key) != val}
+                paragraphs = [entry["paragraph"] for entry, keys in part.entries if not changed.isdisjoint(keys)]
+                originals = parsed.original_paragraphs(src, info, paragraphs)
+                data = rerender_word_part(root, originals, part.paragraphs, replace)
+            parsed.keep_word_render(info.filename, values, root, info.file_size)
+            return None if data is None else (data,)
+
+        write_ooxml_copy(template_path, output_path, reuse_rendered_parts(parsed, signatures, render_part), progress)
+
+
+# Excel string rewriting ------------------------------------------------------
+#
+# Cell text lives in xl/sharedStrings.xml (<si> items) or, less often, in
+# inline-string cells inside the sheet XML; formulas (="Hi {name}") live in
+# the sheet XML too. All of them are rewritten as a stream of small
+# fragments, so memory stays flat however many rows a sheet has.
+
+SHARED_STRINGS_PART = "xl/sharedStrings.xml"
+WORKSHEET_PART_RE = re.compile(r"xl/worksheets/sheet\d+\.xml")
+SHARED_STRING_OPEN_RE = rb"<(?:\w+:)?si(?:\s[^>]*)?>"
+# A cell whose first child is a formula (<f>) or an inline string (<is>)
+WORKSHEET_CELL_OPEN_RE = rb"<(?:\w+:)?c\s[^>]*(?<!/)>\s*<(?:\w+:)?(?:f|is)\b"
+XLSX_FRAGMENTS = {
+    "shared": (re.compile(SHARED_STRING_OPEN_RE + rb".*?</(?:\w+:)?si>", re.S), re.compile(SHARED_STRING_OPEN_RE)),
+    "inline": (re.compile(WORKSHEET_CELL_OPEN_RE + rb".*?</(?:\w+:)?c>", re.S), re.compile(WORKSHEET_CELL_OPEN_RE)),
+}
+SPREADSHEET_NS = b"http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+XML_CHUNK_SIZE = 1 << 20
+# Plain runs shorter than this are compressed with their neighbours on every render
+SPLICE_MIN_BYTES = 16 << 10
+
+
+def xlsx_fragment_kind(part):
+    if part == SHARED_STRINGS_PART:
+        return "shared"
+    if WORKSHEET_PART_RE.fullmatch(part):
+        return "inline"
+    return None
+
+
+def read_chunks(f, size=XML_CHUNK_SIZE):
+    return iter(lambda: f.read(size), b"")
+
+
+def split_xml_fragments(chunks, fragment_re, open_re):
+    """Split a stream of XML bytes into (is_fragment, bytes) pieces.
+
+    Only the text after the last complete fragment is held back between
+    chunks, so memory is bounded by the chunk size plus one fragment.
+    """
+    buf = b""
+    for chunk in chunks:
+        buf += chunk
+        pos = 0
+        for match in fragment_re.finditer(buf):
+            if match.start() > pos:
+                yield False, buf[pos:match.start()]
+            yield True, match.group(0)
+            pos = match.end()
+
+        # Hold back an unfinished fragment, or the last two tags: a fragment's
+        # opening tag may be complete while the child that marks it is cut off
+        rest = buf[pos:]
+        pending = open_re.search(rest)
+        if pending:
+            keep = pending.start()
+        else:
+            last = rest.rfind(b"<")
+            keep = rest.rfind(b"<", 0, last) if last > 0 else -1
+            if keep < 0:
+                keep = last
+        if keep < 0:
+            keep = len(rest)
+        if keep:
+            yield False, rest[:keep]
+        buf = rest[keep:]
+    if buf:
+        yield False, buf
+
+
+def parse_xml_fragment(fragment):
+    """Parse a fragment cut out of a SpreadsheetML part.
+
+    Prefixed fragments (<x:si>) need their namespace declared; the wrapper
+    element is dropped again and only the fragment is returned.
+    """
+    from lxml import etree
+
+    prefix = re.match(rb"<(\w+):", fragment)
+    if prefix is None:
+        return etree.fromstring(fragment, make_xml_parser())
+    wrapper = b"<w xmlns:" + prefix.group(1) + b'="' + SPREADSHEET_NS + b'">' + fragment + b"</w>"
+    return etree.fromstring(wrapper, make_xml_parser())[0]
+
+
+def local_name(elem):
+    tag = elem.tag
+    return tag.rpartition("}")[2] if isinstance(tag, str) else None
+
+
+def string_text_nodes(elem):
+    """Return the <t> nodes of a shared or inline string, skipping phonetic runs."""
+    return [
+        node for node in elem.iter()
+        if local_name(node) == "t" and local_name(node.getparent()) != "rPh"
+    ]
+
+
+def cell_formula(cell):
+    """Return the <f> element of a worksheet cell, or None."""
+    for child in cell:
+        if local_name(child) == "f":
+            return child
+    return None
+
+
+def replace_in_formula(cell, replace):
+    """Fill the placeholders in a cell's formula text, as-is; returns True when it changed.
+
+    The cell's cached value is dropped with the old formula, so nothing stale
+    shows before Excel recalculates.
+    """
+    formula = cell_formula(cell)
+    if formula is None or not formula.text:
+        return False
+    text = replace(formula.text)
+    if text == formula.text:
+        return False
+    formula.text = text
+    for child in list(cell):
+        if local_name(child) == "v":
+            cell.remove(child)
+    return True
+
+
+def set_full_calc_on_load(data):
+    """Return xl/workbook.xml with calcPr set to recalculate every formula when the file opens."""
+    calc = re.search(rb"<((?:\w+:)?)calcPr\b[^>]*>", data)
+    if calc is None:
+        prefix = re.search(rb"<((?:\w+:)?)workbook\b", data).group(1)
+        at = AFTER_CALC_PR_RE.search(data).start()
+        return data[:at] + b"<" + prefix + b'calcPr fullCalcOnLoad="1"/>' + data[at:]
+    tag = calc.group(0)
+    if b"fullCalcOnLoad=" in tag:
+        tag = re.sub(rb'fullCalcOnLoad="[^"]*"', b'fullCalcOnLoad="1"', tag)
+    else:
+        at = len(calc.group(1)) + len(b"<calcPr")
+        tag = tag[:at] + b' fullCalcOnLoad="1"' + tag[at:]
+    return data[:calc.start()] + tag + data[calc.end():]
+
+
+def excel_part_segments(parsed, name, pieces, rewrite):
+    """Yield (data, packed) segments of a cached Excel part for deflate_part.
+
+    Long plain runs come with their compressed form from the ParsedTemplate,
+    so a render only compresses the strings it rewrote and the short runs
+    between them.
+    """
+    fresh = []
+    for i, (is_template, data) in enumerate(pieces):
+        if is_template:
+            fresh.append(rewrite(data))
+        elif len(data) < SPLICE_MIN_BYTES:
+            fresh.append(data)
+        else:
+            if fresh:
+                yield b"".join(fresh), None
+                fresh = []
+            yield data, parsed.packed_piece(name, i, data)
+    if fresh:
+        yield b"".join(fresh), None
+
+
+def generate_excel_output(template_path, output_path, replacements, progress=None):
+    with traced("render", template=os.path.abspath(template_path), output=os.path.abspath(output_path)):
+        _generate_excel_output(template_path, output_path, replacements, progress)
+
+
+def _generate_excel_output(template_path, output_path, replacements, progress):
+    from lxml import etree
+
+    index = compile_template(template_path, progress)
+    replace = Replacer(replacements)
+    targets = placeholder_targets(index, replacements)
+    expansions = plan_expansions(template_path, index, replacements)
+    # Filled formulas have no cached value until Excel recalculates them
+    recalc = any(not part.formula_keys.isdisjoint(replacements) for part in index_parts(index).values())
+    trace = current_trace()
+    visited = changed = 0
+    replace_s = 0.0
+
+    def rewrite(fragment):
+        nonlocal visited, changed, replace_s
+        if b"{" not in fragment:
+            return fragment
+        # Timed by hand: this runs once per string, inside the streamed "write" stage
+        start = time.perf_counter()
+        visited += 1
+        elem = parse_xml_fragment(fragment)
+        if replace_in_text_nodes(string_text_nodes(elem), replace) | replace_in_formula(elem, replace):
+            changed += 1
+            fragment = etree.tostring(elem, encoding="UTF-8", xml_declaration=False)
+        replace_s += time.perf_counter() - start
+        return fragment
+
+    def render_stream(src, info, fragment_re, open_re):
+        with src.open(info) as f:
+            for is_fragment, data in split_xml_fragments(read_chunks(f), fragment_re, open_re):
+                yield rewrite(data) if is_fragment else data
+
+    with template_cache.use(template_path) as parsed:
+        def render_part(src, info):
+            if expansions:
+                plan = expansions.sheets.get(info.filename)
+                if plan is not None:
+                    return plan.render(src, info, rewrite)
+                if info.filename in EXPANSION_RECALC_PARTS or info.filename in expansions.tables:
+                    return rewrite_for_expansion(src, info, expansions)
+                if WORKSHEET_PART_RE.fullmatch(info.filename) or CHART_PART_RE.fullmatch(info.filename):
+                    return expansions.render_references(src, info, rewrite if info.filename in targets else None)
+            elif recalc and info.filename == "xl/workbook.xml":
+                return (set_full_calc_on_load(src.read(info)),)
+            kind = xlsx_fragment_kind(info.filename)
+            if info.filename not in targets or kind is None:
+                return None
+            pieces = parsed.excel_part(src, info, kind)
+            if pieces is None:
+                return render_stream(src, info, *XLSX_FRAGMENTS[kind])
+            with trace_stage("write"):
+                return deflate_part(excel_part_segments(parsed, info.filename, pieces, rewrite))
+
+        if not expansions:
+            # Expanded rows move references across many parts; those renders always run in full
+            render_part = reuse_rendered_parts(parsed, part_signatures(index, replacements), render_part)
+        write_ooxml_copy(template_path, output_path, render_part, progress)
+
+    if trace is not None:
+        trace.add_time("replace", replace_s)
+        trace.count("nodes_visited", visited)
+        trace.count("nodes_changed", changed)
+
+
+# Excel row expansion ---------------------------------------------------------
+#
+# A worksheet row holding a {rows:name} marker is the template for a list. It
+# is emitted once per item of the "rows:name" value -- a list of dicts, or the
+# path of a .csv/.xlsx/.json file with one item per row -- with {field}
+# placeholders filled from the item, the row's styles kept and its formulas
+# filled down. Rows below it move down, and references to them are shifted as
+# if the rows had been inserted in Excel. Item rows are built as strings and
+# streamed straight into the zip, so memory stays flat however many there are.
+
+EXPANSION_PREFIX = "rows:"
+EXPANSION_MARKER_RE = re.compile(r"\{" + re.escape(EXPANSION_PREFIX) + r".*?\}")
+EXCEL_MAX_ROWS = 1048576
+ROW_OPEN_RE = rb"<(?:\w+:)?row\b"
+ROW_FRAGMENTS = (re.compile(ROW_OPEN_RE + rb"(?:[^>]*/>|[^>]*>.*?</(?:\w+:)?row>)", re.S), re.compile(ROW_OPEN_RE))
+ROW_NUMBER_RE = re.compile(rb'<(?:\w+:)?row\b[^>]*?\sr="(\d+)"')
+CELL_FRAGMENT_RE = re.compile(rb"<(?:\w+:)?c\b(?:[^>]*/>|[^>]*>.*?</(?:\w+:)?c>)", re.S)
+CELL_REF_RE = re.compile(rb'(<(?:\w+:)?(?:row|c)\b[^>]*?\sr="[A-Z]*)(\d+)"')
+SHARED_CELL_RE = re.compile(rb"<(?:\w+:)?c\b([^>]*?)(?<!/)>\s*<(?:\w+:)?v>(\d+)</")
+FORMULA_ELEMENT_RE = re.compile(rb"(<(?:\w+:)?f\b[^>]*?)(?:/>|>([^<]*)(</(?:\w+:)?f>))")
+RANGE_TAG_RE = re.compile(rb'<(?:\w+:)?(\w+)\b[^>]*?\s(?:ref|sqref)="[^"]*"[^>]*>')
+RANGE_ATTR_RE = re.compile(rb'(\s(?:ref|sqref)=")([^"]*)"')
+RULE_FORMULA_RE = re.compile(rb"(<(?:\w+:)?formula[12]?>)([^<]*)")
+MERGE_COUNT_RE = re.compile(rb'(<(?:\w+:)?mergeCells\b[^>]*?)\scount="\d*"')
+DEFINED_NAME_RE = re.compile(rb"(<(?:\w+:)?definedName\b[^>]*>)([^<]*)")
+CHART_PART_RE = re.compile(r"xl/charts/chart\d+\.xml")
+CHART_FORMULA_RE = re.compile(rb"(<(?:\w+:)?f>)([^<]*)")
+XML_ATTR_RE = re.compile(r'([\w:]+)="([^"]*)"')
+# An A1 reference, optionally sheet-qualified, with an optional :range end
+A1_REF_RE = re.compile(
+    r"(?<![\w.$'!\]])((?:'(?:[^']|'')+'|[A-Za-z_][\w.]*)!)?"
+    r"(\$?[A-Z]{1,3})(\$?)(\d{1,7})(?::(\$?[A-Z]{1,3})(\$?)(\d{1,7}))?(?![\w(!.])"
+)
+# Item values that are written as numbers rather than text; longer digit
+# strings (account numbers and the like) would lose precision, so stay text
+NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d{0,14})(?:\.\d+)?(?:[eE][-+]?\d{1,3})?")
+# Workbook-level parts made stale by moving formula cells
+EXPANSION_RECALC_PARTS = {"xl/workbook.xml", "xl/calcChain.xml", "xl/_rels/workbook.xml.rels", "[Content_Types].xml"}
+# Elements that follow <calcPr> in a workbook, for inserting one
+AFTER_CALC_PR_RE = re.compile(
+    rb"<(?:\w+:)?(?:oleSize|customWorkbookViews|pivotCaches|smartTagPr|smartTagTypes|webPublishing"
+    rb"|fileRecoveryPr|webPublishObjects|extLst)\b|</(?:\w+:)?workbook>"
+)
+
+
+def is_expansion_key(key):
+    return isinstance(key, str) and key.startswith(EXPANSION_PREFIX)
+
+
+def xml_escape(text):
+    return xml_safe(text).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def column_number(letters):
+    n = 0
+    for ch in letters.lstrip("$"):
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def column_letters(n):
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def numeric_cell_value(val):
+    """Return val as the text of a numeric cell, or None if it should stay a string."""
+    if isinstance(val, str):
+        return val if NUMBER_RE.fullmatch(val) else None
+    if isinstance(val, bool):
+        return None
+    if isinstance(val, int) or (isinstance(val, float) and val == val and abs(val) != float("inf")):
+        return repr(val)
+    return None
+
+
+def _formula_refs(formula):
+    """Yield (offset, match) for the A1 references of a formula, skipping string literals."""
+    pos = 0
+    for i, segment in enumerate(formula.split('"')):
+        if i % 2 == 0:
+            for match in A1_REF_RE.finditer(segment):
+                yield pos, match
+        pos += len(segment) + 1
+
+
+def rewrite_refs(formula, rewrite):
+    """Replace every A1 reference in a formula with rewrite(match)."""
+    out = []
+    last = 0
+    for pos, match in _formula_refs(formula):
+        out.append(formula[last:pos + match.start()])
+        out.append(rewrite(match))
+        last = pos + match.end()
+    if not out:
+        return formula
+    out.append(formula[last:])
+    return "".join(out)
+
+
+def _sheet_of_prefix(prefix):
+    name = prefix[:-1]
+    if name.startswith("'"):
+        name = name[1:-1].replace("''", "'")
+    return name
+
+
+def fill_down(formula, rows, columns=0):
+    """Move a formula's relative references as copying it rows down and columns across would."""
+    def move(col, row_abs, row):
+        if columns and not col.startswith("$"):
+            col = column_letters(column_number(col) + columns)
+        return f"{col}{row_abs}{row if row_abs else int(row) + rows}"
+
+    def rewrite(match):
+        prefix, col1, abs1, row1, col2, abs2, row2 = match.groups()
+        ref = (prefix or "") + move(col1, abs1, row1)
+        return ref + ":" + move(col2, abs2, row2) if col2 else ref
+
+    return rewrite_refs(formula, rewrite)
+
+
+def compile_fill_down(formula):
+    """Split a formula into text and relative row numbers, so filling it down is a join."""
+    parts = []
+    text = []
+    last = 0
+    for pos, match in _formula_refs(formula):
+        text.append(formula[last:pos + match.start()])
+        prefix, col1, abs1, row1, col2, abs2, row2 = match.groups()
+        text.append(prefix or "")
+        for col, row_abs, row in ((col1, abs1, row1), (col2, abs2, row2)):
+            if col is None:
+                break
+            if col is col2:
+                text.append(":")
+            text.append(col + row_abs)
+            if row_abs:
+                text.append(row)
+            else:
+                parts.append("".join(text))
+                parts.append(int(row))
+                text = []
+        last = pos + match.end()
+    text.append(formula[last:])
+    parts.append("".join(text))
+    return parts
+
+
+def shift_inserted_rows(text, sheet, shifts, anchor=None, qualified_only=False, spread=False):
+    """Move the references in a formula or range list as Excel does when rows are inserted.
+
+    shifts lists (row, delta) pairs, highest row first: references below row
+    move by delta and a range ending on row grows (or shrinks) with it; with
+    spread, so does a single cell on row. Formulas on an anchor row, which is
+    itself being copied, only follow the rows below it. References to other
+    sheets are left alone, as are all unqualified ones when qualified_only
+    is set.
+    """
+    def rewrite(match):
+        prefix, col1, abs1, row1, col2, abs2, row2 = match.groups()
+        if prefix is None:
+            if qualified_only:
+                return match.group(0)
+        elif _sheet_of_prefix(prefix) != sheet:
+            return match.group(0)
+        r1 = int(row1)
+        r2 = int(row2) if col2 else r1
+        for at, delta in shifts:
+            grows = (col2 is not None or spread) and at != anchor and r2 == at and (delta > 0 or r1 < at)
+            r1, r2 = (r1 + delta if r1 > at else r1), (r2 + delta if r2 > at or grows else r2)
+        ref = f"{prefix or ''}{col1}{abs1}{r1}"
+        if col2 is None and r2 != r1:
+            col2, abs2 = col1, abs1
+        return f"{ref}:{col2}{abs2}{r2}" if col2 else ref
+
+    return rewrite_refs(text, rewrite)
+
+
+def expansion_items(value):
+    """Yield the items of a {rows:name} value: dicts from a list, or from a .csv/.xlsx/.json file."""
+    if isinstance(value, str):
+        path = value.strip()
+        if not os.path.isfile(path):
+            raise ValueError(f"Row data file not found: {path}")
+        if path.lower().endswith(".json"):
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        else:
+            yield from read_data_rows(path)
+            return
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("Row data must be a list of objects or the path of a .csv, .xlsx or .json file")
+    for item in value:
+        if not isinstance(item, dict):
+            raise ValueError("Row data must be a list of objects, one per row")
+        yield item
+
+
+def count_expansion_items(value):
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    if isinstance(value, str) and value.strip().lower().endswith(".csv") and os.path.isfile(value.strip()):
+        # Counted without building the row dicts; DictReader skips the same blank lines
+        with open(value.strip(), newline="", encoding="utf-8-sig") as f:
+            return max(0, sum(1 for row in csv.reader(f) if row) - 1)
+    return sum(1 for _ in expansion_items(value))
+
+
+def join_chunks(chunks, size=1 << 16):
+    """Merge small byte chunks into ones of about size bytes, to keep per-write overhead down."""
+    pending = []
+    pending_bytes = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_bytes += len(chunk)
+        if pending_bytes >= size:
+            yield b"".join(pending)
+            pending = []
+            pending_bytes = 0
+    if pending:
+        yield b"".join(pending)
+
+
+class RowTemplate:
+    """A {rows:name} marker row, precompiled so each item row is a handful of string joins."""
+
+    def __init__(self, fragment, row, first_row, strings, plan, masters):
+        text = fragment.decode("utf-8")
+        tag = text[:text.index(">") + 1]
+        self.prefix = re.match(r"<(\w+:)?", text).group(1) or ""
+        number = re.search(r'\sr="(\d+)"', tag)
+        if number:
+            self.head, self.tail = tag[:number.start(1)], tag[number.end(1):]
+        else:
+            at = len(self.prefix) + 4  # After "<row"
+            self.head, self.tail = tag[:at] + ' r="', '"' + tag[at:]
+        self.end = "" if tag.endswith("/>") else f"</{self.prefix}row>"
+        self.first_row = first_row
+        self.replacements = plan.replacements
+        self.cells = [
+            self.compile_cell(match.group(0).decode("utf-8"), row, strings, plan, masters)
+            for match in CELL_FRAGMENT_RE.finditer(fragment)
+        ]
+
+    def compile_cell(self, cell, row, strings, plan, masters):
+        attrs = dict(XML_ATTR_RE.findall(cell[:cell.index(">")]))
+        column = re.match(r"[A-Z]*", attrs.get("r", "")).group(0)
+        rest = "".join(f' {key}="{val}"' for key, val in attrs.items() if key not in ("r", "t"))
+
+        formula = re.search(r"<(?:\w+:)?f\b([^>]*?)(?:/>|>([^<]*)</(?:\w+:)?f>)", cell)
+        if formula is not None:
+            f_attrs = dict(XML_ATTR_RE.findall(formula.group(1)))
+            text = formula.group(2)
+            if not text and f_attrs.get("t") == "shared" and f_attrs.get("si") in masters:
+                master, master_row, master_column = masters[f_attrs["si"]]
+                text = fill_down(master, row - master_row, column_number(column) - master_column)
+            if text and column:
+                text = plan.shift_refs(text, anchor=row)
+                return ("formula", column, rest, compile_fill_down(text), f_attrs.get("t") == "array")
+
+        value = None
+        if attrs.get("t") == "s":
+            index = re.search(r"<(?:\w+:)?v>(\d+)<", cell)
+            value = strings.get(index.group(1)) if index else None
+        elif attrs.get("t") == "inlineStr":
+            value = "".join(t.text or "" for t in string_text_nodes(parse_xml_fragment(cell.encode("utf-8"))))
+        if value is not None and "{" in value and column:
+            value = EXPANSION_MARKER_RE.sub("", value)
+            pieces = PLACEHOLDER_RE.split(value)
+            parts = [(piece,) if i % 2 else piece for i, piece in enumerate(pieces) if piece or i % 2]
+            if not parts:
+                return ("empty", column, rest)
+            return ("text", column, rest, parts, len(parts) == 1 and isinstance(parts[0], tuple))
+
+        number = re.search(r'\sr="[A-Z]+(\d+)"', cell)
+        if number is None:
+            return ("raw", cell)
+        return ("static", cell[:number.start(1)], cell[number.end(1):])
+
+    def value(self, key, item):
+        if key in item:
+            val = item[key]
+            return "" if val is None else val
+        val = self.replacements.get(key)
+        return f"{{{key}}}" if val is None or is_expansion_key(key) else val
+
+    def emit_blank(self, row):
+        """The row as it stands for an empty list: fixed cells kept, item cells left empty but styled."""
+        out = [self.head, str(row), self.tail]
+        for cell in self.cells:
+            if cell[0] == "static":
+                out += (cell[1], str(row), cell[2])
+            elif cell[0] == "raw":
+                out.append(cell[1])
+            else:
+                out.append(f'<{self.prefix}c r="{cell[1]}{row}"{cell[2]}/>')
+        out.append(self.end)
+        return "".join(out).encode("utf-8")
+
+    def emit(self, row, item):
+        p = self.prefix
+        out = [self.head, str(row), self.tail]
+        for cell in self.cells:
+            kind = cell[0]
+            if kind == "static":
+                out += (cell[1], str(row), cell[2])
+            elif kind == "raw":
+                out.append(cell[1])
+            elif kind == "text":
+                _, column, rest, parts, single = cell
+                if single:
+                    val = self.value(parts[0][0], item)
+                    number = numeric_cell_value(val)
+                    if number is not None:
+                        out.append(f'<{p}c r="{column}{row}"{rest}><{p}v>{number}</{p}v></{p}c>')
+                        continue
+                    text = str(val)
+                else:
+                    text = "".join(part if isinstance(part, str) else str(self.value(part[0], item)) for part in parts)
+                out.append(
+                    f'<{p}c r="{column}{row}"{rest} t="inlineStr"><{p}is><{p}t xml:space="preserve">'
+                    f"{xml_escape(text)}</{p}t></{p}is></{p}c>"
+                )
+            elif kind == "formula":
+                _, column, rest, parts, array = cell
+                k = row - self.first_row
+                formula = "".join(part if isinstance(part, str) else str(part + k) for part in parts)
+                f_tag = f'<{p}f t="array" ref="{column}{row}">' if array else f"<{p}f>"
+                out.append(f'<{p}c r="{column}{row}"{rest}>{f_tag}{formula}</{p}f></{p}c>')
+            else:
+                out.append(f'<{p}c r="{cell[1]}{row}"{cell[2]}/>')
+        out.append(self.end)
+        return "".join(out).encode("utf-8")
+
+
+class SheetExpansion:
+    """The {rows:name} markers of one worksheet, sized for one render."""
+
+    def __init__(self, sheet, entries, replacements):
+        self.sheet = sheet
+        self.entries = {entry["row"]: entry for entry in entries}
+        self.replacements = replacements
+        self.counts = {row: count_expansion_items(replacements[entry["key"]]) for row, entry in self.entries.items()}
+        # Highest marker first, as shift_inserted_rows expects. An empty list
+        # still leaves one blank row, so ranges over the items stay valid.
+        self.shifts = sorted(((row, max(n, 1) - 1) for row, n in self.counts.items()), reverse=True)
+        for row, n in self.counts.items():
+            if self.first_row(row) + n - 1 > EXCEL_MAX_ROWS:
+                raise ValueError(f"Expanding row {row} of '{sheet}' would pass Excel's {EXCEL_MAX_ROWS:,} row limit")
+
+    def offset(self, row):
+        """How far template row `row` moves down once the markers above it are expanded."""
+        return sum(delta for at, delta in self.shifts if at < row)
+
+    def first_row(self, marker_row):
+        return marker_row + self.offset(marker_row)
+
+    def shift_refs(self, text, anchor=None, qualified_only=False, spread=False):
+        return shift_inserted_rows(text, self.sheet, self.shifts, anchor, qualified_only, spread)
+
+    def shift_refs_bytes(self, data, qualified_only=False):
+        return self.shift_refs(data.decode("utf-8"), qualified_only=qualified_only).encode("utf-8")
+
+    def _shift_attrs(self, tag, spread=False):
+        return RANGE_ATTR_RE.sub(
+            lambda m: m.group(1) + self.shift_refs(m.group(2).decode("utf-8"), spread=spread).encode("utf-8") + b'"',
+            tag,
+        )
+
+    def _shift_range_tag(self, match):
+        tag = match.group(0)
+        if match.group(1) == b"mergeCell":
+            ref = RANGE_ATTR_RE.search(tag).group(2).decode("utf-8")
+            rows = set(re.findall(r"\d+", ref))
+            row = int(rows.pop()) if len(rows) == 1 else None
+            if row in self.counts:
+                # A merge within the marker row is repeated on every item row
+                first = self.first_row(row)
+                head, _, tail = RANGE_ATTR_RE.sub(rb'\1\0"', tag).partition(b"\0")
+                parts = compile_fill_down(ref)
+                return b"".join(
+                    head + "".join(p if isinstance(p, str) else str(p + first + k - row) for p in parts).encode("utf-8") + tail
+                    for k in range(max(self.counts[row], 1))
+                )
+        # Formatting and validation set on the marker row apply to every item row
+        return self._shift_attrs(tag, spread=match.group(1) in (b"conditionalFormatting", b"dataValidation"))
+
+    def shift_ranges(self, data):
+        """Shift the ranges in the XML around <sheetData> (merges, formats, validations) or in a table part."""
+        if b"ref=" in data:
+            data = RANGE_TAG_RE.sub(self._shift_range_tag, data)
+        if b"formula" in data:
+            data = RULE_FORMULA_RE.sub(lambda m: m.group(1) + self.shift_refs_bytes(m.group(2)), data)
+        if b"mergeCells" in data:
+            # The count is optional, and repeated merges change it
+            data = MERGE_COUNT_RE.sub(rb"\1", data)
+        return data
+
+    def _shift_formula(self, match):
+        head, text, close = match.groups()
+        head = self._shift_attrs(head) if b"ref=" in head else head
+        if text is None:
+            return head + b"/>"
+        return head + b">" + self.shift_refs_bytes(text) + close
+
+    def shift_row(self, data, row, masters, rewrite_inline):
+        if b"<f" in data or b":f" in data:
+            if b'"shared"' in data:
+                note_shared_formulas(data, row, masters)
+            data = FORMULA_ELEMENT_RE.sub(self._shift_formula, data)
+        delta = self.offset(row)
+        if delta:
+            if row + delta > EXCEL_MAX_ROWS:
+                raise ValueError(f"Expanding '{self.sheet}' would pass Excel's {EXCEL_MAX_ROWS:,} row limit")
+            data = CELL_REF_RE.sub(lambda m: m.group(1) + str(int(m.group(2)) + delta).encode("ascii") + b'"', data)
+        if b"{" in data and (b"inlineStr" in data or b"<f" in data or b":f" in data):
+            data = XLSX_FRAGMENTS["inline"][0].sub(lambda m: rewrite_inline(m.group(0)), data)
+        return data
+
+    def render(self, src, info, rewrite_inline):
+        return join_chunks(self._render(src, info, rewrite_inline))
+
+    def _render(self, src, info, rewrite_inline):
+        masters = {}
+        previous = 0
+        with src.open(info) as f:
+            for is_row, data in split_xml_fragments(read_chunks(f), *ROW_FRAGMENTS):
+                if not is_row:
+                    yield self.shift_ranges(data)
+                    continue
+                match = ROW_NUMBER_RE.match(data)
+                row = previous = int(match.group(1)) if match else previous + 1
+                entry = self.entries.get(row)
+                if entry is None:
+                    yield self.shift_row(data, row, masters, rewrite_inline)
+                    continue
+
+                first = self.first_row(row)
+                template = RowTemplate(data, row, first, entry["strings"], self, masters)
+                n = 0
+                for n, item in enumerate(expansion_items(self.replacements[entry["key"]]), start=1):
+                    yield template.emit(first + n - 1, item)
+                if n != self.counts[row]:
+                    raise ValueError(f"The rows for {{{entry['key']}}} changed while rendering")
+                if not n:
+                    yield template.emit_blank(first)
+                trace_count("rows_expanded", n)
+
+
+def note_shared_formulas(data, row, masters):
+    """Remember the shared formulas defined in a row, for followers in a marker row."""
+    for cell in CELL_FRAGMENT_RE.finditer(data):
+        formula = FORMULA_ELEMENT_RE.search(cell.group(0))
+        if formula is None or not formula.group(2) or b'"shared"' not in formula.group(1):
+            continue
+        si = re.search(rb'\ssi="(\d+)"', formula.group(1))
+        ref = re.search(rb'\sr="([A-Z]+)\d+"', cell.group(0))
+        if si and ref:
+            masters[si.group(1).decode("ascii")] = (
+                formula.group(2).decode("utf-8"), row, column_number(ref.group(1).decode("ascii")))
+
+
+class WorkbookExpansion:
+    """The worksheets a render expands, and the table parts that sit on them."""
+
+    def __init__(self, sheets, tables):
+        self.sheets = sheets
+        self.tables = tables
+
+    def shift_refs_bytes(self, data):
+        """Shift the references into any expanded sheet; the text is from elsewhere in the workbook."""
+        if b"!" not in data:
+            return data
+        text = data.decode("utf-8")
+        for sheet in self.sheets.values():
+            text = sheet.shift_refs(text, qualified_only=True)
+        return text.encode("utf-8")
+
+    def _shift_formula(self, match):
+        head, text, close = match.groups()
+        return match.group(0) if text is None else head + b">" + self.shift_refs_bytes(text) + close
+
+    def render_references(self, src, info, rewrite_inline=None):
+        """Re-render another worksheet or a chart whose formulas may point into an expanded sheet."""
+        if CHART_PART_RE.fullmatch(info.filename):
+            data = CHART_FORMULA_RE.sub(lambda m: m.group(1) + self.shift_refs_bytes(m.group(2)), src.read(info))
+            return (data,)
+        return join_chunks(self._render_references(src, info, rewrite_inline))
+
+    def _render_references(self, src, info, rewrite_inline):
+        with src.open(info) as f:
+            for is_row, data in split_xml_fragments(read_chunks(f), *ROW_FRAGMENTS):
+                if is_row:
+                    if b"!" in data:
+                        data = FORMULA_ELEMENT_RE.sub(self._shift_formula, data)
+                    if rewrite_inline is not None and b"{" in data and (
+                            b"inlineStr" in data or b"<f" in data or b":f" in data):
+                        data = XLSX_FRAGMENTS["inline"][0].sub(lambda m: rewrite_inline(m.group(0)), data)
+                yield data
+
+
+def plan_expansions(template_path, index, replacements):
+    """Size the {rows:name} expansions this render makes, or return None if it makes none."""
+    by_part = {}
+    for entry in index.get("expansions", ()):
+        value = replacements.get(entry["key"])
+        if value is not None and value != "":
+            by_part.setdefault(entry["part"], []).append(entry)
+    if not by_part:
+        return None
+
+    from lxml import etree
+
+    sheets = {part: SheetExpansion(entries[0]["sheet"], entries, replacements) for part, entries in by_part.items()}
+    tables = {}
+    with zipfile.ZipFile(template_path) as zf:
+        names = set(zf.namelist())
+        for part, sheet in sheets.items():
+            folder, _, file_name = part.rpartition("/")
+            rels_name = f"{folder}/_rels/{file_name}.rels"
+            if rels_name not in names:
+                continue
+            for rel in etree.fromstring(zf.read(rels_name), make_xml_parser()):
+                if rel.get("Type", "").endswith("/table") and rel.get("TargetMode") != "External":
+                    target = rel.get("Target", "")
+                    # openpyxl writes package-absolute targets ("/xl/tables/table1.xml")
+                    if target.startswith("/"):
+                        target = target.lstrip("/")
+                    else:
+                        target = posixpath.normpath(posixpath.join(folder, target))
+                    tables[target] = sheet
+    return WorkbookExpansion(sheets, tables)
+
+
+def rewrite_for_expansion(src, info, plan):
+    """Adjust the workbook-level parts an expansion leaves stale.
+
+    Moved formula cells make the calculation chain wrong, so it is dropped
+    (Excel rebuilds it) and the workbook is set to recalculate on open.
+    Defined names and tables that point into an expanded sheet are shifted.
+    """
+    name = info.filename
+    if name == "xl/calcChain.xml":
+        return DROP_PART
+    data = src.read(info)
+    if name in plan.tables:
+        data = plan.tables[name].shift_ranges(data)
+    elif name == "[Content_Types].xml":
+        data = re.sub(rb'<Override\b[^>]*PartName="/xl/calcChain\.xml"[^>]*/>', b"", data)
+    elif name == "xl/_rels/workbook.xml.rels":
+        data = re.sub(rb'<Relationship\b[^>]*Target="[^"]*calcChain\.xml"[^>]*/>', b"", data)
+    elif name == "xl/workbook.xml":
+        data = DEFINED_NAME_RE.sub(lambda m: m.group(1) + plan.shift_refs_bytes(m.group(2)), data)
+        data = set_full_calc_on_load(data)
+    return (data,)
+
+
+def scan_placeholders(path, progress=None):
+    """Return {key: {"count": n, "locations": [index entry, ...]}} for a template."""
+    found = {}
+    with traced("extract", template=os.path.abspath(path)):
+        entries = compile_template(path, progress)["entries"]
+    for entry in entries:
+        for key in entry["keys"]:
+            info = found.setdefault(key, {"count": 0, "locations": []})
+            info["count"] += 1
+            if not info["locations"] or info["locations"][-1] is not entry:
+                info["locations"].append(entry)
+    return found
+
+
+def describe_location(entry):
+    if "cell" in entry:
+        return f"{entry['sheet']}!{entry['cell']}"
+    if "item" in entry:
+        return f"{entry['part']} string #{entry['item']}"
+    return f"{entry['part']} paragraph {entry['paragraph']}"
+
+
+def extract_placeholders_from_template(path, progress=None):
+    return sorted(scan_placeholders(path, progress))
+
+
+def get_app_dir():
+    return os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else os.path.abspath(__file__))
+
+
+def get_profiles_dir():
+    path = os.path.join(get_app_dir(), "profiles")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_cache_dir(name):
+    path = os.path.join(get_app_dir(), "cache", name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# Compiled template index -----------------------------------------------------
+#
+# Compiling a template records where its placeholders live so renders and
+# extraction only visit those nodes. Indexes are stored as JSON under
+# cache/templates/<sha256>.json. The path -> (mtime, size, sha256) memo
+# means an unchanged template is only hashed once per process. Only the
+# latest version of each path is remembered: when a file changes, the index
+# and parts of its old content are dropped unless another path still has it,
+# so a long-running watch or serve holds one index per template.
+
+TEMPLATE_INDEX_VERSION = 6
+
+_template_hashes = {}  # abspath -> (mtime_ns, size, sha256)
+_template_indexes = {}
+_template_memo_lock = threading.Lock()
+
+
+def template_fingerprint(path):
+    """Return (sha256, mtime) of a template, hashing it only when it changed."""
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    known = _template_hashes.get(key)
+    if known is not None and known[:2] == stamp:
+        return known[2], st.st_mtime
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    sha = digest.hexdigest()
+    with _template_memo_lock:
+        old = _template_hashes.get(key)
+        _template_hashes[key] = (*stamp, sha)
+        if old is not None and old[2] != sha and not template_sha_in_use(old[2]):
+            _template_indexes.pop(old[2], None)
+            _index_parts.pop(old[2], None)
+    return sha, st.st_mtime
+
+
+def template_sha_in_use(sha):
+    """Whether some remembered path still has this content. Call with _template_memo_lock held."""
+    return any(known[2] == sha for known in _template_hashes.values())
+
+
+def excel_sheet_names(zf):
+    """Map worksheet part names to their sheet titles."""
+    from lxml import etree
+
+    try:
+        workbook = etree.fromstring(zf.read("xl/workbook.xml"), make_xml_parser())
+        rels = etree.fromstring(zf.read("xl/_rels/workbook.xml.rels"), make_xml_parser())
+    except KeyError:
+        return {}
+    targets = {}
+    for rel in rels:
+        target = rel.get("Target", "")
+        targets[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else "xl/" + target
+    names = {}
+    for elem in workbook.iter():
+        if local_name(elem) == "sheet":
+            rel_id = elem.get("{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id")
+            if rel_id in targets:
+                names[targets[rel_id]] = elem.get("name")
+    return names
+
+
+def scan_word_part(path, name):
+    """Index the paragraphs of one Word part that hold placeholders.
+
+    The part is iterparsed and each outermost paragraph is discarded once
+    scanned, so memory is bounded by the largest paragraph rather than the
+    part. Ordinals count <w:p> start tags, matching root.iter(W_P).
+    """
+    from lxml import etree
+
+    entries = []
+    open_paragraphs = []
+    count = 0
+    with zipfile.ZipFile(path) as zf, zf.open(name) as f:
+        events = etree.iterparse(f, events=("start", "end"), tag=W_P, resolve_entities=False, huge_tree=True)
+        for event, p in events:
+            if event == "start":
+                open_paragraphs.append(count)
+                count += 1
+                continue
+
+            ordinal = open_paragraphs.pop()
+            text = "".join(t.text or "" for t in paragraph_text_nodes(p))
+            if "{" in text:
+                keys = PLACEHOLDER_RE.findall(text)
+                if keys:
+                    entries.append({"part": name, "paragraph": ordinal, "keys": keys})
+            if not open_paragraphs:
+                p.clear()
+                parent = p.getparent()
+                while p.getprevious() is not None:
+                    del parent[0]
+    trace_count("nodes_scanned", count)
+    # Nested paragraphs end before the paragraph around them
+    entries.sort(key=lambda entry: entry["paragraph"])
+    return entries
+
+
+def scan_excel_part(path, name, kind, sheet_names):
+    """Index the shared strings, or inline-string and formula cells, of one Excel part that hold placeholders."""
+    entries = []
+    item = 0
+    with zipfile.ZipFile(path) as zf, zf.open(name) as f:
+        for is_fragment, fragment in split_xml_fragments(read_chunks(f), *XLSX_FRAGMENTS[kind]):
+            if not is_fragment:
+                continue
+            item += 1
+            if b"{" not in fragment:
+                continue
+            elem = parse_xml_fragment(fragment)
+            keys = PLACEHOLDER_RE.findall("".join(t.text or "" for t in string_text_nodes(elem)))
+            formula = cell_formula(elem) if kind == "inline" else None
+            formula_keys = PLACEHOLDER_RE.findall(formula.text or "") if formula is not None else []
+            if not keys and not formula_keys:
+                continue
+            if kind == "shared":
+                entries.append({"part": name, "item": item - 1, "keys": keys})
+            elif formula_keys:
+                entries.append({"part": name, "sheet": sheet_names.get(name, name), "cell": elem.get("r"),
+                                "keys": formula_keys, "formula": True})
+            else:
+                entries.append({"part": name, "sheet": sheet_names.get(name, name), "cell": elem.get("r"), "keys": keys})
+    trace_count("nodes_scanned", item)
+    return entries
+
+
+def build_template_index(path, progress=None):
+    """Scan a template's text parts concurrently and list every node that holds a placeholder.
+
+    Each entry's "keys" lists the placeholders in the order they occur,
+    repeats included.
+    """
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+        if path.lower().endswith(".docx"):
+            jobs = [(scan_word_part, (path, name)) for name in names if WORD_STORY_PART_RE.fullmatch(name)]
+        elif path.lower().endswith(".xlsx"):
+            sheet_names = excel_sheet_names(zf)
+            jobs = [
+                (scan_excel_part, (path, name, xlsx_fragment_kind(name), sheet_names))
+                for name in names if xlsx_fragment_kind(name)
+            ]
+        else:
+            raise ValueError(f"Unsupported template type: {path}")
+
+    entries = []
+    trace = current_trace()
+
+    def run(job):
+        with activate_trace(trace):
+            return job[0](*job[1])
+
+    report_progress(progress, "Scanning template", 0.0)
+    # lxml and zlib release the GIL, so parts really are scanned in parallel
+    with ThreadPoolExecutor(max_workers=max(1, min(len(jobs), os.cpu_count() or 1))) as pool:
+        for i, part_entries in enumerate(pool.map(run, jobs), start=1):
+            entries.extend(part_entries)
+            report_progress(progress, "Scanning template", i / len(jobs))
+    return entries
+
+
+def scan_expansion_rows(path, entries):
+    """Find the worksheet rows that hold a {rows:name} marker.
+
+    Each row is recorded with the text of the shared strings its cells use,
+    so expanding it does not mean reading the shared strings table again.
+    """
+    shared_markers = {}
+    rows = {}
+    for entry in entries:
+        keys = [key for key in entry["keys"] if is_expansion_key(key)]
+        if not keys:
+            continue
+        if "item" in entry:
+            shared_markers.setdefault(entry["item"], keys[0])
+        elif entry.get("cell") and not entry.get("formula"):
+            row = int(entry["cell"].lstrip("$ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+            rows.setdefault((entry["part"], row), {
+                "part": entry["part"], "sheet": entry["sheet"], "row": row, "key": keys[0], "strings": []})
+    if not shared_markers and not rows:
+        return []
+
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+        sheet_names = excel_sheet_names(zf)
+        for name in names:
+            if not WORKSHEET_PART_RE.fullmatch(name):
+                continue
+            previous = 0
+            with zf.open(name) as f:
+                for is_row, data in split_xml_fragments(read_chunks(f), *ROW_FRAGMENTS):
+                    if not is_row:
+                        continue
+                    match = ROW_NUMBER_RE.match(data)
+                    row = previous = int(match.group(1)) if match else previous + 1
+                    shared = [int(v) for attrs, v in SHARED_CELL_RE.findall(data) if b't="s"' in attrs]
+                    found = rows.get((name, row))
+                    if found is None:
+                        keys = [shared_markers[i] for i in shared if i in shared_markers]
+                        if not keys:
+                            continue
+                        found = rows[(name, row)] = {
+                            "part": name, "sheet": sheet_names.get(name, name), "row": row, "key": keys[0]}
+                    found["strings"] = shared
+
+        wanted = {i for found in rows.values() for i in found["strings"]}
+        texts = {}
+        if wanted and SHARED_STRINGS_PART in names:
+            item = 0
+            with zf.open(SHARED_STRINGS_PART) as f:
+                for is_fragment, fragment in split_xml_fragments(read_chunks(f), *XLSX_FRAGMENTS["shared"]):
+                    if not is_fragment:
+                        continue
+                    if item in wanted:
+                        texts[str(item)] = "".join(t.text or "" for t in string_text_nodes(parse_xml_fragment(fragment)))
+                    item += 1
+
+    for found in rows.values():
+        found["strings"] = {str(i): texts[str(i)] for i in found["strings"] if str(i) in texts}
+    return sorted(rows.values(), key=lambda found: (found["part"], found["row"]))
+
+
+def compile_template(path, progress=None):
+    """Return the placeholder index of a template, compiling it on first use."""
+    with trace_stage("fingerprint"):
+        sha, mtime = template_fingerprint(path)
+    index = _template_indexes.get(sha)
+    if index is not None:
+        trace_count("index_memory_hits")
+        return index
+
+    cache_path = None
+    try:
+        with trace_stage("index_load"):
+            cache_path = os.path.join(get_cache_dir("templates"), f"{sha}.json")
+            with open(cache_path, "r") as f:
+                index = json.load(f)
+        if index.get("version") != TEMPLATE_INDEX_VERSION:
+            index = None
+    except (OSError, ValueError):
+        index = None
+
+    if index is not None:
+        trace_count("index_disk_hits")
+    else:
+        with trace_stage("index_build"):
+            entries = build_template_index(path, progress)
+            expansions = scan_expansion_rows(path, entries) if path.lower().endswith(".xlsx") else []
+        trace_count("index_builds")
+        index = {
+            "version": TEMPLATE_INDEX_VERSION,
+            "sha256": sha,
+            "mtime": mtime,
+            "source": os.path.basename(path),
+            "entries": entries,
+            "expansions": expansions,
+        }
+        if cache_path:
+            try:
+                write_json_atomic(cache_path, index)
+            except OSError:
+                pass  # The cache is an optimisation; a read-only install still renders
+
+    with _template_memo_lock:
+        # The file may have changed again while this was compiling
+        if template_sha_in_use(sha):
+            _template_indexes[sha] = index
+    return index
+
+
+def write_json_atomic(path, data):
+    tmp_path = temp_path_for(path)
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# Parsed template cache -------------------------------------------------------
+#
+# Within a session the same template is rendered again and again. The parts
+# a render rewrites are kept parsed here, keyed by (path, mtime, size), and
+# every render works on its own copy so the cached state stays pristine.
+# The last rendered bytes of each part are kept as well, see "Incremental
+# re-render" below.
+
+EXCEL_PART_CACHE_LIMIT = 32 << 20
+
+
+class ParsedTemplate:
+    def __init__(self):
+        self.parts = {}
+        self.packed = {}  # (part, piece index) -> plain Excel piece run through deflate_segment
+        self.rendered = {}  # part -> (signature, DeflatedPart or None) from the last render
+        self.word_renders = {}  # part -> (key values, tree, size) of the last render of a Word part
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def word_part(self, src, info):
+        """Return a private copy of a Word part's tree, parsing it on first use."""
+        from lxml import etree
+
+        with self.lock:
+            root = self.parts.get(info.filename)
+            if root is None:
+                root = self.parts[info.filename] = etree.fromstring(src.read(info), make_xml_parser())
+                self.nbytes += info.file_size
+            return copy.deepcopy(root)
+
+    def original_paragraphs(self, src, info, paragraphs):
+        """Return {ordinal: private copy of the template paragraph} for the given ordinals.
+
+        An ordinal nested inside another one that is returned (a text box
+        paragraph) is left out, as the outer copy already holds it.
+        """
+        from lxml import etree
+
+        with self.lock:
+            root = self.parts.get(info.filename)
+            if root is None:
+                root = self.parts[info.filename] = etree.fromstring(src.read(info), make_xml_parser())
+                self.nbytes += info.file_size
+            if not paragraphs:
+                return {}
+            elements = list(root.iter(W_P))
+            originals = {}
+            end = 0
+            for i in sorted(set(paragraphs)):
+                if i >= end:
+                    originals[i] = copy.deepcopy(elements[i])
+                    end = i + sum(1 for _ in elements[i].iter(W_P))
+            return originals
+
+    def take_word_render(self, name):
+        """Remove and return (key values, tree) of the last render of a Word part, or None.
+
+        The caller owns the tree from then on and hands it back with
+        keep_word_render, so two renders never change the same tree.
+        """
+        with self.lock:
+            last = self.word_renders.pop(name, None)
+            if last is None:
+                return None
+            self.nbytes -= last[2]
+            return last[0], last[1]
+
+    def keep_word_render(self, name, values, root, size):
+        with self.lock:
+            last = self.word_renders.pop(name, None)
+            if last is not None:
+                self.nbytes -= last[2]
+            self.word_renders[name] = (values, root, size)
+            self.nbytes += size
+
+    def excel_part(self, src, info, kind):
+        """Return an Excel part as (is_template, bytes) pieces, or None if it is too big to hold.
+
+        Only fragments that contain a "{" are flagged; everything in between is
+        merged into plain runs of bytes, so a render is a walk over a short
+        list. The pieces are immutable and shared between renders.
+        """
+        with self.lock:
+            pieces = self.parts.get(info.filename)
+            if pieces is None:
+                if info.file_size > EXCEL_PART_CACHE_LIMIT:
+                    return None
+                pieces = []
+                plain = []
+                with src.open(info) as f:
+                    for is_fragment, data in split_xml_fragments(read_chunks(f), *XLSX_FRAGMENTS[kind]):
+                        if is_fragment and b"{" in data:
+                            if plain:
+                                pieces.append((False, b"".join(plain)))
+                                plain = []
+                            pieces.append((True, data))
+                        else:
+                            plain.append(data)
+                if plain:
+                    pieces.append((False, b"".join(plain)))
+                self.parts[info.filename] = pieces
+                self.nbytes += info.file_size
+            return pieces
+
+    def packed_piece(self, name, i, data):
+        """Return plain piece i of an Excel part compressed, compressing it on first use."""
+        with self.lock:
+            packed = self.packed.get((name, i))
+        if packed is None:
+            packed = deflate_segment(data)
+            with self.lock:
+                if (name, i) not in self.packed:
+                    self.packed[name, i] = packed
+                    self.nbytes += len(packed)
+        return packed
+
+    def rendered_part(self, name, signature):
+        """Return (True, part) if name was last rendered from the same inputs, else (False, None)."""
+        with self.lock:
+            last = self.rendered.get(name)
+        if last is not None and last[0] == signature:
+            return True, last[1]
+        return False, None
+
+    def keep_rendered(self, name, signature, part):
+        with self.lock:
+            last = self.rendered.get(name)
+            if last is not None and last[1] is not None:
+                self.nbytes -= last[1].compress_size
+            self.rendered[name] = (signature, part)
+            if part is not None:
+                self.nbytes += part.compress_size
+
+    def forget_rendered(self):
+        with self.lock:
+            for _, part in self.rendered.values():
+                if part is not None:
+                    self.nbytes -= part.compress_size
+            self.rendered.clear()
+            for _, _, size in self.word_renders.values():
+                self.nbytes -= size
+            self.word_renders.clear()
+
+
+class ParsedTemplateCache:
+    """LRU of ParsedTemplate objects, bounded by template count and XML bytes held."""
+
+    def __init__(self, max_entries=8, max_bytes=256 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_entries=None, max_bytes=None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        self.trim()
+
+    @contextmanager
+    def use(self, path):
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self.lock:
+            parsed = self.entries.get(key)
+            if parsed is None:
+                self.misses += 1
+                # An older version of the same file will never be asked for again
+                for stale in [k for k in self.entries if k[0] == key[0]]:
+                    del self.entries[stale]
+                parsed = ParsedTemplate()
+                if self.max_entries > 0:
+                    self.entries[key] = parsed
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+        try:
+            yield parsed
+        finally:
+            self.trim()
+
+    def trim(self):
+        with self.lock:
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            while self.entries and sum(p.nbytes for p in self.entries.values()) > self.max_bytes:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "templates": len(self.entries),
+                "xml_bytes": sum(p.nbytes for p in self.entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def describe(self):
+        stats = self.stats()
+        return f"{stats['templates']} template(s) cached, {stats['xml_bytes'] / 1e6:.1f} MB of XML"
+
+
+template_cache = ParsedTemplateCache()
+
+
+def warm_template(path):
+    """Compile a template and parse the parts a render rewrites into template_cache."""
+    index = compile_template(path)
+    parts = sorted({entry["part"] for entry in index["entries"]})
+    with template_cache.use(path) as parsed, zipfile.ZipFile(path) as src:
+        for name in parts:
+            info = src.getinfo(name)
+            kind = xlsx_fragment_kind(name)
+            if path.lower().endswith(".docx"):
+                parsed.word_part(src, info)
+            elif kind is not None:
+                parsed.excel_part(src, info, kind)
+
+
+# Incremental re-render -------------------------------------------------------
+#
+# While a document is reviewed, Generate is pressed again and again with one
+# or two values changed. Each part remembers, on its ParsedTemplate, a hash
+# of the values of the keys it holds and the compressed bytes it rendered
+# to; a part whose hash is unchanged is spliced into the new archive as is,
+# without parsing, replacing or compressing it again. A Word part that did
+# change keeps its last rendered tree, so only the paragraphs holding a
+# changed key are filled again; in an Excel string table only the strings
+# with placeholders are compressed again.
+
+# Parts bigger than this in the template are always rendered
+RENDERED_PART_LIMIT = 32 << 20
+
+
+def part_signatures(index, replacements):
+    """Hash, per indexed part, the replacement values that can change how it renders."""
+    # A key with braces in it can match across placeholders, so it counts everywhere
+    loose = sorted(
+        (str(key), cache_key_value(key, val)) for key, val in replacements.items()
+        if "{" in str(key) or "}" in str(key)
+    )
+    signatures = {}
+    for name, part in index_parts(index).items():
+        # A missing key leaves its placeholder in place, unlike any value
+        values = [(key, cache_key_value(key, replacements[key]) if key in replacements else None)
+                  for key in sorted(part.keys)]
+        payload = json.dumps([values, loose], ensure_ascii=False)
+        signatures[name] = hashlib.sha256(payload.encode("utf-8", "surrogatepass")).hexdigest()
+    return signatures
+
+
+def reuse_rendered_parts(parsed, signatures, render_part):
+    """Wrap a write_ooxml_copy render_part callback so parts whose inputs have
+    not changed since the last render of this template are spliced back in.
+    """
+    def render(src, info):
+        signature = signatures.get(info.filename)
+        if signature is None or info.file_size > RENDERED_PART_LIMIT:
+            return render_part(src, info)
+        found, part = parsed.rendered_part(info.filename, signature)
+        if found:
+            trace_count("parts_reused")
+            return part
+        part = render_part(src, info)
+        if part is DROP_PART:
+            return part
+        if part is not None and not isinstance(part, DeflatedPart):
+            with trace_stage("write"):
+                part = deflate_part([(b"".join(part), None)])
+        parsed.keep_rendered(info.filename, signature, part)
+        return part
+
+    return render
+
+
+# Output cache ----------------------------------------------------------------
+#
+# Rendering is deterministic, so a finished document is kept under
+# cache/outputs/<key><ext>, where the key hashes the template's content with
+# the replacements that can affect it. Asking for the same document again
+# copies (or hard-links) the stored file instead of rendering. Entries are
+# evicted least recently used first, using the file mtime as the clock, so
+# every process sharing the folder agrees on the order.
+
+OUTPUT_CACHE_VERSION = 1
+
+def output_cache_key(template_path, replacements):
+    """Hash the template content and the replacements that can change its output."""
+    index = compile_template(template_path)
+    keys = set().union(*(part.keys for part in index_parts(index).values()))
+    # Values for placeholders the template lacks cannot change the output;
+    # keys with braces in them are kept, as they can match across placeholders
+    relevant = {
+        str(key): cache_key_value(key, val) for key, val in replacements.items()
+        if str(key) in keys or "{" in str(key) or "}" in str(key)
+    }
+    payload = json.dumps(
+        [OUTPUT_CACHE_VERSION, TEMPLATE_INDEX_VERSION, index["sha256"], sorted(relevant.items())],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def cache_key_value(key, val):
+    """The part of a replacement value that identifies the output, as text."""
+    if not is_expansion_key(key):
+        return str(val)
+    # Row data given as a file counts by its content, not its name
+    if isinstance(val, str) and os.path.isfile(val.strip()):
+        return f"{val.strip()}@{template_fingerprint(val.strip())[0]}"
+    return json.dumps(val, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class OutputCache:
+    """Size-bounded LRU of rendered documents on disk."""
+
+    def __init__(self, max_bytes=512 << 20, link=False):
+        self.max_bytes = max_bytes
+        self.link = link
+        self.lock = threading.Lock()
+        self.total_bytes = None  # Measured on first store
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def configure(self, max_bytes=None, link=None):
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        if link is not None:
+            self.link = link
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def path_for(self, key, extension):
+        return os.path.join(get_cache_dir("outputs"), key + extension)
+
+    def fetch(self, key, output_path):
+        """Place the cached document for key at output_path; False if there is none."""
+        tmp_path = temp_path_for(output_path)
+        try:
+            # Inside the try: an unwritable cache folder is just a miss, never a failed render
+            cached = self.path_for(key, os.path.splitext(output_path)[1].lower())
+            os.utime(cached)  # Mark as recently used
+            if self.link:
+                try:
+                    os.link(cached, tmp_path)
+                except OSError:
+                    shutil.copyfile(cached, tmp_path)
+            else:
+                shutil.copyfile(cached, tmp_path)
+            os.replace(tmp_path, output_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self.lock:
+                self.misses += 1
+            return False
+        with self.lock:
+            self.hits += 1
+        return True
+
+    def store(self, key, output_path):
+        tmp_path = None
+        try:
+            cached = self.path_for(key, os.path.splitext(output_path)[1].lower())
+            tmp_path = temp_path_for(cached)
+            shutil.copyfile(output_path, tmp_path)
+            os.replace(tmp_path, cached)
+        except OSError:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return  # The cache is an optimisation; the render itself succeeded
+        with self.lock:
+            self.stores += 1
+            if self.total_bytes is not None:
+                self.total_bytes += os.path.getsize(output_path)
+            if self.total_bytes is None or self.total_bytes > self.max_bytes:
+                self.trim()
+
+    def entries(self):
+        found = []
+        try:
+            with os.scandir(get_cache_dir("outputs")) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        st = entry.stat()
+                        found.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            pass  # No usable cache folder holds nothing
+        return found
+
+    def trim(self):
+        """Evict least recently used documents until the cache is back under max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            # Go a little below the limit so the next few stores do not rescan
+            target = self.max_bytes * 0.9
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+        self.total_bytes = total
+
+    def clear(self):
+        with self.lock:
+            for _, _, path in self.entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            if self.total_bytes is None:
+                self.trim()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "link": self.link,
+            }
+
+    def describe(self):
+        stats = self.stats()
+        return (f"output cache {stats['hits']} hit(s), {stats['misses']} miss(es), "
+                f"{stats['bytes'] / 1e6:.1f} MB")
+
+
+output_cache = OutputCache()
+
+
+def generate_document(template_path, output_path, replacements, progress=None):
+    """Fill a .docx or .xlsx template, picking the renderer from the extension.
+
+    Returns True when the document came from the output cache rather than a render.
+    """
+    extension = os.path.splitext(template_path)[1].lower()
+    if extension not in (".docx", ".xlsx"):
+        raise ValueError(f"Unsupported template type: {template_path}")
+
+    with traced("render", template=os.path.abspath(template_path), output=os.path.abspath(output_path)) as trace:
+        key = None
+        if output_cache.enabled and os.path.splitext(output_path)[1].lower() == extension:
+            with trace.stage("output_cache"):
+                key = output_cache_key(template_path, replacements)
+                if output_cache.fetch(key, output_path):
+                    trace.count("output_cache_hits")
+                    report_progress(progress, "Copied from output cache", 1.0)
+                    return True
+            trace.count("output_cache_misses")
+
+        if extension == ".docx":
+            generate_word_output(template_path, output_path, replacements, progress)
+        else:
+            generate_excel_output(template_path, output_path, replacements, progress)
+
+        if key is not None:
+            with trace.stage("output_cache"):
+                output_cache.store(key, output_path)
+        return False
+
+
+# Profile store ---------------------------------------------------------------
+#
+# profiles/*.json stay the source of truth, so profiles can still be copied
+# around or edited by hand. A SQLite index in cache/profiles mirrors them for
+# fast lookups; it is only reconciled with the folder when the folder's mtime
+# changes, and a single stat on load catches files edited in place.
+
+class ProfileStore:
+    def __init__(self, profiles_dir, index_path):
+        self.profiles_dir = profiles_dir
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(index_path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            " name TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, data TEXT)"
+        )
+        self.stamps = {name: (mtime_ns, size) for name, mtime_ns, size in self.db.execute(
+            "SELECT name, mtime_ns, size FROM profiles")}
+        self.dir_mtime = None
+        self.name_index = ([], [], "", [])
+        self.refresh(force=True)
+
+    def path_for(self, name):
+        return os.path.join(self.profiles_dir, f"{name}.json")
+
+    def refresh(self, force=False):
+        """Re-index the folder if it changed since the last refresh. Returns True if any profile did.
+
+        force re-stats every file even when the folder's mtime has not
+        moved, which also catches profiles edited in place.
+        """
+        with self.lock:
+            dir_mtime = os.stat(self.profiles_dir).st_mtime_ns
+            if dir_mtime == self.dir_mtime and not force:
+                return False
+
+            seen = set()
+            changed = False
+            with os.scandir(self.profiles_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    name = entry.name[:-5]
+                    seen.add(name)
+                    st = entry.stat()
+                    if self.stamps.get(name) != (st.st_mtime_ns, st.st_size):
+                        self._index_file(name, st)
+                        changed = True
+            for name in set(self.stamps) - seen:
+                self.db.execute("DELETE FROM profiles WHERE name = ?", (name,))
+                del self.stamps[name]
+                changed = True
+            if changed:
+                self.db.commit()
+
+            if changed or self.dir_mtime is None:
+                self._rebuild_names()
+            self.dir_mtime = dir_mtime
+            return changed
+
+    def _rebuild_names(self):
+        # Lower-cased names are also kept as one newline-joined string so
+        # substring and fuzzy search run inside str.find / re rather than a
+        # Python loop over every profile
+        sorted_names = sorted(self.stamps, key=str.lower)
+        lower_names = [name.lower() for name in sorted_names]
+        offsets = []
+        offset = 0
+        for name in lower_names:
+            offsets.append(offset)
+            offset += len(name) + 1
+        # Published in one assignment: search() runs on the Tk thread without
+        # the lock while --watch refreshes from its own thread
+        self.name_index = (sorted_names, lower_names, "\n".join(lower_names), offsets)
+
+    def _index_file(self, name, st):
+        try:
+            with open(self.path_for(name), "r") as f:
+                data = json.dumps(json.load(f))
+        except (OSError, ValueError):
+            data = None  # Listed, but load() reports the real error
+        self.db.execute(
+            "INSERT OR REPLACE INTO profiles (name, mtime_ns, size, data) VALUES (?, ?, ?, ?)",
+            (name, st.st_mtime_ns, st.st_size, data),
+        )
+        self.stamps[name] = (st.st_mtime_ns, st.st_size)
+
+    def names(self):
+        return list(self.name_index[0])
+
+    def __contains__(self, name):
+        return name in self.stamps
+
+    def load(self, name):
+        with self.lock:
+            st = os.stat(self.path_for(name))
+            if self.stamps.get(name) != (st.st_mtime_ns, st.st_size):
+                self._index_file(name, st)
+                self.db.commit()
+            row = self.db.execute("SELECT data FROM profiles WHERE name = ?", (name,)).fetchone()
+        if row is None or row[0] is None:
+            with open(self.path_for(name), "r") as f:
+                return json.load(f)
+        return json.loads(row[0])
+
+    def save(self, name, data):
+        with self.lock:
+            path = self.path_for(name)
+            tmp_path = temp_path_for(path)
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._index_file(name, os.stat(path))
+            self.db.commit()
+            self._rebuild_names()
+
+    def delete(self, name):
+        with self.lock:
+            os.remove(self.path_for(name))
+            self.db.execute("DELETE FROM profiles WHERE name = ?", (name,))
+            self.db.commit()
+            self.stamps.pop(name, None)
+            self._rebuild_names()
+
+    def search(self, text, limit=200):
+        """Names matching text: prefix matches first, then substrings, then fuzzy (in-order letters)."""
+        query = text.strip().lower()
+        names, lower_names, blob, offsets = self.name_index
+        if not query:
+            return names[:limit]
+
+        # Prefix matches are a contiguous slice of the sorted names
+        start = bisect.bisect_left(lower_names, query)
+        end = start
+        while end < len(names) and end - start < limit and lower_names[end].startswith(query):
+            end += 1
+        picked = list(range(start, end))
+        found = set(picked)
+
+        def collect(positions):
+            for pos in positions:
+                i = bisect.bisect_right(offsets, pos) - 1
+                if i not in found:
+                    found.add(i)
+                    picked.append(i)
+                    if len(picked) >= limit:
+                        return
+
+        if len(picked) < limit and "\n" not in query:
+            collect(m.start() for m in re.finditer(re.escape(query), blob))
+        if len(picked) < limit:
+            # [^\nX]*X never backtracks, which keeps this linear in the blob size
+            fuzzy = re.escape(query[0]) + "".join(f"[^\\n{re.escape(ch)}]*{re.escape(ch)}" for ch in query[1:])
+            collect(m.start() for m in re.finditer(fuzzy, blob))
+        return [names[i] for i in picked[:limit]]
+
+
+_profile_store = None
+
+
+def get_profile_store():
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = ProfileStore(get_profiles_dir(), os.path.join(get_cache_dir("profiles"), "index.sqlite3"))
+    return _profile_store
+
+
+# Watch mode ------------------------------------------------------------------
+#
+# With --watch, a daemon thread polls the given template folders and the
+# profiles folder. Change detection is stat-only: a template is compiled
+# again when its (mtime, size) moves, and profiles are reconciled through
+# ProfileStore.refresh. The work is throttled to a fraction of wall time and
+# the thread asks the OS for a lower priority, so the window stays
+# responsive; drops, browses and renders then find the index already built.
+
+# A template modified more recently than this may still be being copied in
+WATCH_SETTLE_S = 2.0
+
+
+def lower_thread_priority():
+    """Ask the OS to schedule the calling thread behind interactive work, where it allows that."""
+    try:
+        if sys.platform.startswith("linux"):
+            # Linux applies nice values per thread
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        elif sys.platform == "win32":
+            import ctypes
+
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), -1)  # THREAD_PRIORITY_BELOW_NORMAL
+    except (AttributeError, OSError):
+        pass
+
+
+class FolderWatcher:
+    """Polls template folders and the profile store, precompiling whatever changed.
+
+    Templates are compiled (placeholder index in memory and on disk) and, while
+    template_cache has room, parsed into it as well; warming never evicts a
+    template someone is working with. After each template the thread sleeps
+    long enough to keep its share of wall time at `duty`. Changes are posted
+    to `events` as ("profiles",), ("template", path, error) or ("error", None,
+    error) for the Tk thread to drain; the watcher never touches a widget.
+    With post_events=False (serve, where nothing drains the queue) failures
+    are printed to stderr instead.
+    """
+
+    def __init__(self, template_dirs, profile_store=None, interval=10.0, duty=0.25, post_events=True):
+        self.template_dirs = list(dict.fromkeys(os.path.abspath(path) for path in template_dirs))
+        self.profile_store = profile_store
+        self.interval = interval
+        self.duty = duty
+        self.events = queue.Queue() if post_events else None
+        self.stamps = {}
+        self.stopped = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.polls = 0
+        self.compiled = 0
+        self.warmed = 0
+        self.failures = {}
+        self.busy_s = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="watch", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _run(self):
+        lower_thread_priority()
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                # A share that went away must not end the watch for good
+                self.post("error", None, e)
+            self.stopped.wait(self.interval)
+
+    def post(self, kind, *payload):
+        if self.events is not None:
+            self.events.put((kind, *payload))
+        elif kind != "profiles" and payload[-1] is not None:
+            where = f" {payload[0]}" if payload[0] else ""
+            print(f"Watch failed{where}: {type(payload[-1]).__name__}: {payload[-1]}", file=sys.stderr)
+
+    def throttle(self, seconds):
+        """Account for work that took `seconds` and sleep to keep the duty cycle."""
+        self.busy_s += seconds
+        if self.duty < 1:
+            self.stopped.wait(seconds * (1 - self.duty) / self.duty)
+
+    def poll(self):
+        """Run one pass over the profiles and template folders. Returns the templates it compiled."""
+        with self.lock:
+            self.polls += 1
+        if self.profile_store is not None:
+            start = time.perf_counter()
+            if self.profile_store.refresh(force=True):
+                self.post("profiles")
+            self.throttle(time.perf_counter() - start)
+
+        now = time.time()
+        seen = set()
+        changed = []
+        for path in find_templates(self.template_dirs):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            seen.add(path)
+            stamp = (st.st_mtime_ns, st.st_size)
+            if self.stamps.get(path) != stamp and now - st.st_mtime >= WATCH_SETTLE_S:
+                changed.append((path, stamp))
+        for path in set(self.stamps) - seen:
+            del self.stamps[path]
+            with self.lock:
+                self.failures.pop(path, None)
+
+        # Newest first: the template just saved is the one about to be used
+        changed.sort(key=lambda item: item[1][0], reverse=True)
+        done = []
+        for path, stamp in changed:
+            if self.stopped.is_set():
+                break
+            start = time.perf_counter()
+            error = self.precompile(path)
+            self.stamps[path] = stamp
+            done.append(path)
+            self.post("template", path, error)
+            self.throttle(time.perf_counter() - start)
+        return done
+
+    def precompile(self, path):
+        try:
+            with traced("watch", template=path):
+                with template_cache.lock:
+                    # Replacing an older version of this file evicts nothing else
+                    room = (len(template_cache.entries) < template_cache.max_entries
+                            or any(key[0] == path for key in template_cache.entries))
+                if room:
+                    warm_template(path)
+                else:
+                    compile_template(path)
+            with self.lock:
+                self.compiled += 1
+                self.warmed += room
+                self.failures.pop(path, None)
+        except Exception as e:
+            with self.lock:
+                self.failures[path] = f"{type(e).__name__}: {e}"
+            return e
+        return None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "folders": list(self.template_dirs),
+                "templates": len(self.stamps),
+                "polls": self.polls,
+                "compiled": self.compiled,
+                "warmed": self.warmed,
+                "failures": dict(self.failures),
+                "busy_s": round(self.busy_s, 3),
+            }
 
 
 class Tooltip:
@@ -58,14 +2788,162 @@ class Tooltip:
             self.tip_window.destroy()
             self.tip_window = None
 
+class PlaceholderRow:
+    __slots__ = ("key", "value")
+
+    def __init__(self, key="", value=""):
+        self.key = key
+        self.value = value
+
+
+class PlaceholderModel:
+    """The placeholder table's rows, kept apart from the widgets that show them.
+
+    key_counts tracks how often each (stripped, non-empty) key occurs so
+    duplicate checks are O(1) instead of a scan over every row.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.key_counts = {}
+        self.duplicate_keys = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def _count(self, key, delta):
+        key = key.strip()
+        if not key:
+            return
+        before = self.key_counts.get(key, 0)
+        after = before + delta
+        if after:
+            self.key_counts[key] = after
+        else:
+            del self.key_counts[key]
+        self.duplicate_keys += (after > 1) - (before > 1)
+
+    def append(self, key="", value=""):
+        self.rows.append(PlaceholderRow(key, value))
+        self._count(key, 1)
+
+    def load(self, pairs):
+        self.clear()
+        for key, value in pairs:
+            self.append(key, value)
+
+    def delete(self, index):
+        self._count(self.rows.pop(index).key, -1)
+
+    def clear(self):
+        self.rows.clear()
+        self.key_counts.clear()
+        self.duplicate_keys = 0
+
+    def set_key(self, index, key):
+        row = self.rows[index]
+        self._count(row.key, -1)
+        row.key = key
+        self._count(key, 1)
+
+    def set_value(self, index, value):
+        self.rows[index].value = value
+
+    def has_duplicates(self):
+        return self.duplicate_keys > 0
+
+    def items(self):
+        return [(row.key, row.value) for row in self.rows]
+
+
+class WorkerJob:
+    def __init__(self, label, func, args, on_done, events):
+        self.label = label
+        self.func = func
+        self.args = args
+        self.on_done = on_done
+        self.events = events
+        self.cancelled = threading.Event()
+
+    def report(self, stage, fraction):
+        if self.cancelled.is_set():
+            raise RenderCancelled()
+        self.events.put(("progress", self, stage, fraction))
+
+
+class BackgroundWorker:
+    """Runs document jobs one at a time on a daemon thread.
+
+    Jobs are queued with submit() and called as func(*args, progress=...).
+    Progress, results and errors are posted to `events`, which the Tk thread
+    drains with root.after polling; the worker never touches a widget.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.events = queue.Queue()
+        self.current = None
+        self.queued = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, label, func, *args, on_done=None):
+        job = WorkerJob(label, func, args, on_done, self.events)
+        with self.lock:
+            self.queued.append(job)
+        self.jobs.put(job)
+        return job
+
+    def cancel_all(self):
+        with self.lock:
+            jobs = self.queued + ([self.current] if self.current else [])
+        for job in jobs:
+            job.cancelled.set()
+
+    def pending(self):
+        with self.lock:
+            return len(self.queued)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            with self.lock:
+                self.queued.remove(job)
+                self.current = job
+            try:
+                if job.cancelled.is_set():
+                    raise RenderCancelled()
+                result = job.func(*job.args, progress=job.report)
+                self.events.put(("done", job, result))
+            except RenderCancelled:
+                self.events.put(("cancelled", job, None))
+            except Exception as e:
+                self.events.put(("error", job, e))
+            finally:
+                with self.lock:
+                    self.current = None
+
+
 class TemplateFillerApp:
-    def __init__(self, root):
+    VISIBLE_ROWS = 8
+    PROFILE_MENU_LIMIT = 200
+
+    def __init__(self, root, watcher=None):
         self.root = root
+        from tkinterdnd2 import DND_FILES
+
         self.root.drop_target_register(DND_FILES)
         self.root.dnd_bind("<<Drop>>", self.handle_drop)
         self.root.title("Template Filler (Word + Excel files)")
-        self.placeholders = []
+        self.placeholders = PlaceholderModel()
+        self.view_offset = 0
         self.template_type = None
+        self.worker = BackgroundWorker()
+        self.watcher = watcher
+        self.deferred_watch = OrderedDict()  # path -> latest watcher event, held while a job runs
 
         controls_frame = tk.Frame(root)
         controls_frame.grid(row=5, column=0, columnspan=4, pady=(10, 5))
@@ -77,7 +2955,7 @@ class TemplateFillerApp:
         tk.Entry(template_frame, textvariable=self.template_path, width=50).grid(row=0, column=1, padx=5, pady=(10, 5))
         ttk.Button(template_frame, text="Browse", command=self.browse_template).grid(row=0, column=2, padx=(5, 15), pady=(10, 5))
 
-        # Create a canvas and scrollbar
+        # Style the placeholder table scrollbar
         style = ttk.Style()
         style.theme_use("default")  # Or "clam" for better styling support
 
@@ -95,33 +2973,26 @@ class TemplateFillerApp:
 
         self.scroll_container = tk.Frame(self.root)
         self.scroll_container.grid(row=1, column=0, columnspan=4, sticky="nsew")
-        self.canvas = tk.Canvas(self.scroll_container, highlightthickness=0)
+        self.entries_frame = tk.Frame(self.scroll_container)
+        self.entries_frame.grid_columnconfigure(0, weight=1)  # Placeholder name
+        self.entries_frame.grid_columnconfigure(1, weight=1)  # Value
+        self.entries_frame.grid_columnconfigure(2, weight=0)  # Delete button
         self.scrollbar = ttk.Scrollbar(
             self.scroll_container,
             orient="vertical",
-            command=self.canvas.yview,
+            command=self.scroll_rows,
             style="Vertical.TScrollbar"
         )
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
 
-        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.entries_frame.grid(row=0, column=0, sticky="nsew")
         self.scrollbar.grid(row=0, column=1, sticky="ns")
 
-        # Make canvas expand
+        # Make the table expand
         self.scroll_container.grid_rowconfigure(0, weight=1)
         self.scroll_container.grid_columnconfigure(0, weight=1)
-        # Create a frame inside the canvas
-        self.entries_frame = tk.Frame(self.canvas)
-        self.entries_frame.grid_columnconfigure(0, weight=1)  # Placeholder name
-        self.entries_frame.grid_columnconfigure(1, weight=1)  # Value
-        self.entries_frame.grid_columnconfigure(2, weight=0)  # Delete button
-
-        self.canvas.create_window((0, 0), window=self.entries_frame, anchor="nw")
-        
-        # Update scrollregion when the frame changes
-        self.entries_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-        self.enable_mousewheel_scrolling()
         self.add_table_headers()
+        self.create_row_widgets()
+        self.enable_mousewheel_scrolling()
         self.placeholder_frame = tk.Frame(root)
         self.placeholder_frame.grid(row=1, column=0, columnspan=3, padx=10, pady=10)
         self.add_placeholder_row()
@@ -141,12 +3012,16 @@ class TemplateFillerApp:
         btn_generate.grid(row=0, column=2, padx=5)
         Tooltip(btn_generate, "Generate the final document using the template")
 
+        btn_packet = tk.Button(button_frame, text="📦 Render Packet", command=self.browse_packet_folder)
+        btn_packet.grid(row=0, column=3, padx=5)
+        Tooltip(btn_packet, "Fill every template in a folder with the current values")
+
         btn_save = tk.Button(button_frame, text="💾 Save Profile", command=self.save_placeholders)
-        btn_save.grid(row=0, column=3, padx=5)
+        btn_save.grid(row=0, column=4, padx=5)
         Tooltip(btn_save, "Save current placeholders as a profile")
 
         btn_delete = tk.Button(button_frame, text="🧹 Delete Profile", command=self.delete_selected_profile)
-        btn_delete.grid(row=0, column=4, padx=5)
+        btn_delete.grid(row=0, column=5, padx=5)
         Tooltip(btn_delete, "Delete the selected profile from disk")
 
         profile_frame = tk.Frame(root)
@@ -156,10 +3031,14 @@ class TemplateFillerApp:
 
         self.profile_var = tk.StringVar()
         self.profile_var.set("Select Profile")
-        self.profile_menu = ttk.Combobox(controls_frame, textvariable=self.profile_var, state="readonly", width=30)
+        self.profile_menu = ttk.Combobox(controls_frame, textvariable=self.profile_var, width=30)
         self.profile_menu.grid(row=0, column=1, columnspan=4, sticky="w", padx=(0, 15), pady=5)
+        Tooltip(self.profile_menu, "Type to search profiles, Enter to load")
 
         self.profile_menu.bind("<<ComboboxSelected>>", lambda e: self.load_named_profile())
+        self.profile_menu.bind("<KeyRelease>", self.filter_profile_menu)
+        self.profile_menu.bind("<Return>", lambda e: self.load_named_profile())
+        self.profile_menu.bind("<FocusIn>", self.on_profile_menu_focus)
         self.refresh_profile_menu()
         instructions = (
             "🛠️ How to Use:\n"
@@ -168,9 +3047,117 @@ class TemplateFillerApp:
             "3. Add fields below to match those placeholders with values.\n"
             "4. Click 'Generate Output' to create a filled document.\n"
             "5. Use 'Save Profile' and 'Load Profile' to reuse placeholder sets anytime.\n"
+            "6. Drop several templates or a folder (or use 'Render Packet') to fill them all with the same values.\n"
+
+        )
+        tk.Label(root, text=instructions, justify="left", wraplength=800, fg="gray").grid(row=6, column=0, columnspan=4, pady=(10, 0))
+
+        progress_frame = tk.Frame(root)
+        progress_frame.grid(row=4, column=0, columnspan=4, pady=(0, 5))
+        self.progress_bar = ttk.Progressbar(progress_frame, mode="determinate", length=300, maximum=1.0)
+        self.progress_bar.grid(row=0, column=0, padx=5)
+        self.status_text = "Ready"
+        self.status_var = tk.StringVar(value=self.status_text)
+        tk.Label(progress_frame, textvariable=self.status_var, width=40, anchor="w").grid(row=0, column=1, padx=5)
+        self.btn_cancel = tk.Button(progress_frame, text="⛔ Cancel", command=self.worker.cancel_all, state="disabled")
+        self.btn_cancel.grid(row=0, column=2, padx=5)
+        Tooltip(self.btn_cancel, "Cancel the running job and any queued renders")
+        self.root.after(100, self.poll_worker)
+        if self.watcher is not None:
+            self.root.after(1000, self.poll_watcher)
+
+    def poll_watcher(self):
+        # The watcher only posts events; the widgets are touched here, on the Tk thread
+        while True:
+            try:
+                kind, *payload = self.watcher.events.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "profiles":
+                # Leave the list alone while someone is typing a search into it
+                if self.root.focus_get() is not self.profile_menu:
+                    self.profile_menu["values"] = get_profile_store().search("", limit=self.PROFILE_MENU_LIMIT)
+            else:
+                # Only the latest event per path matters; it waits here while a job is running
+                self.deferred_watch.pop(payload[0], None)
+                self.deferred_watch[payload[0]] = (kind, *payload)
+
+        # A running job owns the status bar and the table, so handle events between jobs
+        while self.deferred_watch and not self.worker.pending():
+            _, event = self.deferred_watch.popitem(last=False)
+            self.handle_watch_event(*event)
+        self.root.after(1000, self.poll_watcher)
+
+    def handle_watch_event(self, kind, path, error):
+        if kind == "error":
+            self.status_text = f"Watch failed: {type(error).__name__}: {error}"
+            return
+        name = os.path.basename(path)
+        current = self.template_path.get()
+        if current and os.path.abspath(current) == path:
+            if error is not None:
+                self.status_text = f"{name} changed and could not be read: {error}"
+            else:
+                self.worker.submit(
+                    f"Rescanning {name} (changed on disk)",
+                    extract_placeholders_from_template, path,
+                    on_done=self.merge_extracted_keys,
+                )
+        elif error is not None:
+            self.status_text = f"Watch: could not compile {name}: {error}"
+
+    def merge_extracted_keys(self, keys):
+        """Show a re-scanned template's placeholders, keeping the values already typed in."""
+        values = {row.key.strip(): row.value for row in self.placeholders if row.key.strip()}
+        wanted = set(keys)
+        # Values for placeholders the template dropped stay too, rather than vanish
+        extra = [(key, value) for key, value in values.items() if key not in wanted and value]
+        self.set_placeholders([(key, values.get(key, "")) for key in keys] + extra)
 
+    def poll_worker(self):
+        while True:
+            try:
+                kind, job, *payload = self.worker.events.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "progress":
+                stage, fraction = payload
+                self.progress_bar["value"] = fraction
+                self.status_text = f"{job.label}: {stage}"
+            elif kind == "done":
+                self.progress_bar["value"] = 0
+                self.status_text = f"{job.label}: done"
+                if job.on_done:
+                    job.on_done(payload[0])
+            elif kind == "cancelled":
+                self.progress_bar["value"] = 0
+                self.status_text = f"{job.label}: cancelled"
+            elif kind == "error":
+                self.progress_bar["value"] = 0
+                self.status_text = f"{job.label}: failed"
+                messagebox.showerror("Error", f"{job.label} failed:\n{payload[0]}")
+
+        pending = self.worker.pending()
+        self.status_var.set(f"{self.status_text} ({pending} queued)" if pending else self.status_text)
+        busy = pending or self.worker.current is not None
+        self.btn_cancel.config(state="normal" if busy else "disabled")
+        self.root.after(100, self.poll_worker)
+
+    def start_extraction(self, file_path):
+        self.template_path.set(file_path)
+        self.worker.submit(
+            f"Scanning {os.path.basename(file_path)}",
+            extract_placeholders_from_template, file_path,
+            on_done=self.load_extracted_keys,
         )
-        tk.Label(root, text=instructions, justify="left", wraplength=800, fg="gray").grid(row=6, column=0, columnspan=4, pady=(10, 0))
+
+    def load_extracted_keys(self, keys):
+        if keys:
+            self.set_placeholders((key, "") for key in keys)
+        else:
+            messagebox.showinfo("No Placeholders Found", "No placeholders were detected in the template.")
 
     def browse_template(self):
         file_path = filedialog.askopenfilename(
@@ -179,143 +3166,140 @@ class TemplateFillerApp:
             ]
         )
         if file_path:
-            self.template_path.set(file_path)
-
             # Auto-suggest placeholders
-            try:
-                keys = self.extract_placeholders_from_template(file_path)
-                if keys:
-                    self.clear_all_fields()
-
-                    for i, key in enumerate(keys):
-                        if i < len(self.placeholders):
-                            self.placeholders[i][0].set(key)
-                            self.placeholders[i][1].set("")  # Clear value
-                        else:
-                            self.add_placeholder_row()
-                            self.placeholders[-1][0].set(key)
-                            self.placeholders[-1][1].set("")  # Clear value
-                else:
-                    messagebox.showinfo("No Placeholders Found", "No placeholders were detected in the template.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to extract placeholders:\n{e}")
+            self.start_extraction(file_path)
 
     def add_table_headers(self):
         tk.Label(self.entries_frame, text="Placeholder Name", font=("Segoe UI", 10, "bold")).grid(row=0, column=0, padx=5, pady=(0, 5))
         tk.Label(self.entries_frame, text="Value to Insert", font=("Segoe UI", 10, "bold")).grid(row=0, column=1, padx=5, pady=(0, 5))
 
-    def add_placeholder_row(self, key_text="", value_text=""):
-        row = len(self.placeholders) + 1  # +1 to account for header row
+    def create_row_widgets(self):
+        # Only VISIBLE_ROWS sets of widgets ever exist; scrolling rebinds them
+        # to a different window of self.placeholders
+        self.row_widgets = []
+        for i in range(self.VISIBLE_ROWS):
+            key_var = tk.StringVar()
+            val_var = tk.StringVar()
+            key_var.trace_add("write", lambda *_, i=i, var=key_var: self.on_row_edited(i, var, "key"))
+            val_var.trace_add("write", lambda *_, i=i, var=val_var: self.on_row_edited(i, var, "value"))
+
+            key_entry = tk.Entry(self.entries_frame, textvariable=key_var, width=30)
+            val_entry = tk.Entry(self.entries_frame, textvariable=val_var, width=30)
 
-        key_var = tk.StringVar(value=key_text)
-        val_var = tk.StringVar(value=value_text)
+            delete_btn = tk.Button(
+                self.entries_frame,
+                text="❌",
+                command=lambda i=i: self.delete_placeholder_row(self.view_offset + i),
+                width=3,
+                font=("Segoe UI", 10)
+            )
 
-        key_entry = tk.Entry(self.entries_frame, textvariable=key_var, width=30)
-        val_entry = tk.Entry(self.entries_frame, textvariable=val_var, width=30)
+            duplicate_btn = tk.Button(
+                self.entries_frame,
+                text="🔁",
+                command=lambda i=i: self.duplicate_placeholder_row(self.view_offset + i),
+                width=3,
+                font=("Segoe UI", 10)
+            )
 
-        delete_btn = tk.Button(
-            self.entries_frame,
-            text="❌",
-            command=lambda: self.delete_placeholder_row(row - 1),
-            width=3,
-            font=("Segoe UI", 10)
-        )
+            row = i + 1  # +1 to account for header row
+            key_entry.grid(row=row, column=0, padx=5, pady=2, sticky="ew")
+            val_entry.grid(row=row, column=1, padx=5, pady=2, sticky="ew")
+            delete_btn.grid(row=row, column=2, padx=2, pady=2)
+            duplicate_btn.grid(row=row, column=3, padx=2, pady=2)
 
+            self.row_widgets.append((key_var, val_var, key_entry, val_entry, delete_btn, duplicate_btn))
+        self.syncing_rows = False
 
-        duplicate_btn = tk.Button(
-            self.entries_frame,
-            text="🔁",
-            command=lambda: self.duplicate_placeholder_row(row - 1),
-            width=3,
-            font=("Segoe UI", 10)
-        )
+    def on_row_edited(self, i, var, field):
+        if self.syncing_rows:
+            return
+        index = self.view_offset + i
+        if index < len(self.placeholders):
+            if field == "key":
+                self.placeholders.set_key(index, var.get())
+            else:
+                self.placeholders.set_value(index, var.get())
 
-        key_entry.grid(row=row, column=0, padx=5, pady=2, sticky="ew")
-        val_entry.grid(row=row, column=1, padx=5, pady=2, sticky="ew")
-        delete_btn.grid(row=row, column=2, padx=2, pady=2)
-        duplicate_btn.grid(row=row, column=3, padx=2, pady=2)
+    def refresh_rows(self):
+        """Bind the visible row widgets to the current window of the model."""
+        total = len(self.placeholders)
+        self.view_offset = max(0, min(self.view_offset, total - self.VISIBLE_ROWS))
+
+        self.syncing_rows = True
+        try:
+            for i, (key_var, val_var, *widgets) in enumerate(self.row_widgets):
+                index = self.view_offset + i
+                if index < total:
+                    row = self.placeholders[index]
+                    key_var.set(row.key)
+                    val_var.set(row.value)
+                    for widget in widgets:
+                        widget.grid()
+                else:
+                    for widget in widgets:
+                        widget.grid_remove()
+        finally:
+            self.syncing_rows = False
 
-        self.placeholders.append((key_var, val_var, key_entry, val_entry, delete_btn, duplicate_btn))
+        if total > self.VISIBLE_ROWS:
+            self.scrollbar.set(self.view_offset / total, (self.view_offset + self.VISIBLE_ROWS) / total)
+            self.scrollbar.grid()
+        else:
+            self.scrollbar.grid_remove()
         self.update_delete_buttons()
-        self.update_scrollbar_visibility()
-        self.update_canvas_height()
-        self.enable_mousewheel_scrolling()
-    
-    def update_delete_buttons(self):
-        for i, (_, _, _, _, delete_btn, _) in enumerate(self.placeholders):
-            if len(self.placeholders) == 1:
-                delete_btn.config(state="disabled")
-            else:
-                delete_btn.config(state="normal")
-    
-    def delete_placeholder_row(self, index):
-        _, _, key_entry, val_entry, delete_btn, duplicate_btn = self.placeholders[index]
-        key_entry.destroy()
-        val_entry.destroy()
-        delete_btn.destroy()
-        duplicate_btn.destroy()
 
+    def scroll_rows(self, action, amount, unit=None):
+        if action == "moveto":
+            self.view_offset = round(float(amount) * len(self.placeholders))
+        elif unit == "pages":
+            self.view_offset += int(amount) * self.VISIBLE_ROWS
+        else:
+            self.view_offset += int(amount)
+        self.refresh_rows()
 
-        del self.placeholders[index]
+    def add_placeholder_row(self, key_text="", value_text=""):
+        self.placeholders.append(key_text, value_text)
+        # Keep the new row in view
+        self.view_offset = len(self.placeholders) - self.VISIBLE_ROWS
+        self.refresh_rows()
 
-        for i, (key_var, val_var, key_entry, val_entry, delete_btn, duplicate_btn) in enumerate(self.placeholders):
-            row = i + 1
-            key_entry.grid(row=row, column=0, padx=5, pady=2, sticky="ew")
-            val_entry.grid(row=row, column=1, padx=5, pady=2, sticky="ew")
-            delete_btn.grid(row=row, column=2, padx=2, pady=2)
-            duplicate_btn.grid(row=row, column=3, padx=2, pady=2)
+    def set_placeholders(self, pairs):
+        """Replace every row in one go, with a single layout pass."""
+        self.placeholders.load(pairs)
+        if not len(self.placeholders):
+            self.placeholders.append()
+        self.view_offset = 0
+        self.refresh_rows()
 
-            delete_btn.config(command=lambda idx=i: self.delete_placeholder_row(idx))
-            duplicate_btn.config(command=lambda idx=i: self.duplicate_placeholder_row(idx))
+    def update_delete_buttons(self):
+        state = "disabled" if len(self.placeholders) == 1 else "normal"
+        for _, _, _, _, delete_btn, _ in self.row_widgets:
+            delete_btn.config(state=state)
 
-            self.update_delete_buttons()
-            self.update_scrollbar_visibility()
-            self.update_canvas_height()
+    def delete_placeholder_row(self, index):
+        if index < len(self.placeholders):
+            self.placeholders.delete(index)
+            self.refresh_rows()
 
     def clear_all_fields(self):
-        for widget in self.entries_frame.winfo_children():
-            widget.destroy()
-        self.placeholders.clear()
-        self.add_table_headers()
-        self.add_placeholder_row()
-    
-    def update_scrollbar_visibility(self):
-        self.root.update_idletasks()
-        needs_scroll = self.canvas.bbox("all")[3] > self.canvas.winfo_height()
-        if needs_scroll:
-            self.scrollbar.grid()
-        else:
-            self.scrollbar.grid_remove()
-    
+        self.set_placeholders([])
+
     def enable_mousewheel_scrolling(self):
         def _on_mousewheel(event):
             if sys.platform == 'darwin':
-                self.canvas.yview_scroll(-1 * int(event.delta), "units")
+                self.scroll_rows("scroll", -1 * int(event.delta))
             else:
-                self.canvas.yview_scroll(-1 * int(event.delta / 120), "units")
+                self.scroll_rows("scroll", -1 * int(event.delta / 120))
 
         def bind_mousewheel(widget):
-            widget.bind("<Enter>", lambda e: self.canvas.bind_all("<MouseWheel>", _on_mousewheel))
-            widget.bind("<Leave>", lambda e: self.canvas.unbind_all("<MouseWheel>"))
+            widget.bind("<Enter>", lambda e: self.root.bind_all("<MouseWheel>", _on_mousewheel))
+            widget.bind("<Leave>", lambda e: self.root.unbind_all("<MouseWheel>"))
 
-        # Bind to the scrollable frame itself
+        # The row widgets are created once, so this only needs to run once
         bind_mousewheel(self.entries_frame)
-
-        # Also bind to all existing widgets inside it
         for child in self.entries_frame.winfo_children():
             bind_mousewheel(child)
-    
-    def update_canvas_height(self):
-        self.root.update_idletasks()
-        content_height = self.entries_frame.winfo_reqheight()
-        max_height = 200 # You can adjust this
-
-        if content_height > max_height:
-            self.canvas.config(height=max_height)
-            self.scrollbar.grid()
-        else:
-            self.canvas.config(height=content_height)
-            self.scrollbar.grid_remove()
 
     def generate_output(self):
         try:
@@ -328,13 +3312,7 @@ class TemplateFillerApp:
                 messagebox.showerror("Unsupported Format", "Only .docx and .xlsx templates are supported.")
                 return
 
-            # Build placeholder dictionary
-            replacements = {}
-            for key_var, val_var, *_ in self.placeholders:
-                key = key_var.get().strip()
-                val = val_var.get().strip()
-                if key:
-                    replacements[key] = val
+            replacements = self.current_replacements()
 
             # Set default extension and filetypes BEFORE the dialog
             if path.lower().endswith(".docx"):
@@ -353,54 +3331,93 @@ class TemplateFillerApp:
             if not output_path:
                 return  # User cancelled
 
-            # Generate output based on file type
-            if path.lower().endswith(".docx"):
-                self.generate_word_output(path, output_path, replacements)
-            elif path.lower().endswith(".xlsx"):
-                self.generate_excel_output(path, output_path, replacements)
-
-            messagebox.showinfo("Success", f"Output saved to:\n{output_path}")
+            # Render in the background; further renders queue up behind this one
+            self.worker.submit(
+                f"Rendering {os.path.basename(output_path)}",
+                generate_document, path, output_path, replacements,
+                on_done=lambda cached: self.on_render_done(output_path, cached),
+            )
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate output:\n{e}")
 
-    def generate_word_output(self, template_path, output_path, replacements):
-        doc = Document(template_path)
-        for para in doc.paragraphs:
-            for key, val in replacements.items():
-                para.text = para.text.replace(f"{{{key}}}", val)
+    def current_replacements(self):
+        replacements = {}
+        for key, val in self.placeholders.items():
+            key = key.strip()
+            val = val.strip()
+            if key:
+                replacements[key] = val
+        return replacements
 
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for key, val in replacements.items():
-                        cell.text = cell.text.replace(f"{{{key}}}", val)
+    def browse_packet_folder(self):
+        folder = filedialog.askdirectory(title="Folder of Templates to Fill")
+        if folder:
+            self.start_packet([folder])
 
-        doc.save(output_path)
+    def start_packet(self, paths):
+        templates = find_templates(paths)
+        if not templates:
+            messagebox.showwarning("No Templates", "No .docx or .xlsx templates were found.")
+            return
+
+        replacements = self.current_replacements()
+        if not any(replacements.values()):
+            messagebox.showwarning("No Values", "Load a profile or fill in some values before rendering a packet.")
+            return
+
+        as_folder = messagebox.askyesnocancel(
+            "Render Packet",
+            f"Fill {len(templates)} template(s) with the current values.\n\n"
+            "Yes: save the documents into a folder\nNo: save them as one .zip file",
+        )
+        if as_folder is None:
+            return
+        if as_folder:
+            destination = filedialog.askdirectory(title="Save Filled Documents In")
+        else:
+            destination = filedialog.asksaveasfilename(
+                defaultextension=".zip",
+                filetypes=[("Zip Archive", "*.zip")],
+                title="Save Filled Documents As"
+            )
+        if not destination:
+            return
+
+        self.worker.submit(
+            f"Packet of {len(templates)}",
+            render_packet, templates, replacements, destination,
+            on_done=self.on_packet_done,
+        )
+
+    def on_packet_done(self, summary):
+        self.status_text = f"Packet: {len(summary['rendered'])}/{summary['templates']} rendered"
+        if summary["failures"]:
+            messagebox.showwarning("Packet Finished With Errors", describe_packet(summary))
+        else:
+            messagebox.showinfo("Packet Finished", describe_packet(summary))
+
+    def on_render_done(self, output_path, cached=False):
+        source = output_cache.describe() if cached else template_cache.describe()
+        self.status_text = f"Saved {os.path.basename(output_path)} ({source})"
+        messagebox.showinfo("Success", f"Output saved to:\n{output_path}")
+
+    def generate_word_output(self, template_path, output_path, replacements):
+        generate_word_output(template_path, output_path, replacements)
 
     def generate_excel_output(self, template_path, output_path, replacements):
-        wb = load_workbook(template_path)
-        for sheet in wb.worksheets:
-            for row in sheet.iter_rows():
-                for cell in row:
-                    if cell.value and isinstance(cell.value, str):
-                        for key, val in replacements.items():
-                            cell.value = cell.value.replace(f"{{{key}}}", val)
-        wb.save(output_path)
+        generate_excel_output(template_path, output_path, replacements)
 
 
     def get_profiles_dir(self):
-        base = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else os.path.abspath(__file__))
-        path = os.path.join(base, "profiles")
-        os.makedirs(path, exist_ok=True)
-        return path
+        return get_profiles_dir()
 
     def save_placeholders(self):
         # Extract key-value pairs from the placeholder rows
         data = {
-            key_var.get(): val_var.get()
-            for key_var, val_var, *_ in self.placeholders
-            if key_var.get().strip() and val_var.get().strip()
+            key: val
+            for key, val in self.placeholders.items()
+            if key.strip() and val.strip()
         }
 
         if not data:
@@ -408,8 +3425,7 @@ class TemplateFillerApp:
             return
 
         # Optional: check for duplicate keys
-        keys = [key_var.get() for key_var, _, *_ in self.placeholders]
-        if len(keys) != len(set(keys)):
+        if self.placeholders.has_duplicates():
             messagebox.showwarning("Warning", "Duplicate placeholder keys found.")
             return
 
@@ -419,9 +3435,7 @@ class TemplateFillerApp:
             return
 
         try:
-            save_path = os.path.join(self.get_profiles_dir(), f"{profile_name}.json")
-            with open(save_path, "w") as f:
-                json.dump(data, f, indent=2)
+            get_profile_store().save(profile_name, data)
             messagebox.showinfo("Saved", f"Profile '{profile_name}' saved.")
             self.refresh_profile_menu()
         except Exception as e:
@@ -429,33 +3443,49 @@ class TemplateFillerApp:
 
     def load_named_profile(self):
         profile_name = self.profile_var.get()
-        if not profile_name:
+        if not profile_name or profile_name in ("Select Profile", "No profiles found"):
             return
 
         try:
-            load_path = os.path.join(self.get_profiles_dir(), f"{profile_name}.json")
-            with open(load_path, "r") as f:
-                data = json.load(f)
-
-            for widget in self.entries_frame.winfo_children():
-                widget.destroy()
-            self.placeholders.clear()
-            self.add_table_headers()
-
-            for key, val in data.items():
-                self.add_placeholder_row()
-                self.placeholders[-1][0].set(key)
-                self.placeholders[-1][1].set(val)
+            store = get_profile_store()
+            if profile_name not in store:
+                matches = store.search(profile_name, limit=1)
+                if not matches:
+                    messagebox.showwarning("No Match", f"No profile matches '{profile_name}'.")
+                    return
+                profile_name = matches[0]
+                self.profile_var.set(profile_name)
+            data = store.load(profile_name)
+
+            self.set_placeholders(data.items())
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load profile:\n{e}")
 
     def refresh_profile_menu(self):
         try:
-            profiles = [f[:-5] for f in os.listdir(self.get_profiles_dir()) if f.endswith(".json")]
+            store = get_profile_store()
+            store.refresh()
+            profiles = store.search("", limit=self.PROFILE_MENU_LIMIT)
             self.profile_menu["values"] = profiles
             self.profile_var.set("Select Profile" if profiles else "No profiles found")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load profiles:\n{e}")
+
+    def filter_profile_menu(self, event):
+        if event.keysym in ("Return", "Up", "Down", "Escape", "Tab"):
+            return
+        text = self.profile_var.get()
+        if text in ("Select Profile", "No profiles found"):
+            text = ""
+        self.profile_menu["values"] = get_profile_store().search(text, limit=self.PROFILE_MENU_LIMIT)
+
+    def on_profile_menu_focus(self, event):
+        # Cheap: only re-reads the folder if its mtime moved
+        store = get_profile_store()
+        if store.refresh():
+            self.profile_menu["values"] = store.search("", limit=self.PROFILE_MENU_LIMIT)
+        if self.profile_var.get() in ("Select Profile", "No profiles found"):
+            self.profile_menu.select_range(0, "end")
     
     def select_and_load_profile(self, profile_name):
         self.profile_var.set(profile_name)
@@ -472,9 +3502,9 @@ class TemplateFillerApp:
             return
 
         try:
-            profile_path = os.path.join(self.get_profiles_dir(), f"{profile_name}.json")
-            if os.path.exists(profile_path):
-                os.remove(profile_path)
+            store = get_profile_store()
+            if profile_name in store:
+                store.delete(profile_name)
                 messagebox.showinfo("Deleted", f"Profile '{profile_name}' has been deleted.")
                 self.refresh_profile_menu()
             else:
@@ -483,63 +3513,910 @@ class TemplateFillerApp:
             messagebox.showerror("Error", f"Failed to delete profile:\n{e}")
 
     def extract_placeholders_from_template(self, path):
-        placeholders = set()
-
-        if path.endswith(".docx"):
-            doc = Document(path)
-
-            # Scan regular paragraphs
-            for para in doc.paragraphs:
-                matches = re.findall(r"\{(.*?)\}", para.text)
-                placeholders.update(matches)
-
-            # 🔧 Scan tables too
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        matches = re.findall(r"\{(.*?)\}", cell.text)
-                        placeholders.update(matches)
-
-        elif path.endswith(".xlsx"):
-            wb = load_workbook(path)
-            for sheet in wb.worksheets:
-                for row in sheet.iter_rows(values_only=True):
-                    for cell in row:
-                        if isinstance(cell, str):
-                            matches = re.findall(r"\{(.*?)\}", cell)
-                            placeholders.update(matches)
-
-        return sorted(placeholders)
+        return extract_placeholders_from_template(path)
 
     def handle_drop(self, event):
-        file_path = event.data.strip().strip("{").strip("}")  # Handles Windows paths with spaces
+        # event.data is a Tcl list; paths with spaces arrive wrapped in braces
+        paths = self.root.tk.splitlist(event.data)
+        if len(paths) > 1 or (paths and os.path.isdir(paths[0])):
+            # Several files or a folder: fill them all with the current values
+            self.start_packet(paths)
+            return
+        file_path = paths[0] if paths else ""
         if file_path.lower().endswith((".docx", ".xlsx")) and os.path.exists(file_path):
-            self.template_path.set(file_path)
-            try:
-                keys = self.extract_placeholders_from_template(file_path)
-                if keys:
-                    self.clear_all_fields()
-                    for i, key in enumerate(keys):
-                        if i < len(self.placeholders):
-                            self.placeholders[i][0].set(key)
-                            self.placeholders[i][1].set("")
-                        else:
-                            self.add_placeholder_row()
-                            self.placeholders[-1][0].set(key)
-                            self.placeholders[-1][1].set("")
-                else:
-                    messagebox.showinfo("No Placeholders Found", "No placeholders were detected in the template.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to extract placeholders:\n{e}")
+            self.start_extraction(file_path)
         else:
             messagebox.showwarning("Invalid File", "Please drop a valid .docx or .xlsx file.")
 
     def duplicate_placeholder_row(self, index):
-        key_text = self.placeholders[index][0].get()
-        value_text = self.placeholders[index][1].get()
-        self.add_placeholder_row(key_text, value_text)
+        row = self.placeholders[index]
+        self.add_placeholder_row(row.key, row.value)
+
+def read_data_rows(data_path):
+    """Yield one replacements dict per data row of a .csv or .xlsx file.
+
+    The first row holds the placeholder names; empty cells become "".
+    """
+    if data_path.lower().endswith(".csv"):
+        with open(data_path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                yield {key.strip(): (val or "").strip() for key, val in row.items() if key and key.strip()}
+
+    elif data_path.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(data_path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+            for values in rows:
+                if all(v is None for v in values):
+                    continue
+                yield {
+                    key: "" if val is None else str(val).strip()
+                    for key, val in zip(header, values)
+                    if key
+                }
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"Unsupported data file: {data_path}")
+
+
+def build_output_name(pattern, index, replacements, extension):
+    """Expand an output file name pattern such as "report_{row}" or "{Location}_{Date}"."""
+    values = {**replacements, "row": index}
+    try:
+        name = pattern.format_map(values)
+    except (KeyError, ValueError, IndexError, AttributeError) as e:
+        raise ValueError(f"Cannot name the output of row {index} with {pattern!r}: {type(e).__name__}: {e}")
+    name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name).strip(" .") or f"report_{index:05d}"
+    return name + extension
+
+
+def check_output_names(pattern, data_path, extension):
+    """Fail before anything is rendered if the name pattern uses a column the data lacks,
+    or gives two rows the same file (the second would silently overwrite the first).
+
+    Every row is checked, not just a shard's, so shards cannot collide either.
+    """
+    import string
+
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(pattern) if field is not None]
+    except ValueError as e:
+        raise ValueError(f"Invalid --name pattern {pattern!r}: {e}")
+    roots = [re.match(r"[^.\[]*", field).group(0) for field in fields]
+    if any(not root or root.isdigit() for root in roots):
+        raise ValueError(f"--name pattern {pattern!r} must name its fields, e.g. {{Location}} or {{row}}")
+
+    seen = {}
+    for i, row in enumerate(read_data_rows(data_path), start=1):
+        if i == 1:
+            missing = [root for root in dict.fromkeys(roots) if root != "row" and root not in row]
+            if missing:
+                raise ValueError(f"--name uses {', '.join(f'{{{root}}}' for root in missing)}, which the data "
+                                 f"does not have (columns: {', '.join(row)})")
+        name = build_output_name(pattern, i, row, extension)
+        # Windows and macOS file names are case-insensitive
+        first = seen.setdefault(name.lower(), i)
+        if first != i:
+            raise ValueError(f"--name gives rows {first} and {i} the same file name {name!r}; "
+                             f"add a column that tells them apart, or {{row}}")
+
+
+def _init_render_worker(cache_entries, cache_bytes, output_cache_bytes, output_cache_link, profile):
+    # Spawned workers (Windows, frozen builds) start from a fresh import
+    global profile_renders
+    template_cache.configure(max_entries=cache_entries, max_bytes=cache_bytes)
+    output_cache.configure(max_bytes=output_cache_bytes, link=output_cache_link)
+    profile_renders = profile
+
+
+def _render_row(job):
+    template_path, output_path, replacements = job
+    try:
+        cached = generate_document(template_path, output_path, replacements)
+        return output_path, None, cached
+    except Exception as e:
+        return output_path, f"{type(e).__name__}: {e}", False
+
+
+class BatchJournal:
+    """Append-only record of a batch job, kept in its output folder.
+
+    Every run appends a "job" line, then one "row" line per finished row with
+    a hash of the row's input, its output file and size, and whether it was
+    rendered or failed. Lines are flushed as rows finish, so a crash loses at
+    most the rows in flight; a torn last line is ignored when reading. A row
+    counts as done only while its output still exists at the recorded size.
+    Entries are keyed by output file and input hash together, so identical
+    data rows writing different files each keep their own entry.
+    """
+
+    FILE_NAME = ".render-journal.jsonl"
+
+    def __init__(self, out_dir, file_name=None):
+        self.out_dir = out_dir
+        self.path = os.path.join(out_dir, file_name or self.FILE_NAME)
+        self.completed = {}
+        self.f = None
+
+    def load(self):
+        """Read what earlier runs finished; the last record for an output and input wins."""
+        self.completed = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("type") != "row":
+                        continue
+                    key = (record["output"], record["input"])
+                    if record.get("status") == "done":
+                        self.completed[key] = record["size"]
+                    else:
+                        self.completed.pop(key, None)
+        except FileNotFoundError:
+            pass
+
+    def done_size(self, input_hash, output_path):
+        """Size of the finished output for this input, or None if it has to be rendered (again)."""
+        size = self.completed.get((os.path.relpath(output_path, self.out_dir), input_hash))
+        try:
+            return size if size is not None and os.path.getsize(output_path) == size else None
+        except OSError:
+            return None
+
+    def remove_stale_temp_files(self, max_age=3600):
+        """Delete half-written outputs left by a crashed run.
+
+        Only old ones: another process may be mid-way through writing the rest.
+        """
+        cutoff = time.time() - max_age
+        with os.scandir(self.out_dir) as it:
+            for entry in it:
+                if re.search(r"\.\d+\.\d+\.tmp$", entry.name) and entry.stat().st_mtime < cutoff:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def open(self, **job):
+        self.remove_stale_temp_files()
+        self.f = open(self.path, "a", encoding="utf-8")
+        self.write({"type": "job", "time": time.strftime("%Y-%m-%dT%H:%M:%S"), **job})
+
+    def write(self, record):
+        self.f.write(json.dumps(record) + "\n")
+        self.f.flush()
+
+    def record(self, row, input_hash, output_path, error=None):
+        record = {"type": "row", "row": row, "input": input_hash, "output": os.path.relpath(output_path, self.out_dir)}
+        if error:
+            record.update(status="failed", error=error)
+        else:
+            record.update(status="done", size=os.path.getsize(output_path))
+        self.write(record)
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def row_input_hash(template_sha, row):
+    payload = json.dumps([template_sha, sorted(row.items())], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+# Sharding --------------------------------------------------------------------
+#
+# "render --shard i/n" renders only the rows whose key hashes to shard i, so n
+# machines can split one job with no coordinator: each reads the whole data
+# file and keeps its own slice. Every shard writes its own journal and a
+# manifest into the shared output folder; "merge" then checks the manifests
+# together cover every row exactly once.
+
+def parse_shard(text):
+    match = re.fullmatch(r"(\d+)/(\d+)", text.strip())
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"expected i/n with 1 <= i <= n, e.g. 2/4, not {text!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def row_shard(row, shards, key_columns=None):
+    """Return the 1-based shard of a data row, from a stable hash of its key columns (default: the whole row)."""
+    values = [row.get(column, "") for column in key_columns] if key_columns else sorted(row.items())
+    digest = hashlib.sha256(json.dumps(values, ensure_ascii=False).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards + 1
+
+
+def shard_file_name(stem, extension, shard):
+    index, count = shard
+    return f".{stem}.shard-{index}-of-{count}{extension}"
+
+
+def render_batch(template_path, data_path, out_dir, workers=None, name_pattern="report_{row:05d}", chunksize=16,
+                 resume=True, shard=(1, 1), key_columns=None):
+    """Render one document per data row across a process pool.
+
+    Progress is journalled in out_dir; with resume, rows an earlier run of the
+    same job already rendered are skipped, so only failed or missing rows are
+    redone. With shard=(i, n) only the rows hashing to shard i are rendered.
+    Writes the shard's manifest and returns a summary dict: rows in the
+    shard, rows rendered, copied from the output cache and skipped, and
+    (output_path, error) tuples for failures.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    extension = os.path.splitext(template_path)[1].lower()
+    if extension not in (".docx", ".xlsx"):
+        raise ValueError("Only .docx and .xlsx templates are supported.")
+    check_output_names(name_pattern, data_path, extension)
+    os.makedirs(out_dir, exist_ok=True)
+    template_sha = compile_template(template_path)["sha256"]  # Workers then load the index from the cache
+    data_sha, _ = template_fingerprint(data_path)
+
+    # An unsharded job keeps the plain journal name from before sharding existed
+    journal = BatchJournal(out_dir, None if shard == (1, 1) else shard_file_name("render-journal", ".jsonl", shard))
+    if resume:
+        journal.load()
+    summary = {"rows": 0, "data_rows": 0, "rendered": 0, "cached": 0, "skipped": 0, "failures": []}
+    pending = []  # (row, input hash) of each submitted job, in submission order
+    manifest_rows = {}
+
+    def jobs():
+        for i, row in enumerate(read_data_rows(data_path), start=1):
+            summary["data_rows"] += 1
+            if key_columns and i == 1:
+                missing = [column for column in key_columns if column not in row]
+                if missing:
+                    raise ValueError(f"Key column(s) not in the data: {', '.join(missing)}")
+            if row_shard(row, shard[1], key_columns) != shard[0]:
+                continue
+            summary["rows"] += 1
+            output_path = os.path.join(out_dir, build_output_name(name_pattern, i, row, extension))
+            input_hash = row_input_hash(template_sha, row)
+            size = journal.done_size(input_hash, output_path)
+            if size is not None:
+                summary["skipped"] += 1
+                manifest_rows[i] = [i, os.path.relpath(output_path, out_dir), size]
+                continue
+            pending.append((i, input_hash))
+            yield template_path, output_path, row
+
+    journal.open(template=os.path.abspath(template_path), template_sha256=template_sha,
+                 data=os.path.abspath(data_path), name_pattern=name_pattern, resume=resume,
+                 shard=f"{shard[0]}/{shard[1]}")
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_render_worker,
+            initargs=(template_cache.max_entries, template_cache.max_bytes,
+                      output_cache.max_bytes, output_cache.link, profile_renders),
+        ) as pool:
+            # map() returns results in submission order, matching `pending`
+            for n, (output_path, error, from_cache) in enumerate(pool.map(_render_row, jobs(), chunksize=chunksize)):
+                row, input_hash = pending[n]
+                journal.record(row, input_hash, output_path, error)
+                if error:
+                    summary["failures"].append((output_path, error))
+                else:
+                    summary["rendered"] += 1
+                    summary["cached"] += from_cache
+                    manifest_rows[row] = [row, os.path.relpath(output_path, out_dir), os.path.getsize(output_path)]
+    finally:
+        journal.close()
+
+    write_json_atomic(os.path.join(out_dir, shard_file_name("manifest", ".json", shard)), {
+        "shard": list(shard),
+        "key_columns": key_columns or [],
+        "host": platform.node(),
+        "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "template_sha256": template_sha,
+        "data_sha256": data_sha,
+        "data_rows": summary["data_rows"],
+        "rows": [manifest_rows[row] for row in sorted(manifest_rows)],
+        "failures": [[os.path.relpath(path, out_dir), error] for path, error in summary["failures"]],
+    })
+    return summary
+
+
+def merge_shards(out_dir):
+    """Check the shard manifests in out_dir cover every data row exactly once.
+
+    Returns a report dict with an "ok" flag and the problems found. When all
+    is well the manifests are combined into out_dir/.manifest.json.
+    """
+    manifests = []
+    for name in sorted(os.listdir(out_dir)):
+        if re.fullmatch(r"\.manifest\.shard-\d+-of-\d+\.json", name):
+            with open(os.path.join(out_dir, name), "r") as f:
+                manifests.append(json.load(f))
+    problems = []
+    if not manifests:
+        return {"ok": False, "problems": ["No shard manifests found"], "shards": 0, "data_rows": 0, "rendered": 0}
+
+    first = manifests[0]
+    count = first["shard"][1]
+    for field in ("template_sha256", "data_sha256", "data_rows", "key_columns"):
+        values = {json.dumps(manifest[field]) for manifest in manifests}
+        if len(values) > 1:
+            problems.append(f"Shards disagree on {field}; they were not run on the same job")
+    found = sorted(manifest["shard"][0] for manifest in manifests if manifest["shard"][1] == count)
+    if len(manifests) != len(found):
+        problems.append("Manifests from different shard counts are mixed in this folder")
+    missing_shards = sorted(set(range(1, count + 1)) - set(found))
+    if missing_shards:
+        problems.append(f"Missing shard manifest(s): {', '.join(f'{i}/{count}' for i in missing_shards)}")
+    if len(set(found)) != len(found):
+        problems.append("A shard manifest appears more than once")
+
+    rows = {}
+    outputs = {}
+    for manifest in manifests:
+        for row, output, size in manifest["rows"]:
+            if row in rows:
+                problems.append(f"Row {row} was rendered by more than one shard")
+            rows[row] = output
+            if output in outputs:
+                problems.append(f"Rows {outputs[output]} and {row} both wrote {output}")
+            outputs[output] = row
+            path = os.path.join(out_dir, output)
+            if not os.path.isfile(path) or os.path.getsize(path) != size:
+                problems.append(f"Row {row}: {output} is missing or not the size recorded")
+        for output, error in manifest["failures"]:
+            problems.append(f"{output} failed: {error}")
+
+    missing_rows = sorted(set(range(1, first["data_rows"] + 1)) - set(rows))
+    if missing_rows:
+        shown = ", ".join(map(str, missing_rows[:20])) + (" ..." if len(missing_rows) > 20 else "")
+        problems.append(f"{len(missing_rows)} row(s) not rendered by any shard: {shown}")
+
+    report = {
+        "ok": not problems,
+        "shards": count,
+        "data_rows": first["data_rows"],
+        "rendered": len(rows),
+        "problems": problems,
+    }
+    combined_path = os.path.join(out_dir, ".manifest.json")
+    if not report["ok"]:
+        if os.path.exists(combined_path):
+            os.remove(combined_path)  # It no longer describes the folder
+    else:
+        write_json_atomic(combined_path, {
+            "template_sha256": first["template_sha256"],
+            "data_sha256": first["data_sha256"],
+            "shards": [manifest["shard"][0] for manifest in manifests],
+            "hosts": sorted({manifest["host"] for manifest in manifests}),
+            "rows": sorted(([row, output] for row, output in rows.items())),
+        })
+    return report
+
+
+def find_templates(paths):
+    """Expand files and folders into a sorted list of .docx/.xlsx templates.
+
+    Folders are searched recursively; Office lock files (~$name.docx) are skipped.
+    """
+    found = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                found.update(os.path.join(folder, name) for name in names)
+        else:
+            found.add(path)
+    return sorted(
+        os.path.abspath(path) for path in found
+        if path.lower().endswith((".docx", ".xlsx"))
+        and not os.path.basename(path).startswith("~$")
+        and os.path.isfile(path)
+    )
+
+
+def unique_file_name(name, taken):
+    stem, extension = os.path.splitext(name)
+    candidate = name
+    n = 2
+    while candidate.lower() in taken:
+        candidate = f"{stem} ({n}){extension}"
+        n += 1
+    taken.add(candidate.lower())
+    return candidate
+
+
+def render_packet(template_paths, replacements, destination, workers=None, progress=None):
+    """Fill several templates with the same replacements on a thread pool.
+
+    destination is a folder, or a path ending in .zip to collect every
+    output in one archive. Outputs keep their template's file name. Returns
+    a summary dict with per-template timings and the failures; a cancelled
+    packet leaves no zip behind.
+    """
+    started = time.perf_counter()
+    to_zip = destination.lower().endswith(".zip")
+    if to_zip:
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        out_dir = tempfile.mkdtemp(prefix=".packet-", dir=os.path.dirname(os.path.abspath(destination)))
+    else:
+        out_dir = destination
+        os.makedirs(out_dir, exist_ok=True)
+
+    taken = set()
+    jobs = [
+        (template, os.path.join(out_dir, unique_file_name(os.path.basename(template), taken)))
+        for template in template_paths
+    ]
+    if not to_zip:
+        sources = {os.path.normcase(os.path.abspath(template)) for template in template_paths}
+        if any(os.path.normcase(os.path.abspath(output)) in sources for _, output in jobs):
+            raise ValueError("The outputs would overwrite the templates; choose a different output folder.")
+    cancelled = threading.Event()
+
+    def check_cancelled(stage, fraction):
+        if cancelled.is_set():
+            raise RenderCancelled()
+
+    def render_one(template, output):
+        start = time.perf_counter()
+        cached = generate_document(template, output, replacements, check_cancelled)
+        return time.perf_counter() - start, cached
+
+    rendered = []
+    failures = []
+    try:
+        report_progress(progress, f"Rendering 0/{len(jobs)}", 0.0)
+        # Renders share the warm template caches and spend most of their time
+        # in lxml and zlib, which release the GIL
+        with ThreadPoolExecutor(max_workers=workers or max(1, min(len(jobs), os.cpu_count() or 1))) as pool:
+            futures = {pool.submit(render_one, template, output): (template, output) for template, output in jobs}
+            try:
+                for i, future in enumerate(as_completed(futures), start=1):
+                    template, output = futures[future]
+                    try:
+                        seconds, cached = future.result()
+                        rendered.append({"template": template, "output": output, "seconds": round(seconds, 4), "cached": cached})
+                    except Exception as e:
+                        failures.append({"template": template, "error": f"{type(e).__name__}: {e}"})
+                    report_progress(progress, f"Rendering {i}/{len(jobs)}", i / len(jobs))
+            except BaseException:
+                cancelled.set()
+                for future in futures:
+                    future.cancel()
+                raise
+
+        if to_zip:
+            report_progress(progress, "Writing zip", 1.0)
+            tmp_path = temp_path_for(destination)
+            try:
+                # The documents are already deflated; storing them avoids compressing twice
+                with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as zf:
+                    for item in sorted(rendered, key=lambda item: item["output"]):
+                        zf.write(item["output"], os.path.basename(item["output"]))
+                        item["output"] = f"{destination}!{os.path.basename(item['output'])}"
+                os.replace(tmp_path, destination)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+    finally:
+        if to_zip:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    rendered.sort(key=lambda item: item["template"])
+    failures.sort(key=lambda item: item["template"])
+    return {
+        "destination": destination,
+        "templates": len(jobs),
+        "rendered": rendered,
+        "failures": failures,
+        "elapsed_s": round(time.perf_counter() - started, 4),
+    }
+
+
+def describe_packet(summary, slowest=3):
+    """Format a render_packet summary as a few lines of text."""
+    lines = [
+        f"Rendered {len(summary['rendered'])}/{summary['templates']} templates "
+        f"in {summary['elapsed_s']:.1f}s into {summary['destination']}"
+    ]
+    cached = sum(1 for item in summary["rendered"] if item.get("cached"))
+    if cached:
+        lines.append(f"{cached} copied from the output cache")
+    if summary["rendered"]:
+        lines.append("Slowest:")
+        for item in sorted(summary["rendered"], key=lambda item: -item["seconds"])[:slowest]:
+            lines.append(f"  {os.path.basename(item['template'])}: {item['seconds']:.2f}s")
+    if summary["failures"]:
+        lines.append("Failed:")
+        for item in summary["failures"]:
+            lines.append(f"  {os.path.basename(item['template'])}: {item['error']}")
+    return "\n".join(lines)
+
+
+def load_values(source):
+    """Return replacements from a profile name or a path to a profile .json file."""
+    if source.lower().endswith(".json") and os.path.isfile(source):
+        with open(source, "r") as f:
+            return json.load(f)
+    store = get_profile_store()
+    if source not in store:
+        raise ValueError(f"No profile named '{source}'")
+    return store.load(source)
+
+
+def run_packet_command(args):
+    templates = find_templates(args.templates)
+    if not templates:
+        print("No .docx or .xlsx templates found.", file=sys.stderr)
+        return 1
+    try:
+        replacements = load_values(args.values)
+        summary = render_packet(templates, replacements, args.out, workers=args.workers)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(describe_packet(summary))
+    return 1 if summary["failures"] else 0
+
+
+# Local render service --------------------------------------------------------
+#
+# "serve" exposes the engine over HTTP on localhost so other tools can fetch
+# filled documents without the GUI:
+#
+#   GET  /health                 service and cache counters
+#   GET  /templates              template IDs and their placeholders
+#   POST /render/<template id>   {"replacements": {...}} and/or {"profile": "Name"}
+#
+# A template ID is the template's path relative to the served folder, with
+# forward slashes. The rendered file is streamed back as the response body.
+
+DOCUMENT_CONTENT_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+MAX_REQUEST_BYTES = 10 << 20
+
+
+class ServiceBusy(Exception):
+    """Raised when every render slot and backlog place is taken."""
+
+
+class RenderService:
+    """Renders served templates on a bounded thread pool.
+
+    At most `workers` renders run at once and up to `backlog` more wait for
+    a worker; beyond that render() raises ServiceBusy straight away so the
+    HTTP layer can answer 503 and clients back off.
+    """
+
+    def __init__(self, templates_dir, workers=None, backlog=16):
+        self.templates_dir = os.path.abspath(templates_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.capacity = self.workers + backlog
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.rendered = 0
+        self.failed = 0
+        self.rejected = 0
+        self.catalog = {}
+        self.refresh()
+
+    def refresh(self):
+        templates = find_templates([self.templates_dir])
+        catalog = {os.path.relpath(path, self.templates_dir).replace(os.sep, "/"): path for path in templates}
+        with self.lock:
+            self.catalog = catalog
+
+    def resolve(self, template_id):
+        """Return the path for a template ID, rescanning the folder once if it is unknown."""
+        path = self.catalog.get(template_id)
+        if path is None or not os.path.exists(path):
+            self.refresh()
+            path = self.catalog.get(template_id)
+        return path
+
+    def warm(self):
+        """Compile and parse every served template so the first requests are as fast as the rest."""
+        failures = []
+        for template_id, path in sorted(self.catalog.items()):
+            try:
+                warm_template(path)
+            except Exception as e:
+                failures.append((template_id, f"{type(e).__name__}: {e}"))
+        return failures
+
+    def render(self, template_path, replacements):
+        """Render into a temporary file and return its path; the caller deletes it."""
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise ServiceBusy()
+        with self.lock:
+            self.in_flight += 1
+        try:
+            fd, output_path = tempfile.mkstemp(prefix="render-", suffix=os.path.splitext(template_path)[1])
+            os.close(fd)
+            try:
+                self.pool.submit(generate_document, template_path, output_path, replacements).result()
+            except BaseException:
+                os.remove(output_path)
+                with self.lock:
+                    self.failed += 1
+                raise
+            with self.lock:
+                self.rendered += 1
+            return output_path
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "templates": len(self.catalog),
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "rendered": self.rendered,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "template_cache": template_cache.stats(),
+                "output_cache": output_cache.stats(),
+            }
+
+
+def request_replacements(body):
+    """Build replacements from a render request: a profile's values, overridden by "replacements"."""
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError as e:
+        raise ValueError(f"Request body is not valid JSON: {e}")
+    if not isinstance(request, dict) or not ({"replacements", "profile"} & request.keys()):
+        raise ValueError('Send {"replacements": {...}} and/or {"profile": "Name"}')
+
+    replacements = {}
+    if request.get("profile"):
+        store = get_profile_store()
+        if request["profile"] not in store:
+            raise LookupError(f"No profile named '{request['profile']}'")
+        replacements.update(store.load(request["profile"]))
+    extra = request.get("replacements") or {}
+    if not isinstance(extra, dict):
+        raise ValueError('"replacements" must be an object of placeholder names to values')
+    for key, val in extra.items():
+        key = str(key)
+        if is_expansion_key(key):
+            # Rows come in the request; a path would let a client read files on this machine
+            if not isinstance(val, list):
+                raise ValueError(f'"{key}" must be a list of row objects')
+            replacements[key] = val
+        else:
+            replacements[key] = "" if val is None else str(val)
+    return replacements
+
+
+def make_request_handler(service, verbose=False):
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import unquote, urlsplit
+
+    class RenderRequestHandler(BaseHTTPRequestHandler):
+        # Keep-alive, so load tests and batch clients reuse their connections
+        protocol_version = "HTTP/1.1"
+        server_version = "TemplateFiller"
+        # Headers and body go out in separate writes; with Nagle on, the body
+        # waits for the client's delayed ACK (~40 ms per request)
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == "/health":
+                self.send_json(200, {"status": "ok", **service.stats()})
+            elif path == "/templates":
+                service.refresh()
+                templates = []
+                for template_id, template_path in sorted(service.catalog.items()):
+                    try:
+                        keys = extract_placeholders_from_template(template_path)
+                    except Exception as e:
+                        templates.append({"id": template_id, "error": f"{type(e).__name__}: {e}"})
+                        continue
+                    templates.append({"id": template_id, "placeholders": keys})
+                self.send_json(200, {"templates": templates})
+            else:
+                self.send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            if not path.startswith("/render/"):
+                self.send_json(404, {"error": "Not found"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_REQUEST_BYTES:
+                self.close_connection = True
+                self.send_json(413, {"error": "Request body too large"})
+                return
+            body = self.rfile.read(length)
+
+            template_id = unquote(path[len("/render/"):])
+            template_path = service.resolve(template_id)
+            if template_path is None:
+                self.send_json(404, {"error": f"Unknown template '{template_id}'"})
+                return
+            try:
+                replacements = request_replacements(body)
+            except LookupError as e:
+                self.send_json(404, {"error": str(e)})
+                return
+            except ValueError as e:
+                self.send_json(400, {"error": str(e)})
+                return
+
+            start = time.perf_counter()
+            try:
+                output_path = service.render(template_path, replacements)
+            except ServiceBusy:
+                self.send_json(503, {"error": "All render workers are busy"}, {"Retry-After": "1"})
+                return
+            except Exception as e:
+                self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", DOCUMENT_CONTENT_TYPES[os.path.splitext(template_path)[1].lower()])
+                self.send_header("Content-Length", str(os.path.getsize(output_path)))
+                self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(template_path)}"')
+                self.send_header("X-Render-Seconds", f"{time.perf_counter() - start:.4f}")
+                self.end_headers()
+                with open(output_path, "rb") as f:
+                    shutil.copyfileobj(f, self.wfile, 1 << 16)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+            finally:
+                os.remove(output_path)
+
+        def send_json(self, status, data, headers=None):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return RenderRequestHandler
+
+
+def run_serve_command(args):
+    from http.server import ThreadingHTTPServer
+
+    class RenderServer(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128
+
+    service = RenderService(args.templates, workers=args.workers, backlog=args.backlog)
+    if args.template_cache is None:
+        # Keep every served template parsed, still bounded by --template-cache-mb
+        template_cache.configure(max_entries=max(template_cache.max_entries, len(service.catalog)))
+    if not args.no_warm:
+        start = time.perf_counter()
+        for template_id, error in service.warm():
+            print(f"Could not warm {template_id}: {error}", file=sys.stderr)
+        print(f"Warmed {len(service.catalog)} templates in {time.perf_counter() - start:.1f}s ({template_cache.describe()})")
+
+    watcher = None
+    if args.watch:
+        # The served folder is watched too, so templates saved into it are compiled before they are asked for
+        watcher = FolderWatcher([service.templates_dir] + args.watch, get_profile_store(),
+                                interval=args.watch_interval, post_events=False).start()
+
+    server = RenderServer((args.host, args.port), make_request_handler(service, verbose=args.verbose))
+    print(f"Serving {len(service.catalog)} templates from {service.templates_dir} "
+          f"on http://{args.host}:{server.server_port} ({service.workers} workers, backlog {args.backlog})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.pool.shutdown(wait=False)
+        if watcher is not None:
+            watcher.stop(timeout=1)
+    return 0
+
+
+def run_render_command(args):
+    start = time.perf_counter()
+    try:
+        summary = render_batch(
+            args.template, args.data, args.out,
+            workers=args.workers, name_pattern=args.name, chunksize=args.chunksize, resume=not args.restart,
+            shard=args.shard, key_columns=[column.strip() for column in args.key.split(",")] if args.key else None,
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - start
+    for output_path, error in summary["failures"]:
+        print(f"FAILED {output_path}: {error}", file=sys.stderr)
+    if args.shard != (1, 1):
+        print(f"Shard {args.shard[0]}/{args.shard[1]}: {summary['rows']} of {summary['data_rows']} rows")
+    attempted = summary["rows"] - summary["skipped"]
+    rate = attempted / elapsed if elapsed else 0.0
+    print(f"Rendered {summary['rendered']}/{attempted} documents in {elapsed:.1f}s ({rate:.1f}/s), "
+          f"{summary['cached']} copied from the output cache, "
+          f"{summary['skipped']} already done by an earlier run")
+    return 1 if summary["failures"] else 0
+
+
+def run_merge_command(args):
+    report = merge_shards(args.out)
+    for problem in report["problems"]:
+        print(problem, file=sys.stderr)
+    if report["ok"]:
+        print(f"Verified: {report['rendered']}/{report['data_rows']} rows rendered exactly once "
+              f"across {report['shards']} shard(s); combined manifest written to .manifest.json")
+        return 0
+    print(f"Not verified: {report['rendered']}/{report['data_rows']} rows rendered, "
+          f"{len(report['problems'])} problem(s)")
+    return 1
+
+
+def run_scan_command(args):
+    found = scan_placeholders(args.template)
+    for key in sorted(found):
+        info = found[key]
+        locations = ", ".join(describe_location(entry) for entry in info["locations"])
+        print(f"{{{key}}}\t{info['count']}\t{locations}")
+    return 0
+
+
+def warm_imports():
+    """Import the document libraries on a background thread once the window is up."""
+    from lxml import etree  # noqa: F401
+
+
+def launch_delay():
+    """Seconds from REPORT_APP_LAUNCHED (epoch time set by whatever started us) to the interpreter starting.
+
+    The onefile build unpacks itself before Python runs, so only a launcher can see that part.
+    """
+    try:
+        launched = float(os.environ["REPORT_APP_LAUNCHED"])
+    except (KeyError, ValueError):
+        return None
+    return max(0.0, _STARTUP_WALL - launched)
+
+
+def report_startup(timings):
+    line = json.dumps(timings)
+    if sys.stdout:
+        print(line)
+    try:
+        with open(os.path.join(get_cache_dir("logs"), "startup.jsonl"), "a") as f:
+            f.write(line + "\n")
+    except OSError:
+        pass
+
+
+def run_gui(measure_startup=False, watch=None, watch_interval=10.0):
+    imports_done = time.perf_counter()
+    from tkinterdnd2 import TkinterDnD
 
-if __name__ == "__main__":
     root = TkinterDnD.Tk()
 
     # Optional: Set global font styles before launching the app
@@ -551,7 +4428,129 @@ if __name__ == "__main__":
     tkFont.nametofont("TkHeadingFont").configure(size=18, weight="bold")
 
     # Launch your app
-    app = TemplateFillerApp(root)
+    watcher = FolderWatcher(watch, get_profile_store(), interval=watch_interval) if watch else None
+    app = TemplateFillerApp(root, watcher=watcher)
+
+    if measure_startup:
+        # Runs once the window has actually been drawn, then exits
+        root.wait_visibility()
+        shown = time.perf_counter()
+        launch_s = launch_delay()
+        timings = {
+            "frozen": bool(getattr(sys, 'frozen', False)),
+            # Without REPORT_APP_LAUNCHED the clock starts in the interpreter, after any unpacking
+            "from": "interpreter" if launch_s is None else "launch",
+            "imports_s": round(imports_done - _STARTUP_T0, 4),
+            "first_window_s": round(shown - imports_done, 4),
+            "total_s": round(shown - _STARTUP_T0 + (launch_s or 0.0), 4),
+        }
+        if launch_s is not None:
+            timings["launch_s"] = round(launch_s, 4)
+        report_startup(timings)
+        root.destroy()
+        return
+
+    root.after(200, lambda: threading.Thread(target=warm_imports, daemon=True).start())
+    if watcher is not None:
+        root.after(500, watcher.start)
     root.mainloop()
+    if watcher is not None:
+        watcher.stop(timeout=1)
+
+
+def build_arg_parser():
+    # No abbreviations, or "render --template" would be read as --template-cache
+    parser = argparse.ArgumentParser(description="Fill {placeholder} templates in Word and Excel files.", allow_abbrev=False)
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="Open the window, report import and first-window times as JSON, then exit. Times start when "
+                             "Python starts, so a onefile build's unpacking is only counted if REPORT_APP_LAUNCHED "
+                             "holds the launch time (seconds since the epoch)")
+    parser.add_argument("--template-cache", type=int, default=None, metavar="N",
+                        help="Parsed templates kept in memory per process (default: 8, 0 disables)")
+    parser.add_argument("--template-cache-mb", type=int, default=None, metavar="MB",
+                        help="Upper bound on XML held by the parsed template cache (default: 256)")
+    parser.add_argument("--output-cache-mb", type=int, default=None, metavar="MB",
+                        help="Disk space for previously rendered documents, reused for identical requests "
+                             "(default: 512, 0 disables)")
+    parser.add_argument("--output-cache-link", action="store_true",
+                        help="Hard-link cached documents into place instead of copying them "
+                             "(do not edit those outputs in place)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Run each render and extraction under cProfile and save the stats in cache/logs/profiles")
+    parser.add_argument("--watch", action="append", default=[], metavar="FOLDER",
+                        help="Poll this template folder (repeatable) and the profiles folder, precompiling "
+                             "changes in the background")
+    parser.add_argument("--watch-interval", type=float, default=10.0, metavar="SECONDS",
+                        help="Seconds between --watch polls (default: 10)")
+    commands = parser.add_subparsers(dest="command")
+
+    render = commands.add_parser("render", help="Render one document per row of a CSV/XLSX data file (no GUI).")
+    render.add_argument("--template", required=True, help="Template file (.docx or .xlsx)")
+    render.add_argument("--data", required=True, help="Data file (.csv or .xlsx); header row holds placeholder names")
+    render.add_argument("--out", required=True, help="Output directory")
+    render.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    render.add_argument("--name", default="report_{row:05d}",
+                        help="Output file name pattern, e.g. \"{Location}_{row}\" (default: report_{row:05d})")
+    render.add_argument("--chunksize", type=int, default=16, help="Rows handed to a worker at a time")
+    render.add_argument("--restart", action="store_true",
+                        help="Render every row again instead of resuming from the job journal in --out")
+    render.add_argument("--shard", type=parse_shard, default=(1, 1), metavar="I/N",
+                        help="Render only slice I of N (e.g. 2/4); run each slice on its own machine into one --out")
+    render.add_argument("--key", default=None, metavar="COLUMNS",
+                        help="Comma-separated columns that identify a row for --shard (default: the whole row)")
 
+    merge = commands.add_parser("merge", help="Check that the shards of a batch rendered every row exactly once.")
+    merge.add_argument("out", help="Output folder shared by the shards")
+
+    packet = commands.add_parser("packet", help="Fill a folder or list of templates with one profile (no GUI).")
+    packet.add_argument("templates", nargs="+", help="Template files and/or folders (searched recursively)")
+    packet.add_argument("--values", required=True, help="Profile name, or path to a profile .json file")
+    packet.add_argument("--out", required=True, help="Output folder, or a .zip file to collect every output")
+    packet.add_argument("--workers", type=int, default=None, help="Templates rendered at once (default: CPU count)")
+
+    serve = commands.add_parser("serve", help="Serve a folder of templates over a local HTTP API (no GUI).")
+    serve.add_argument("templates", help="Folder of templates; IDs are paths relative to it")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765, 0 picks a free one)")
+    serve.add_argument("--workers", type=int, default=None, help="Renders run at once (default: CPU count)")
+    serve.add_argument("--backlog", type=int, default=16,
+                       help="Requests allowed to wait for a worker before answering 503 (default: 16)")
+    serve.add_argument("--no-warm", action="store_true", help="Skip parsing every template at startup")
+    serve.add_argument("--verbose", action="store_true", help="Log every request")
+
+    scan = commands.add_parser("scan", help="List a template's placeholders with occurrence counts and locations.")
+    scan.add_argument("template", help="Template file (.docx or .xlsx)")
+    return parser
+
+
+def main(argv=None):
+    global profile_renders
+    args = build_arg_parser().parse_args(argv)
+    profile_renders = args.profile
+    output_cache.configure(
+        max_bytes=None if args.output_cache_mb is None else args.output_cache_mb << 20,
+        link=args.output_cache_link,
+    )
+    template_cache.configure(
+        max_entries=args.template_cache,
+        max_bytes=None if args.template_cache_mb is None else args.template_cache_mb << 20,
+    )
+    if args.command == "render":
+        return run_render_command(args)
+    if args.command == "merge":
+        return run_merge_command(args)
+    if args.command == "packet":
+        return run_packet_command(args)
+    if args.command == "serve":
+        return run_serve_command(args)
+    if args.command == "scan":
+        return run_scan_command(args)
+    run_gui(measure_startup=args.measure_startup, watch=args.watch, watch_interval=args.watch_interval)
+    return 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
 
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import report_app  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def app_dir(tmp_path, monkeypatch):
+    """Point cache/, logs and the output cache at a scratch folder and start every test cold."""
+    folder = tmp_path / "app"
+    folder.mkdir()
+    monkeypatch.setattr(report_app, "get_app_dir", lambda: str(folder))
+    max_bytes = report_app.output_cache.max_bytes
+    report_app.output_cache.configure(max_bytes=0)
+    report_app.template_cache.entries.clear()
+    report_app._template_hashes.clear()
+    report_app._template_indexes.clear()
+    report_app._index_parts.clear()
+    yield folder
+    report_app.output_cache.configure(max_bytes=max_bytes)
+    report_app.template_cache.entries.clear()
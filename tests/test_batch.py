@@ -0,0 +1,138 @@
+import os
+
+import docx
+import pytest
+
+import report_app
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = str(tmp_path / "letter.docx")
+    document = docx.Document()
+    document.add_paragraph("Hello {Name} from {City}")
+    document.save(path)
+    return path
+
+
+def write_rows(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        f.write("Name,City\n")
+        f.writelines(f"{name},{city}\n" for name, city in rows)
+    return str(path)
+
+
+def journal_lines(out_dir):
+    with open(os.path.join(out_dir, report_app.BatchJournal.FILE_NAME), encoding="utf-8") as f:
+        return f.readlines()
+
+
+def test_rerun_skips_finished_rows(tmp_path, template):
+    data = write_rows(tmp_path / "rows.csv", [("Ann", "Leeds"), ("Bob", "York"), ("Cy", "Bath")])
+    out_dir = str(tmp_path / "out")
+
+    first = report_app.render_batch(template, data, out_dir, workers=2)
+    assert (first["rendered"], first["skipped"], first["failures"]) == (3, 0, [])
+    assert docx.Document(os.path.join(out_dir, "report_00002.docx")).paragraphs[0].text == "Hello Bob from York"
+
+    again = report_app.render_batch(template, data, out_dir, workers=2)
+    assert (again["rendered"], again["skipped"]) == (0, 3)
+
+    restarted = report_app.render_batch(template, data, out_dir, workers=2, resume=False)
+    assert (restarted["rendered"], restarted["skipped"]) == (3, 0)
+
+
+def test_resume_after_interrupted_journal(tmp_path, template):
+    data = write_rows(tmp_path / "rows.csv", [(f"N{i}", f"C{i}") for i in range(5)])
+    out_dir = str(tmp_path / "out")
+    report_app.render_batch(template, data, out_dir, workers=2)
+
+    # As if the run died after journalling two rows, mid-way through writing the third line
+    lines = journal_lines(out_dir)
+    with open(os.path.join(out_dir, report_app.BatchJournal.FILE_NAME), "w", encoding="utf-8") as f:
+        f.writelines(lines[:3])
+        f.write(lines[3][:20])
+    # and a journalled output was later damaged
+    with open(os.path.join(out_dir, "report_00001.docx"), "ab") as f:
+        f.write(b"junk")
+
+    summary = report_app.render_batch(template, data, out_dir, workers=2)
+    assert (summary["rendered"], summary["skipped"]) == (4, 1)
+    for i in range(5):
+        text = docx.Document(os.path.join(out_dir, f"report_{i + 1:05d}.docx")).paragraphs[0].text
+        assert text == f"Hello N{i} from C{i}"
+
+
+def test_identical_rows_each_resume(tmp_path, template):
+    data = write_rows(tmp_path / "rows.csv", [("Ann", "Leeds")] * 3)
+    out_dir = str(tmp_path / "out")
+
+    assert report_app.render_batch(template, data, out_dir, workers=2)["rendered"] == 3
+    for _ in range(2):
+        summary = report_app.render_batch(template, data, out_dir, workers=2)
+        assert (summary["rendered"], summary["skipped"]) == (0, 3)
+
+
+def test_shards_cover_every_row_once_and_merge(tmp_path, template):
+    rows = [(f"N{i}", f"C{i % 4}") for i in range(20)]
+    data = write_rows(tmp_path / "rows.csv", rows)
+    out_dir = str(tmp_path / "out")
+
+    for i in range(1, 4):
+        report_app.render_batch(template, data, out_dir, workers=2, shard=(i, 3), key_columns=["Name"])
+        if i < 3:
+            report = report_app.merge_shards(out_dir)
+            assert not report["ok"]
+            assert report["problems"][0].startswith("Missing shard manifest(s):")
+
+    report = report_app.merge_shards(out_dir)
+    assert report["ok"], report["problems"]
+    assert (report["shards"], report["data_rows"], report["rendered"]) == (3, 20, 20)
+    outputs = sorted(name for name in os.listdir(out_dir) if name.endswith(".docx"))
+    assert outputs == [f"report_{i:05d}.docx" for i in range(1, 21)]
+    assert os.path.exists(os.path.join(out_dir, ".manifest.json"))
+
+
+def test_row_shard_is_stable_and_partitions():
+    rows = [{"Name": f"N{i}", "City": "Leeds"} for i in range(200)]
+    shards = [report_app.row_shard(row, 4, ["Name"]) for row in rows]
+    assert shards == [report_app.row_shard(dict(row, City="York"), 4, ["Name"]) for row in rows]
+    assert set(shards) == {1, 2, 3, 4}
+
+
+def test_merge_reports_damaged_outputs(tmp_path, template):
+    data = write_rows(tmp_path / "rows.csv", [(f"N{i}", "C") for i in range(6)])
+    out_dir = str(tmp_path / "out")
+    for i in (1, 2):
+        report_app.render_batch(template, data, out_dir, workers=2, shard=(i, 2))
+    assert report_app.merge_shards(out_dir)["ok"]
+
+    os.remove(os.path.join(out_dir, "report_00004.docx"))
+    report = report_app.merge_shards(out_dir)
+    assert not report["ok"]
+    assert report["problems"] == ["Row 4: report_00004.docx is missing or not the size recorded"]
+    assert not os.path.exists(os.path.join(out_dir, ".manifest.json"))
+
+
+def test_name_pattern_is_checked_before_rendering(tmp_path, template):
+    data = write_rows(tmp_path / "rows.csv", [("Ann", "Leeds"), ("Bob", "York"), ("Cy", "leeds")])
+    out_dir = str(tmp_path / "out")
+
+    with pytest.raises(ValueError, match=r"--name uses \{Town\}, which the data does not have \(columns: Name, City\)"):
+        report_app.render_batch(template, data, out_dir, name_pattern="{Town}_{row}")
+    with pytest.raises(ValueError, match=r"rows 1 and 3 the same file name 'leeds.docx'"):
+        report_app.render_batch(template, data, out_dir, name_pattern="{City}")
+    with pytest.raises(ValueError, match="must name its fields"):
+        report_app.render_batch(template, data, out_dir, name_pattern="report_{}")
+    assert not os.path.exists(out_dir)
+
+    summary = report_app.render_batch(template, data, out_dir, workers=2, name_pattern="{City}_{Name}")
+    assert summary["rendered"] == 3
+    assert sorted(os.listdir(out_dir))[-3:] == ["Leeds_Ann.docx", "York_Bob.docx", "leeds_Cy.docx"]
+
+
+def test_render_command_reports_a_bad_name_pattern(tmp_path, template, capsys):
+    data = write_rows(tmp_path / "rows.csv", [("Ann", "Leeds")])
+    argv = ["render", "--template", template, "--data", data, "--out", str(tmp_path / "out"), "--name", "{Nmae}"]
+    assert report_app.main(argv) == 2
+    assert "--name uses {Nmae}" in capsys.readouterr().err
@@ -0,0 +1,50 @@
+"""{rows:name} markers in Excel: the marker row is emitted once per item and the rows below move down."""
+import openpyxl
+from openpyxl.worksheet.table import Table
+
+import report_app
+
+
+def test_excel_rows(tmp_path):
+    template, output = str(tmp_path / "items.xlsx"), str(tmp_path / "out.xlsx")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Name", "Qty", "Double"])
+    sheet.append(["{rows:items}{Name}", "{Qty}", "=B2*2"])
+    sheet["A4"] = "Total"
+    sheet["B4"] = "=SUM(B2:B2)"
+    sheet.add_table(Table(displayName="Items", ref="A1:C2"))
+    workbook.save(template)
+    items = [{"Name": f"Item {i}", "Qty": str(i * 10)} for i in range(1, 4)]
+
+    report_app.generate_document(template, output, {"rows:items": items})
+
+    sheet = openpyxl.load_workbook(output).active
+    assert [[cell.value for cell in row] for row in sheet["A2:C4"]] == [
+        ["Item 1", 10, "=B2*2"], ["Item 2", 20, "=B3*2"], ["Item 3", 30, "=B4*2"],
+    ]
+    assert sheet["A6"].value == "Total"
+    assert sheet["B6"].value == "=SUM(B2:B4)"
+    assert sheet.tables["Items"].ref == "A1:C4"
+
+
+def test_items_from_csv_and_empty_list(tmp_path):
+    template, output = str(tmp_path / "items.xlsx"), str(tmp_path / "out.xlsx")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["{rows:items}{Name}", "{Qty}"])
+    sheet.append(["Total", "=SUM(B1:B1)"])
+    workbook.save(template)
+    data = tmp_path / "items.csv"
+    data.write_text("Name,Qty\nBolt,0012\nNut,2.5\n", encoding="utf-8")
+
+    report_app.generate_document(template, output, {"rows:items": str(data)})
+    sheet = openpyxl.load_workbook(output).active
+    # Zero-padded numbers stay text; plain ones become numbers
+    assert [[cell.value for cell in row] for row in sheet.iter_rows()] == [
+        ["Bolt", "0012"], ["Nut", 2.5], ["Total", "=SUM(B1:B2)"],
+    ]
+
+    report_app.generate_document(template, output, {"rows:items": []})
+    sheet = openpyxl.load_workbook(output).active
+    assert [[cell.value for cell in row] for row in sheet.iter_rows()] == [[None, None], ["Total", "=SUM(B1:B1)"]]
@@ -0,0 +1,62 @@
+"""Incremental re-render: with the parsed template in memory, only parts whose values changed are rendered again."""
+import json
+import zipfile
+
+import docx
+import openpyxl
+
+import report_app
+
+
+def members(path):
+    with zipfile.ZipFile(path) as z:
+        assert z.testzip() is None
+        return {info.filename: z.read(info) for info in z.infolist()}
+
+
+def make_word_template(path):
+    document = docx.Document()
+    document.sections[0].header.paragraphs[0].text = "Prepared for {Client}"
+    document.add_paragraph("Dear {Name},")
+    document.add_paragraph("Due {Date}")
+    document.add_paragraph("Notes: {Notes}")
+    table = document.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "Ref"
+    table.cell(0, 1).text = "{Ref}"
+    document.save(path)
+
+
+def test_incremental_matches_fresh(tmp_path, app_dir):
+    word = str(tmp_path / "letter.docx")
+    make_word_template(word)
+    excel = str(tmp_path / "report.xlsx")
+    workbook = openpyxl.Workbook()
+    workbook.active["A1"] = "{Name}"
+    workbook.active["A2"] = "Due {Date}"
+    workbook.active["A3"] = '="Hi "&"{Name}"'
+    workbook.save(excel)
+
+    for template in (word, excel):
+        extension = template[-5:]
+        values = {"Client": "Acme", "Name": "Ann", "Date": "1 May", "Notes": "none", "Ref": "R-1"}
+        report_app.generate_document(template, str(tmp_path / f"first{extension}"), values)
+        for name, value in [("Name", "Bob"), ("Notes", "two\nlines"), ("Date", ""), ("Name", "Ann")]:
+            values[name] = value
+            incremental = str(tmp_path / f"incremental{extension}")
+            report_app.generate_document(template, incremental, values)
+
+            # Without the parsed template in memory the render starts from scratch
+            kept = dict(report_app.template_cache.entries)
+            report_app.template_cache.entries.clear()
+            fresh = str(tmp_path / f"fresh{extension}")
+            report_app.generate_document(template, fresh, values)
+            report_app.template_cache.entries.update(kept)
+
+            assert members(incremental) == members(fresh), (template, name)
+
+        with open(app_dir / "cache" / "logs" / "renders.jsonl") as f:
+            assert any(json.loads(line).get("counters", {}).get("parts_reused") for line in f)
+        if template is word:
+            assert docx.Document(incremental).paragraphs[0].text == "Dear Ann,"
+        else:
+            assert openpyxl.load_workbook(incremental).active["A2"].value == "Due "
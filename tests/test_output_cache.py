@@ -0,0 +1,42 @@
+import docx
+import pytest
+
+import report_app
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = str(tmp_path / "letter.docx")
+    document = docx.Document()
+    document.add_paragraph("Dear {Name},")
+    document.save(path)
+    return path
+
+
+@pytest.fixture
+def output_cache():
+    report_app.output_cache.configure(max_bytes=1 << 20)
+    report_app.output_cache.hits = report_app.output_cache.misses = report_app.output_cache.stores = 0
+    report_app.output_cache.total_bytes = None
+    yield report_app.output_cache
+    report_app.output_cache.configure(max_bytes=0)
+
+
+def test_same_values_are_copied_from_the_cache(tmp_path, template, output_cache):
+    first, second = str(tmp_path / "first.docx"), str(tmp_path / "second.docx")
+    assert report_app.generate_document(template, first, {"Name": "Ann"}) is False
+    assert report_app.generate_document(template, second, {"Name": "Ann"}) is True
+    assert docx.Document(second).paragraphs[0].text == "Dear Ann,"
+    assert report_app.generate_document(template, second, {"Name": "Bob"}) is False
+    assert docx.Document(second).paragraphs[0].text == "Dear Bob,"
+
+
+def test_unwritable_cache_folder_still_renders(tmp_path, app_dir, template, output_cache):
+    # A file where the cache folder should be, as in a read-only install
+    (app_dir / "cache").write_text("")
+    output = str(tmp_path / "out.docx")
+
+    for name in ("Ann", "Ann"):
+        assert report_app.generate_document(template, output, {"Name": name}) is False
+        assert docx.Document(output).paragraphs[0].text == f"Dear {name},"
+    assert output_cache.stats()["stores"] == 0
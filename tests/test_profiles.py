@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+import report_app
+
+
+def write_profile(folder, name, data, mtime=None):
+    path = folder / f"{name}.json"
+    path.write_text(json.dumps(data))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "profiles"
+    folder.mkdir()
+    for name in ["Acme North", "Acme South", "Northwind", "Contoso", "Fabrikam North", "Tailspin"]:
+        write_profile(folder, name, {"Client": name})
+    return folder
+
+
+@pytest.fixture
+def store(tmp_path, folder):
+    store = report_app.ProfileStore(str(folder), str(tmp_path / "index.sqlite3"))
+    yield store
+    store.db.close()
+
+
+def test_search_ranks_prefix_then_substring_then_fuzzy(store):
+    assert store.search("") == ["Acme North", "Acme South", "Contoso", "Fabrikam North", "Northwind", "Tailspin"]
+    assert store.search("north") == ["Northwind", "Acme North", "Fabrikam North"]
+    assert store.search("ACME") == ["Acme North", "Acme South"]
+    # In-order letters: c..n..t..s and then nothing else
+    assert store.search("cnts") == ["Contoso"]
+    assert store.search("north", limit=2) == ["Northwind", "Acme North"]
+    assert store.search("zzz") == []
+
+
+def test_refresh_tracks_added_and_removed_profiles(store, folder):
+    assert store.refresh() is False
+    write_profile(folder, "Globex", {"Client": "Globex"})
+    os.remove(folder / "Tailspin.json")
+    assert store.refresh(force=True) is True
+    assert "Globex" in store.names() and "Tailspin" not in store
+    assert store.search("glo") == ["Globex"]
+    assert store.refresh(force=True) is False
+
+
+def test_in_place_edits_are_seen(store, folder):
+    assert store.load("Contoso") == {"Client": "Contoso"}
+    # Rewriting a file does not move the folder's mtime, so only a stat of the file notices
+    write_profile(folder, "Contoso", {"Client": "Contoso Ltd", "City": "Leeds"}, mtime=1_000_000_000)
+    assert store.load("Contoso") == {"Client": "Contoso Ltd", "City": "Leeds"}
+
+    write_profile(folder, "Tailspin", {"Client": "Tailspin Toys"}, mtime=1_000_000_000)
+    assert store.refresh(force=True) is True
+    row = store.db.execute("SELECT data FROM profiles WHERE name = 'Tailspin'").fetchone()
+    assert json.loads(row[0]) == {"Client": "Tailspin Toys"}
+
+
+def test_index_survives_a_restart(tmp_path, folder, store):
+    store.save("Globex", {"Client": "Globex"})
+    store.delete("Northwind")
+    assert store.search("glo") == ["Globex"] and "Northwind" not in store.names()
+    store.db.close()
+
+    write_profile(folder, "Acme North", {"Client": "Acme North", "Region": "N"}, mtime=1_000_000_000)
+    reopened = report_app.ProfileStore(str(folder), str(tmp_path / "index.sqlite3"))
+    try:
+        assert reopened.names() == ["Acme North", "Acme South", "Contoso", "Fabrikam North", "Globex", "Tailspin"]
+        assert reopened.load("Acme North") == {"Client": "Acme North", "Region": "N"}
+    finally:
+        reopened.db.close()
@@ -0,0 +1,80 @@
+"""Round trips through each renderer: build a small template, fill it, read it back."""
+import zipfile
+
+import docx
+import openpyxl
+
+import report_app
+
+
+def make_word_template(path):
+    document = docx.Document()
+    document.sections[0].header.paragraphs[0].text = "Prepared for {Client}"
+    document.add_paragraph("Dear {Name},")
+    split = document.add_paragraph("Due ")
+    # Split across runs the way Word saves an edited placeholder
+    split.add_run("{Da")
+    split.add_run("te}").bold = True
+    document.add_paragraph("Notes: {Notes}")
+    table = document.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "Ref"
+    table.cell(0, 1).text = "{Ref}"
+    document.save(path)
+
+
+def test_word(tmp_path):
+    template, output = str(tmp_path / "letter.docx"), str(tmp_path / "out.docx")
+    make_word_template(template)
+    assert set(report_app.extract_placeholders_from_template(template)) == {"Client", "Name", "Date", "Notes", "Ref"}
+
+    report_app.generate_document(template, output, {
+        "Client": "Acme & Sons", "Name": "Ann", "Date": "1 May", "Notes": "Line 1\nLine 2\tTabbed\x07", "Ref": "R-7",
+    })
+
+    document = docx.Document(output)
+    texts = [paragraph.text for paragraph in document.paragraphs]
+    assert texts == ["Dear Ann,", "Due 1 May", "Notes: Line 1\nLine 2\tTabbed"]
+    # A split placeholder takes the formatting of the run it starts in
+    assert [run.text for run in document.paragraphs[1].runs] == ["Due ", "1 May", ""]
+    assert document.tables[0].cell(0, 1).text == "R-7"
+    assert document.sections[0].header.paragraphs[0].text == "Prepared for Acme & Sons"
+
+
+def test_excel(tmp_path):
+    template, output = str(tmp_path / "report.xlsx"), str(tmp_path / "out.xlsx")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Summary"
+    sheet["A1"] = "Report for {Location}"
+    sheet["B2"] = "{Date}"
+    sheet["C3"] = 42
+    workbook.create_sheet("Notes")["A1"] = "{Location} notes: {Notes}"
+    workbook.save(template)
+
+    report_app.generate_document(template, output, {"Location": "Leeds <North>", "Date": "1 May", "Notes": "a\x00b"})
+
+    workbook = openpyxl.load_workbook(output)
+    sheet = workbook["Summary"]
+    assert sheet["A1"].value == "Report for Leeds <North>"
+    assert sheet["B2"].value == "1 May"
+    assert sheet["C3"].value == 42
+    assert workbook["Notes"]["A1"].value == "Leeds <North> notes: ab"
+
+
+def test_excel_formulas(tmp_path):
+    template, output = str(tmp_path / "formulas.xlsx"), str(tmp_path / "out.xlsx")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet["A1"] = '="Hi {a}"'
+    sheet["A2"] = "=SUM({range})"
+    sheet["A3"] = "=1+1"
+    sheet["B1"] = "{a}"
+    workbook.save(template)
+    assert set(report_app.extract_placeholders_from_template(template)) == {"a", "range"}
+
+    report_app.generate_document(template, output, {"a": "A&<", "range": "C1:C9"})
+
+    sheet = openpyxl.load_workbook(output).active
+    assert [sheet[cell].value for cell in ("A1", "A2", "A3", "B1")] == ['="Hi A&<"', "=SUM(C1:C9)", "=1+1", "A&<"]
+    with zipfile.ZipFile(output) as z:
+        assert b'fullCalcOnLoad="1"' in z.read("xl/workbook.xml")
@@ -0,0 +1,96 @@
+import http.client
+import io
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import docx
+import pytest
+
+import report_app
+
+
+@pytest.fixture
+def service(tmp_path, app_dir, monkeypatch):
+    templates = tmp_path / "templates"
+    (templates / "letters").mkdir(parents=True)
+    document = docx.Document()
+    document.add_paragraph("Dear {Name},")
+    document.add_paragraph("{rows:lines}- {Item}")
+    document.save(str(templates / "letters" / "letter.docx"))
+    # Outside the served folder, where only a path traversal could reach it
+    document.save(str(tmp_path / "secret.docx"))
+
+    (app_dir / "profiles").mkdir()
+    (app_dir / "profiles" / "Example.json").write_text(json.dumps({"Name": "Ann"}))
+    monkeypatch.setattr(report_app, "_profile_store", None)
+
+    service = report_app.RenderService(str(templates), workers=1, backlog=0)
+    yield service
+    service.pool.shutdown(wait=True)
+    if report_app._profile_store is not None:
+        report_app._profile_store.db.close()
+
+
+@pytest.fixture
+def post(service):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), report_app.make_request_handler(service))
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+
+    def post(template_id, request):
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+        try:
+            conn.request("POST", f"/render/{template_id}", json.dumps(request).encode("utf-8"))
+            response = conn.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            conn.close()
+
+    yield post
+    server.shutdown()
+    server.server_close()
+
+
+def test_render_with_profile_and_rows(post):
+    status, _, body = post("letters/letter.docx", {
+        "profile": "Example", "replacements": {"rows:lines": [{"Item": "one"}, {"Item": "two"}]}})
+    assert status == 200
+    assert [p.text for p in docx.Document(io.BytesIO(body)).paragraphs] == ["Dear Ann,", "- one", "- two"]
+
+
+def test_unknown_profile_is_404(post):
+    status, _, body = post("letters/letter.docx", {"profile": "Nobody"})
+    assert status == 404
+    assert json.loads(body) == {"error": "No profile named 'Nobody'"}
+
+
+@pytest.mark.parametrize("template_id", ["../secret.docx", "letters/../../secret.docx", "%2E%2E/secret.docx"])
+def test_template_outside_the_folder_is_404(post, template_id):
+    status, _, body = post(template_id, {"replacements": {"Name": "Ann"}})
+    assert status == 404
+    assert json.loads(body)["error"].startswith("Unknown template")
+
+
+def test_rows_path_is_400(post):
+    status, _, body = post("letters/letter.docx", {"replacements": {"rows:lines": "/etc/passwd"}})
+    assert status == 400
+    assert json.loads(body) == {"error": '"rows:lines" must be a list of row objects'}
+
+
+@pytest.mark.parametrize("request_body", [{}, {"replacements": ["Name"]}, [1, 2]])
+def test_malformed_requests_are_400(post, request_body):
+    assert post("letters/letter.docx", request_body)[0] == 400
+
+
+def test_full_service_is_503(post, service):
+    # Take the only slot (workers=1, backlog=0) as a render in progress would
+    assert service.slots.acquire(blocking=False)
+    try:
+        status, headers, _ = post("letters/letter.docx", {"replacements": {"Name": "Ann"}})
+    finally:
+        service.slots.release()
+    assert status == 503
+    assert headers["Retry-After"] == "1"
+    assert service.stats()["rejected"] == 1
+    assert post("letters/letter.docx", {"replacements": {"Name": "Ann"}})[0] == 200
@@ -0,0 +1,16 @@
+import pytest
+
+import report_app
+
+
+def test_launch_delay_needs_a_launch_time(monkeypatch):
+    monkeypatch.delenv("REPORT_APP_LAUNCHED", raising=False)
+    assert report_app.launch_delay() is None
+    monkeypatch.setenv("REPORT_APP_LAUNCHED", "soon")
+    assert report_app.launch_delay() is None
+
+    monkeypatch.setenv("REPORT_APP_LAUNCHED", str(report_app._STARTUP_WALL - 2.5))
+    assert report_app.launch_delay() == pytest.approx(2.5)
+    # A launcher clock slightly ahead of ours is not a negative delay
+    monkeypatch.setenv("REPORT_APP_LAUNCHED", str(report_app._STARTUP_WALL + 1))
+    assert report_app.launch_delay() == 0.0
@@ -0,0 +1,104 @@
+import os
+import queue
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import docx
+import pytest
+
+import report_app
+
+
+def save_template(path, text, age=60):
+    document = docx.Document()
+    document.add_paragraph(text)
+    document.save(str(path))
+    # Older than WATCH_SETTLE_S, as if the copy finished a while ago
+    settled = time.time() - age
+    os.utime(path, (settled, settled))
+
+
+def drain(events):
+    found = []
+    while not events.empty():
+        found.append(events.get_nowait())
+    return found
+
+
+def test_poll_compiles_changes_and_records_failures(tmp_path):
+    good, bad = tmp_path / "good.docx", tmp_path / "bad.docx"
+    save_template(good, "Dear {Name}")
+    bad.write_bytes(b"not a zip")
+    os.utime(bad, (time.time() - 60, time.time() - 60))
+    watcher = report_app.FolderWatcher([str(tmp_path)])
+
+    assert sorted(watcher.poll()) == [str(bad), str(good)]
+    events = {path: error for _, path, error in drain(watcher.events)}
+    assert events[str(good)] is None and events[str(bad)] is not None
+    assert list(watcher.stats()["failures"]) == [str(bad)]
+    assert watcher.poll() == []
+
+    # Still being written: left for the next poll
+    save_template(good, "Dear {Name} of {City}", age=0)
+    assert watcher.poll() == []
+    os.utime(good, (time.time() - 60, time.time() - 60))
+    assert watcher.poll() == [str(good)]
+    assert set(report_app.extract_placeholders_from_template(str(good))) == {"Name", "City"}
+
+    os.remove(bad)
+    watcher.poll()
+    assert watcher.stats()["failures"] == {}
+
+
+def test_serve_watcher_reports_to_stderr(tmp_path, capsys):
+    bad = tmp_path / "bad.docx"
+    bad.write_bytes(b"not a zip")
+    os.utime(bad, (time.time() - 60, time.time() - 60))
+    watcher = report_app.FolderWatcher([str(tmp_path)], post_events=False)
+    watcher.poll()
+    assert watcher.events is None
+    assert f"Watch failed {bad}: BadZipFile" in capsys.readouterr().err
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The parts of TemplateFillerApp that poll_watcher touches, without a window."""
+    app = SimpleNamespace(
+        watcher=SimpleNamespace(events=queue.Queue()),
+        worker=SimpleNamespace(busy=True, submitted=[]),
+        root=SimpleNamespace(after=lambda ms, func: None, focus_get=lambda: None),
+        template_path=SimpleNamespace(get=lambda: str(tmp_path / "current.docx")),
+        deferred_watch=OrderedDict(),
+        status_text="",
+    )
+    app.worker.pending = lambda: app.worker.busy
+    app.worker.submit = lambda label, func, *args, on_done=None: app.worker.submitted.append((label, args))
+    for name in ("poll_watcher", "handle_watch_event", "merge_extracted_keys"):
+        setattr(app, name, getattr(report_app.TemplateFillerApp, name).__get__(app))
+    return app
+
+
+def test_events_during_a_job_wait_for_it(app, tmp_path):
+    current, other = str(tmp_path / "current.docx"), str(tmp_path / "other.docx")
+    app.watcher.events.put(("template", current, ValueError("half written")))
+    app.watcher.events.put(("template", other, ValueError("broken")))
+    app.watcher.events.put(("template", current, None))
+    app.poll_watcher()
+    assert app.worker.submitted == [] and app.status_text == ""
+    assert list(app.deferred_watch) == [other, current]
+
+    # The job finished: the latest event per path is handled, the current template rescanned
+    app.worker.busy = False
+    app.poll_watcher()
+    assert app.status_text == "Watch: could not compile other.docx: broken"
+    assert app.worker.submitted == [("Rescanning current.docx (changed on disk)", (current,))]
+    assert not app.deferred_watch
+
+
+def test_rescan_keeps_typed_values(app):
+    row = lambda key, value: SimpleNamespace(key=key, value=value)
+    app.placeholders = [row("Name", "Ann"), row("Old", "kept"), row("Blank", "")]
+    app.set_placeholders = lambda pairs: setattr(app, "placed", pairs)
+    app.merge_extracted_keys(["City", "Name"])
+    assert app.placed == [("City", ""), ("Name", "Ann"), ("Old", "kept")]
@@ -0,0 +1,50 @@
+"""{rows:name} markers in Word tables: the marker row is cloned once per item."""
+import docx
+
+import report_app
+
+
+def make_word_rows_template(path):
+    document = docx.Document()
+    document.add_paragraph("Invoice for {Client}")
+    table = document.add_table(rows=3, cols=2)
+    table.cell(0, 0).text = "Item"
+    table.cell(0, 1).text = "Qty"
+    table.cell(1, 0).text = "{rows:lines}{Item}"
+    table.cell(1, 1).text = "{Qty}"
+    table.cell(2, 0).text = "Total"
+    table.cell(2, 1).text = "{Total}"
+    document.save(path)
+
+
+def test_word_rows(tmp_path):
+    template, output = str(tmp_path / "invoice.docx"), str(tmp_path / "out.docx")
+    make_word_rows_template(template)
+    lines = [{"Item": f"Widget {i}", "Qty": str(i)} for i in range(1, 4)]
+
+    report_app.generate_document(template, output, {"Client": "Acme", "rows:lines": lines, "Total": "6"})
+
+    table = docx.Document(output).tables[0]
+    assert [[cell.text for cell in row.cells] for row in table.rows] == [
+        ["Item", "Qty"], ["Widget 1", "1"], ["Widget 2", "2"], ["Widget 3", "3"], ["Total", "6"],
+    ]
+
+    report_app.generate_document(template, output, {"Client": "Acme", "rows:lines": [], "Total": "0"})
+    table = docx.Document(output).tables[0]
+    assert [[cell.text for cell in row.cells] for row in table.rows] == [["Item", "Qty"], ["Total", "0"]]
+
+
+def test_marker_outside_a_table_repeats_its_paragraph(tmp_path):
+    template, output = str(tmp_path / "list.docx"), str(tmp_path / "out.docx")
+    document = docx.Document()
+    document.add_paragraph("Attendees:")
+    document.add_paragraph("{rows:people}- {Name} ({Role})")
+    document.add_paragraph("End of list for {Event}")
+    document.save(template)
+    people = [{"Name": "Ann", "Role": "chair"}, {"Name": "Bob", "Role": "notes\nand minutes"}]
+
+    report_app.generate_document(template, output, {"rows:people": people, "Event": "AGM"})
+
+    assert [paragraph.text for paragraph in docx.Document(output).paragraphs] == [
+        "Attendees:", "- Ann (chair)", "- Bob (notes\nand minutes)", "End of list for AGM",
+    ]